@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+Benchmark of the assessment pipeline using synthetic quality models and metrics
+indexes served by an in memory Elasticsearch stand-in.
+
+For each phase it reports the wall time, the number of database queries, the
+number of requests to Elasticsearch and the peak RSS of the process. The counts
+are deterministic so they are compared with a baseline file to detect regressions:
+
+    django-prosoul $ python -m benchmarks.bench_assess --check benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import logging
+import os
+import resource
+import sys
+import tempfile
+
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter
+
+import django
+# settings.configure()
+os.environ['DJANGO_SETTINGS_MODULE'] = 'django_prosoul.settings'
+django.setup()
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from prosoul import assess_cache, prosoul_assess
+from prosoul.prosoul_export import fetch_models
+
+from benchmarks.es_stub import ElasticsearchStub
+from benchmarks.generators import generate_metrics_index, generate_quality_model
+
+BACKEND = 'scava-metrics'
+FROM_DATE = datetime(2018, 1, 1)
+TO_DATE = datetime(2019, 1, 1)
+DEFAULT_FROM_DATE = datetime(1970, 1, 1)
+DEFAULT_TO_DATE = datetime(2100, 1, 1)
+INDEX = 'scava-metrics'
+MODEL_NAME = 'benchmark'
+
+# Sizes of the synthetic quality models and metrics indexes
+SCENARIOS = {
+    "small": {"goals": 2, "attributes": 2, "metrics": 3, "depth": 0, "projects": 10, "samples": 12},
+    "medium": {"goals": 4, "attributes": 4, "metrics": 5, "depth": 1, "projects": 50, "samples": 24},
+    "large": {"goals": 8, "attributes": 6, "metrics": 8, "depth": 1, "projects": 200, "samples": 52}
+}
+
+# Measures that must be the same in all the runs
+COUNTERS = ['queries', 'requests']
+
+
+def get_params():
+    parser = argparse.ArgumentParser(usage="usage: python -m benchmarks.bench_assess [options]",
+                                     description="Benchmark the Prosoul assessment pipeline")
+    parser.add_argument('-g', '--debug', action='store_true')
+    parser.add_argument('-s', '--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='Scenario to run (it can be used several times, small by default)')
+    parser.add_argument('--check', help='Baseline file to compare the results with')
+    parser.add_argument('--update-baseline', help='Baseline file to store the results in')
+    parser.add_argument('--count-tolerance', type=float, default=0,
+                        help='Allowed increase ratio in queries and requests counts (0 by default)')
+    parser.add_argument('--time-factor', type=float,
+                        help='Allowed wall time ratio vs the baseline (wall time is not checked by default)')
+    parser.add_argument('-o', '--output', help='File to dump the results in JSON format')
+
+    return parser.parse_args()
+
+
+def maxrss_kb():
+    """ Peak resident set size of the process in KB """
+
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == 'darwin' else rss
+
+
+@contextmanager
+def measure(results, phase, stub):
+    """ Measure the wall time, the database queries and the Elasticsearch requests of a phase """
+
+    requests_before = sum(stub.requests.values())
+    with CaptureQueriesContext(connection) as queries:
+        start = perf_counter()
+        yield
+        wall_time = perf_counter() - start
+
+    results[phase] = {
+        "wall_time": round(wall_time, 3),
+        "queries": len(queries.captured_queries),
+        "requests": sum(stub.requests.values()) - requests_before,
+        "maxrss_kb": maxrss_kb()
+    }
+
+
+def run_scenario(name, sizes):
+    """
+    Create the quality model and the metrics index for a scenario and measure
+    each phase of the assessment with them.
+
+    :param name: name of the scenario
+    :param sizes: dict with the sizes of the quality model and metrics index
+    :return: a dict with the measures per phase
+    """
+
+    results = {}
+    stub = ElasticsearchStub().start()
+
+    old_db_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    old_csv_path = prosoul_assess.ASSESSMENT_CSV_DIR_PATH
+    old_projects_path = prosoul_assess.ASSESSMENT_PROJECTS_DIR_PATH
+    old_cache_path = assess_cache.CACHE_DIR_PATH
+
+    try:
+        with tempfile.TemporaryDirectory() as csv_dir:
+            prosoul_assess.ASSESSMENT_CSV_DIR_PATH = csv_dir + "/"
+            prosoul_assess.ASSESSMENT_PROJECTS_DIR_PATH = csv_dir
+            assess_cache.CACHE_DIR_PATH = csv_dir
+
+            _, implementations = generate_quality_model(MODEL_NAME, sizes['goals'], sizes['attributes'],
+                                                        sizes['metrics'], sizes['depth'])
+            stub.load(INDEX, generate_metrics_index(implementations, sizes['projects'], sizes['samples'],
+                                                    FROM_DATE, TO_DATE))
+            logging.info("Scenario %s: %i metrics, %i samples", name, len(implementations), len(stub.indexes[INDEX]))
+
+            with measure(results, 'fetch_models', stub):
+                fetch_models(MODEL_NAME)
+
+            with measure(results, 'assess_window', stub):
+                assessment = prosoul_assess.assess_window(stub.url, INDEX, MODEL_NAME, BACKEND, FROM_DATE, TO_DATE)
+
+            with measure(results, 'publish_assessment', stub):
+                prosoul_assess.publish_assessment(stub.url, INDEX + prosoul_assess.SCORES, assessment,
+                                                  FROM_DATE.isoformat(), TO_DATE.isoformat(), model_name=MODEL_NAME)
+
+            with measure(results, 'assess', stub):
+                prosoul_assess.assess(stub.url, INDEX, MODEL_NAME, BACKEND, FROM_DATE, TO_DATE)
+
+            # scores computed again with the metrics values cached by the assessment
+            with measure(results, 'rescore', stub):
+                prosoul_assess.assess(stub.url, INDEX, MODEL_NAME, BACKEND, FROM_DATE, TO_DATE, rescore=True)
+
+            # default time frame of the assess tool, much wider than the metrics data
+            with measure(results, 'assess_default_dates', stub):
+                prosoul_assess.assess(stub.url, INDEX, MODEL_NAME, BACKEND, DEFAULT_FROM_DATE, DEFAULT_TO_DATE)
+
+            # a second model with the same metrics, their queries are shared with the first one
+            generate_quality_model(MODEL_NAME + " copy", sizes['goals'], sizes['attributes'], sizes['metrics'],
+                                   sizes['depth'])
+            with measure(results, 'assess_models', stub):
+                prosoul_assess.assess_models(stub.url, INDEX, [MODEL_NAME, MODEL_NAME + " copy"], BACKEND,
+                                             FROM_DATE, TO_DATE)
+
+            # a document per project with all its scores, instead of one per metric and project
+            with measure(results, 'assess_projects', stub):
+                prosoul_assess.assess(stub.url, INDEX, MODEL_NAME, BACKEND, FROM_DATE, TO_DATE,
+                                      layout=prosoul_assess.SCORES_LAYOUT_PROJECTS)
+    finally:
+        prosoul_assess.ASSESSMENT_CSV_DIR_PATH = old_csv_path
+        prosoul_assess.ASSESSMENT_PROJECTS_DIR_PATH = old_projects_path
+        assess_cache.CACHE_DIR_PATH = old_cache_path
+        connection.creation.destroy_test_db(old_db_name, verbosity=0)
+        stub.stop()
+
+    return results
+
+
+def check_results(results, baseline, count_tolerance, time_factor=None):
+    """
+    Compare the results with the baseline ones
+
+    :param results: dict with the results per scenario and phase
+    :param baseline: dict with the baseline results per scenario and phase
+    :param count_tolerance: allowed increase ratio in the counters
+    :param time_factor: allowed wall time ratio, the wall time is not checked if it is None
+    :return: a list with the regressions found
+    """
+
+    regressions = []
+
+    for scenario in results:
+        for phase, measures in results[scenario].items():
+            expected = baseline.get(scenario, {}).get(phase)
+            if not expected:
+                continue
+            for counter in COUNTERS:
+                if measures[counter] > expected[counter] * (1 + count_tolerance):
+                    regressions.append("%s/%s %s: %i (baseline %i)" % (scenario, phase, counter,
+                                                                       measures[counter], expected[counter]))
+            if time_factor and measures['wall_time'] > expected['wall_time'] * time_factor:
+                regressions.append("%s/%s wall_time: %.3f (baseline %.3f)" % (scenario, phase,
+                                                                              measures['wall_time'],
+                                                                              expected['wall_time']))
+
+    return regressions
+
+
+def show_results(results):
+    print("%-10s %-20s %10s %8s %9s %11s" % ("scenario", "phase", "wall_time", "queries", "requests", "maxrss_kb"))
+    for scenario in results:
+        for phase, measures in results[scenario].items():
+            print("%-10s %-20s %10.3f %8i %9i %11i" % (scenario, phase, measures['wall_time'], measures['queries'],
+                                                       measures['requests'], measures['maxrss_kb']))
+
+
+if __name__ == '__main__':
+
+    args = get_params()
+
+    if args.debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(message)s')
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    logging.getLogger("requests").setLevel(logging.WARNING)
+    logging.getLogger("elasticsearch").setLevel(logging.WARNING)
+
+    scenarios = args.scenario if args.scenario else ['small']
+    results = {scenario: run_scenario(scenario, SCENARIOS[scenario]) for scenario in scenarios}
+
+    show_results(results)
+
+    if args.output:
+        with open(args.output, 'w') as fresults:
+            json.dump(results, fresults, indent=4, sort_keys=True)
+
+    if args.update_baseline:
+        baseline = {}
+        if os.path.exists(args.update_baseline):
+            with open(args.update_baseline) as fbaseline:
+                baseline = json.load(fbaseline)
+        baseline.update(results)
+        with open(args.update_baseline, 'w') as fbaseline:
+            json.dump(baseline, fbaseline, indent=4, sort_keys=True)
+            fbaseline.write("\n")
+
+    if args.check:
+        with open(args.check) as fbaseline:
+            regressions = check_results(results, json.load(fbaseline), args.count_tolerance, args.time_factor)
+        if regressions:
+            print("Regressions found:")
+            for regression in regressions:
+                print("  " + regression)
+            sys.exit(1)
@@ -0,0 +1,468 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+In memory stand-in for the subset of the Elasticsearch HTTP API used by Prosoul.
+
+It supports the searches done in the assessment (bool queries with term, terms,
+match_phrase and range clauses, terms/max/min/avg/sum/percentiles/top_hits aggs),
+the bulk uploads and the indexes and aliases management. All the requests are
+counted by kind, so the number of requests done in each phase can be measured.
+"""
+
+import fnmatch
+import json
+import threading
+
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from socketserver import ThreadingMixIn
+
+
+class StubError(Exception):
+    """ Request not supported by the stub """
+
+
+def _date_bound(value):
+    """ Normalize a yyyy-MM-dd range bound so it can be compared with the docs dates """
+
+    if isinstance(value, str) and len(value) == 10:
+        value += "T00:00:00"
+    return value
+
+
+def _field_values(doc, field):
+    """ Values of a field in a doc, using the field without the .keyword suffix """
+
+    if field.endswith(".keyword"):
+        field = field[:-len(".keyword")]
+    value = doc.get(field)
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+def match(doc, clause):
+    """ Check if a doc matches a query clause """
+
+    kind, params = list(clause.items())[0]
+
+    if kind == "match_all":
+        return True
+    if kind == "bool":
+        clauses = params.get("must", []) + params.get("filter", [])
+        if not all(match(doc, c) for c in clauses):
+            return False
+        return not any(match(doc, c) for c in params.get("must_not", []))
+
+    field, value = list(params.items())[0]
+    values = _field_values(doc, field)
+    if kind in ("term", "match_phrase"):
+        if isinstance(value, dict):
+            value = value.get("value", value.get("query"))
+        return value in values
+    if kind == "terms":
+        return any(v in value for v in values)
+    if kind == "range":
+        for val in values:
+            val = _date_bound(val)
+            if "gte" in value and not val >= _date_bound(value["gte"]):
+                return False
+            if "gt" in value and not val > _date_bound(value["gt"]):
+                return False
+            if "lte" in value and not val <= _date_bound(value["lte"]):
+                return False
+            if "lt" in value and not val < _date_bound(value["lt"]):
+                return False
+        return bool(values)
+
+    raise StubError("Query clause not supported: " + kind)
+
+
+def _metric_value(value):
+    """ Result of a metric aggregation, dates are returned as epoch millis and as string """
+
+    if isinstance(value, str):
+        epoch = datetime.strptime(value[:19], "%Y-%m-%dT%H:%M:%S").replace(tzinfo=timezone.utc).timestamp()
+        return {"value": epoch * 1000, "value_as_string": value}
+    return {"value": value}
+
+
+def aggregate(docs, aggs):
+    """ Compute the aggregations for a list of docs """
+
+    results = {}
+
+    for agg_id, agg in aggs.items():
+        sub_aggs = agg.get("aggs", agg.get("aggregations"))
+        kind = [k for k in agg if k not in ("aggs", "aggregations")][0]
+        params = agg[kind]
+
+        if kind == "terms":
+            groups = {}
+            for doc in docs:
+                for value in _field_values(doc, params["field"]):
+                    groups.setdefault(value, []).append(doc)
+            keys = sorted(groups, key=lambda k: (-len(groups[k]), str(k)))[:params.get("size", 10)]
+            buckets = []
+            for key in keys:
+                bucket = {"key": key, "doc_count": len(groups[key])}
+                if sub_aggs:
+                    bucket.update(aggregate(groups[key], sub_aggs))
+                buckets.append(bucket)
+            results[agg_id] = {"buckets": buckets}
+        elif kind in ("max", "min", "avg", "sum", "value_count"):
+            values = [v for doc in docs for v in _field_values(doc, params["field"])]
+            if kind == "max":
+                result = _metric_value(max(values) if values else None)
+            elif kind == "min":
+                result = _metric_value(min(values) if values else None)
+            elif kind == "avg":
+                result = {"value": sum(values) / len(values) if values else None}
+            elif kind == "sum":
+                result = {"value": sum(values)}
+            else:
+                result = {"value": len(values)}
+            results[agg_id] = result
+        elif kind == "percentiles":
+            values = sorted(v for doc in docs for v in _field_values(doc, params["field"]))
+            percentiles = {}
+            for percent in params.get("percents", [50]):
+                pos = int(round((len(values) - 1) * percent / 100.0))
+                percentiles[str(float(percent))] = values[pos] if values else None
+            results[agg_id] = {"values": percentiles}
+        elif kind == "top_hits":
+            hits = sort_docs(docs, params.get("sort", []))[:params.get("size", 3)]
+            results[agg_id] = {"hits": {"total": len(docs), "hits": [
+                {"_source": doc, "fields": {f: _field_values(doc, f) for f in params.get("docvalue_fields", [])}}
+                for doc in hits
+            ]}}
+        else:
+            raise StubError("Aggregation not supported: " + kind)
+
+    return results
+
+
+def sort_docs(docs, sort):
+    """ Sort the docs using the first sort criteria """
+
+    if not sort:
+        return list(docs)
+
+    field, order = list(sort[0].items())[0]
+    if isinstance(order, dict):
+        order = order.get("order", "asc")
+    with_field = [doc for doc in docs if _field_values(doc, field)]
+    return sorted(with_field, key=lambda doc: _field_values(doc, field)[0], reverse=order == "desc")
+
+
+class ElasticsearchStub(ThreadingMixIn, HTTPServer):
+    """
+    HTTP server with the indexes in memory. The docs indexed in the metrics
+    index (the one searched by field) can be loaded directly with `load`.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, host="127.0.0.1", port=0):
+        super().__init__((host, port), ElasticsearchStubHandler)
+        self.lock = threading.Lock()
+        self.indexes = {}
+        self.aliases = {}
+        self.settings = {}  # index -> index settings set when it is created or updated
+        self.templates = {}  # name -> template, their settings are applied to the new indexes
+        self.requests = Counter()
+        self.writes = Counter()  # index -> number of docs written in it, as the indexing stats
+        self.thread = None
+        self.terms_cache = {}  # (index, field) -> {value: docs}, the searches by term use it
+
+    @property
+    def url(self):
+        return "http://%s:%i" % self.server_address
+
+    def load(self, index, docs):
+        """ Add the docs to an index without doing requests """
+
+        with self.lock:
+            self.indexes.setdefault(index, []).extend(docs)
+            self.writes[index] += len(docs)
+            self.terms_cache = {}
+
+    def find_term(self, index, field, value):
+        """ Get the docs of an index with a value in a field """
+
+        with self.lock:
+            if (index, field) not in self.terms_cache:
+                terms = {}
+                for doc in self.indexes.get(index, []):
+                    for val in _field_values(doc, field):
+                        terms.setdefault(val, []).append(doc)
+                self.terms_cache[(index, field)] = terms
+            return self.terms_cache[(index, field)].get(value, [])
+
+    def candidates(self, index, query):
+        """ Get the docs that can match a query, using the first term clause of a bool query """
+
+        clauses = query.get("bool", {})
+        for clause in clauses.get("must", []) + clauses.get("filter", []):
+            if "term" in clause and index in self.indexes:
+                field, value = list(clause["term"].items())[0]
+                if isinstance(value, dict):
+                    value = value.get("value")
+                return self.find_term(index, field, value)
+
+        return self.resolve(index)
+
+    def resolve(self, name):
+        """ Get the docs of an index or of all the indexes in an alias """
+
+        with self.lock:
+            if name in self.indexes:
+                return list(self.indexes[name])
+            docs = []
+            for index in self.aliases.get(name, []):
+                docs.extend(self.indexes.get(index, []))
+            return docs
+
+    def start(self):
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class ElasticsearchStubHandler(BaseHTTPRequestHandler):
+
+    protocol_version = "HTTP/1.1"
+    # The headers and the body are sent apart: without it the kept alive connections wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return self.rfile.read(length).decode("utf-8") if length else ""
+
+    def _reply(self, status, body=None):
+        data = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(data)
+
+    def _route(self):
+        path = self.path.split("?")[0].strip("/")
+        parts = path.split("/") if path else []
+        body = self._read_body()
+        stub = self.server
+
+        kind = parts[-1] if parts and parts[-1].startswith("_") else "index"
+        with stub.lock:
+            stub.requests[kind] += 1
+
+        if kind == "_search":
+            return self._search(parts[0], json.loads(body) if body else {})
+        if kind == "_bulk":
+            return self._bulk(parts[0] if len(parts) > 1 else None, body)
+        if kind in ("_refresh", "_forcemerge", "_settings", "_mapping", "_stats"):
+            return self._index_admin(parts, kind, body)
+        if kind == "_aliases":
+            return self._aliases(json.loads(body))
+        if kind == "_alias":
+            return self._get_indexes(parts[0] if len(parts) > 1 else "*", "ignore_unavailable=true" in self.path)
+        if kind == "_template" or (len(parts) > 1 and parts[0] == "_template"):
+            if self.command == "PUT" and len(parts) > 1:
+                with stub.lock:
+                    stub.templates[parts[1]] = json.loads(body)
+            return self._reply(200, {"acknowledged": True})
+        if not parts:
+            return self._reply(200, {"version": {"number": "6.8.0"}, "tagline": "You Know, for Search"})
+
+        if self.command == "GET" and ("," in parts[0] or "*" in parts[0]):
+            return self._get_indexes(parts[0], "ignore_unavailable=true" in self.path, settings=True)
+
+        return self._index(parts[0], json.loads(body) if body else {})
+
+    def _search(self, index, query):
+        stub = self.server
+        if index not in stub.indexes and index not in stub.aliases:
+            return self._reply(404, {"error": {"type": "index_not_found_exception"}, "status": 404})
+
+        if "query" in query:
+            docs = [doc for doc in stub.candidates(index, query["query"]) if match(doc, query["query"])]
+        else:
+            docs = stub.resolve(index)
+
+        hits = sort_docs(docs, query.get("sort", []))[:query.get("size", 10)]
+        result = {
+            "took": 1,
+            "timed_out": False,
+            "hits": {"total": len(docs), "hits": [{"_index": index, "_source": doc} for doc in hits]}
+        }
+        if "aggs" in query or "aggregations" in query:
+            result["aggregations"] = aggregate(docs, query.get("aggs", query.get("aggregations")))
+
+        self._reply(200, result)
+
+    def _bulk(self, default_index, body):
+        lines = [line for line in body.split("\n") if line.strip()]
+        items = []
+        docs = {}
+        i = 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            op, meta = list(action.items())[0]
+            index = meta.get("_index", default_index)
+            if op == "delete":
+                items.append({op: {"_index": index, "status": 200}})
+                i += 1
+                continue
+            docs.setdefault(index, []).append(json.loads(lines[i + 1]))
+            items.append({op: {"_index": index, "_id": meta.get("_id"), "status": 201}})
+            i += 2
+
+        for index in docs:
+            self.server.load(index, docs[index])
+
+        self._reply(200, {"took": 1, "errors": False, "items": items})
+
+    def _index_admin(self, parts, kind, body):
+        stub = self.server
+        if kind == "_stats":
+            index = parts[0]
+            indexes = [index] if index in stub.indexes else stub.aliases.get(index, [])
+            indices = {}
+            for name in indexes:
+                primaries = {"docs": {"count": len(stub.indexes.get(name, []))},
+                             "indexing": {"index_total": stub.writes[name], "delete_total": 0}}
+                indices[name] = {"uuid": name, "primaries": primaries}
+            totals = {
+                "docs": {"count": sum(stats["primaries"]["docs"]["count"] for stats in indices.values())},
+                "indexing": {"index_total": sum(stats["primaries"]["indexing"]["index_total"] for stats in indices.values()),
+                             "delete_total": 0}
+            }
+            return self._reply(200, {"_all": {"primaries": totals}, "indices": indices})
+        for index in parts[0].split(","):
+            if index not in stub.indexes and index not in stub.aliases and len(parts) > 1:
+                return self._reply(404, {"error": {"type": "index_not_found_exception"}, "status": 404})
+        if kind == "_settings" and self.command == "PUT":
+            with stub.lock:
+                for index in parts[0].split(","):
+                    index_settings = stub.settings.setdefault(index, {})
+                    for name, value in json.loads(body).get("index", {}).items():
+                        if value is None:
+                            index_settings.pop(name, None)
+                        else:
+                            index_settings[name] = value
+        self._reply(200, {"acknowledged": True, "_shards": {"total": 1, "successful": 1, "failed": 0}})
+
+    def _get_indexes(self, names, ignore_unavailable, settings=False):
+        """ Get the aliases (and settings) of the indexes matching the names (indexes, aliases or wildcards) """
+
+        stub = self.server
+        result = {}
+        with stub.lock:
+            for name in names.split(","):
+                if "*" in name:
+                    indexes = fnmatch.filter(stub.indexes, name)
+                elif name in stub.indexes:
+                    indexes = [name]
+                elif name in stub.aliases:
+                    indexes = [index for index in stub.aliases[name] if index in stub.indexes]
+                elif ignore_unavailable:
+                    indexes = []
+                else:
+                    return self._reply(404, {"error": {"type": "index_not_found_exception"}, "status": 404})
+                for index in indexes:
+                    result[index] = {"aliases": {alias: {} for alias, alias_indexes in stub.aliases.items()
+                                                 if index in alias_indexes}}
+                    if settings:
+                        result[index].update({"mappings": {}, "settings": {"index": dict(stub.settings.get(index, {}))}})
+        self._reply(200, result)
+
+    def _aliases(self, body):
+        stub = self.server
+        with stub.lock:
+            for action in body.get("actions", []):
+                op, params = list(action.items())[0]
+                indexes = params.get("indices", [params.get("index")])
+                if op == "add":
+                    for index in indexes:
+                        stub.aliases.setdefault(params["alias"], set()).add(index)
+                elif op == "remove":
+                    for index in indexes:
+                        stub.aliases.get(params["alias"], set()).discard(index)
+                elif op == "remove_index":
+                    for index in indexes:
+                        stub.indexes.pop(index, None)
+                        stub.settings.pop(index, None)
+                        for alias in stub.aliases.values():
+                            alias.discard(index)
+                    stub.terms_cache = {}
+        self._reply(200, {"acknowledged": True})
+
+    def _index(self, index, body):
+        stub = self.server
+        with stub.lock:
+            exists = index in stub.indexes or index in stub.aliases
+            if self.command == "HEAD":
+                return self._reply(200 if exists else 404)
+            if self.command == "PUT":
+                if exists:
+                    return self._reply(400, {"error": {"type": "resource_already_exists_exception"}, "status": 400})
+                stub.indexes[index] = []
+                stub.settings[index] = {}
+                for template in stub.templates.values():
+                    if any(fnmatch.fnmatch(index, pattern) for pattern in template.get("index_patterns", [])):
+                        stub.settings[index].update(template.get("settings", {}))
+                stub.settings[index].update(body.get("settings", {}))
+                return self._reply(200, {"acknowledged": True, "index": index})
+            if self.command == "DELETE":
+                names = index.split(",")
+                if "ignore_unavailable=true" not in self.path and any(name not in stub.indexes for name in names):
+                    return self._reply(404, {"error": {"type": "index_not_found_exception"}, "status": 404})
+                for name in names:
+                    stub.indexes.pop(name, None)
+                    stub.settings.pop(name, None)
+                    for alias in stub.aliases.values():
+                        alias.discard(name)
+                stub.terms_cache = {}
+                return self._reply(200, {"acknowledged": True})
+            if self.command == "GET":
+                if not exists:
+                    return self._reply(404, {"error": {"type": "index_not_found_exception"}, "status": 404})
+                return self._reply(200, {index: {"aliases": {}, "mappings": {},
+                                                 "settings": {"index": dict(stub.settings.get(index, {}))}}})
+
+        raise StubError("Request not supported: %s %s" % (self.command, self.path))
+
+    def _handle(self):
+        try:
+            self._route()
+        except StubError as ex:
+            self._reply(400, {"error": {"type": "stub_exception", "reason": str(ex)}, "status": 400})
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+Synthetic quality models and metrics indexes for the benchmarks.
+
+The generated data is deterministic for a given seed, so the number of
+queries and requests done with it can be compared between runs.
+"""
+
+import random
+
+from datetime import timedelta
+
+from prosoul.models import Attribute, Goal, Metric, MetricData, QualityModel
+
+CALCULATION_TYPES = ['max', 'min', 'avg', 'sum', 'median', 'last']
+
+
+def metric_implementation(nmetric):
+    """ Name of the metric in the metrics index """
+
+    return "metric_%i" % nmetric
+
+
+def generate_quality_model(name, goals=2, attributes=2, metrics=3, depth=0):
+    """
+    Create a quality model in the database
+
+    :param name: name of the quality model
+    :param goals: number of goals in the model
+    :param attributes: number of attributes per goal
+    :param metrics: number of metrics per attribute
+    :param depth: levels of subgoals and subattributes below each goal and attribute
+    :return: the QualityModel object and the list with the implementations of its metrics
+    """
+
+    implementations = []
+
+    def build_attribute(attr_name, level):
+        attribute = Attribute.objects.create(name=attr_name)
+        for _ in range(metrics):
+            nmetric = len(implementations)
+            implementation = metric_implementation(nmetric)
+            implementations.append(implementation)
+            data = MetricData.objects.create(implementation=implementation)
+            metric = Metric.objects.create(name="%s %i" % (name, nmetric), data=data, thresholds="1,2,3,4,5",
+                                           calculation_type=CALCULATION_TYPES[nmetric % len(CALCULATION_TYPES)])
+            attribute.metrics.add(metric)
+        if level < depth:
+            attribute.subattributes.add(build_attribute(attr_name + ".0", level + 1))
+        return attribute
+
+    def build_goal(goal_name, level):
+        goal = Goal.objects.create(name=goal_name)
+        for nattr in range(attributes):
+            goal.attributes.add(build_attribute("%s attribute %i" % (goal_name, nattr), level))
+        if level < depth:
+            goal.subgoals.add(build_goal(goal_name + ".0", level + 1))
+        return goal
+
+    model = QualityModel.objects.create(name=name)
+    for ngoal in range(goals):
+        model.goals.add(build_goal("%s goal %i" % (name, ngoal), 0))
+
+    return model, implementations
+
+
+def generate_metrics_index(implementations, projects=10, samples=12, from_date=None, to_date=None, seed=0):
+    """
+    Generate the docs of a SCAVA metrics index
+
+    :param implementations: names of the metrics in the index
+    :param projects: number of projects with samples for each metric
+    :param samples: number of samples per project and metric, evenly spread between the dates
+    :param from_date: date of the first sample
+    :param to_date: date of the last sample
+    :param seed: seed for the metric values
+    :return: a list with the metric samples docs
+    """
+
+    rand = random.Random(seed)
+    step = (to_date - from_date) / max(samples - 1, 1)
+
+    docs = []
+    for nproject in range(projects):
+        project = "project_%i" % nproject
+        for implementation in implementations:
+            for nsample in range(samples):
+                sample_date = from_date + timedelta(seconds=int((step * nsample).total_seconds()))
+                value = rand.randint(0, 6)
+                docs.append({
+                    "project": project,
+                    "metric_name": implementation,
+                    "metric_es_name": implementation,
+                    "metric_es_value": value,
+                    "metric_value": value,
+                    "datetime": sample_date.strftime("%Y-%m-%dT%H:%M:%S")
+                })
+
+    return docs
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'prosoul.perfdata.PerfDataMiddleware',
 ]
 
 ROOT_URLCONF = 'django_prosoul.urls'
@@ -124,6 +125,10 @@ STATIC_URL = '/static/'
 # This DIRS are used by the dev server to find static contents
 STATICFILES_DIRS = (os.path.join(BASE_DIR, 'django_prosoul/static/'), os.path.join(BASE_DIR, 'prosoul/static/prosoul'))
 
+# Publish the perf data (/metrics and /metrics/runs) without login, e.g. for a Prometheus server
+# in a private network. Otherwise it is only shown to the staff users.
+PROSOUL_PERFDATA_PUBLIC = False
+
 REST_FRAMEWORK = {
     # Use Django's standard `django.contrib.auth` permissions,
     # or allow read-only access for unauthenticated users.
@@ -25,3 +25,8 @@ from django.apps import AppConfig
 
 class ProsoulConfig(AppConfig):
     name = 'prosoul'
+
+    def ready(self):
+        from prosoul.signals import connect_signals
+
+        connect_signals()
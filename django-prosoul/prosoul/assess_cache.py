@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+Cache in local disk of the raw values of the metrics per project collected from
+Elasticsearch in an assessment.
+
+A full assessment stores the raw values of all its queries, and a rescore reads
+them back, so the scores can be computed again with new thresholds without
+querying Elasticsearch. The values are stored per metrics index and generation
+of its data: when the data in the index changes the cached values are no longer
+used, and they are removed by the full assessments done later.
+"""
+
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+from contextlib import contextmanager
+
+from prosoul import perfdata
+
+CACHE_DIR_PATH = os.getenv('PROSOUL_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'prosoul'))
+# File in the dir of each generation locked by the runs using its values
+LOCK_FILE_NAME = '.lock'
+
+# Index and generation of the data cached in the active raw_values_cache() context of each thread,
+# so the assessments done at the same time in several threads don't share their cache dir and mode
+_local = threading.local()
+
+
+def _digest(value):
+    return hashlib.sha1(json.dumps(value, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+def _index_dir(index):
+    return os.path.join(CACHE_DIR_PATH, 'raw_values', _digest(index))
+
+
+def _lock(generation_dir, operation):
+    """
+    Lock the values of a generation, so they are not removed while they are used. The lock
+    is released when the returned file is closed, or when the process ends.
+
+    :param generation_dir: dir with the values of a generation of the index data
+    :param operation: fcntl.LOCK_SH to use the values, fcntl.LOCK_EX | fcntl.LOCK_NB to remove them
+    :return: the locked file, or None if the dir has been removed meanwhile
+    """
+    lock_path = os.path.join(generation_dir, LOCK_FILE_NAME)
+    try:
+        flock = open(lock_path, 'a')
+    except FileNotFoundError:
+        return None
+
+    try:
+        fcntl.flock(flock, operation)
+        # The dir could have been removed while waiting for the lock
+        if os.path.samestat(os.fstat(flock.fileno()), os.stat(lock_path)):
+            return flock
+    except FileNotFoundError:
+        pass
+    except BlockingIOError:
+        flock.close()
+        raise
+
+    flock.close()
+    return None
+
+
+def _prune(index_dir, generation_dir, started):
+    """
+    Remove the values of the generations of the index data older than the current one (not
+    used since the current run started), they will not be used again. The ones in use by other
+    runs are locked, and they are not removed.
+
+    :param index_dir: dir with the values of all the generations of the index data
+    :param generation_dir: dir with the values of the current generation
+    :param started: modification time of the generation dir when the current run started
+    """
+    for name in os.listdir(index_dir):
+        path = os.path.join(index_dir, name)
+        try:
+            if path == generation_dir or os.stat(path).st_mtime >= started:
+                continue
+            flock = _lock(path, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except (BlockingIOError, FileNotFoundError):
+            # In use by another run, or already removed by it
+            continue
+        if flock is None:
+            continue
+        with flock:
+            logging.debug("Removing the cached values in %s", path)
+            shutil.rmtree(path, ignore_errors=True)
+
+
+@contextmanager
+def raw_values_cache(index, generation, rescore=False):
+    """
+    Cache the raw values computed in the context. In rescore mode the values are only
+    read from the cache, and a RuntimeError is raised for the ones not in it. When a full
+    assessment ends without errors the values of the older generations are removed.
+
+    :param index: URL of the metrics index
+    :param generation: generation of the data in the metrics index
+    :param rescore: read the values just from the cache
+    """
+    generation_dir = os.path.join(_index_dir(index), _digest(generation))
+    flock = None
+    while flock is None and (not rescore or os.path.isdir(generation_dir)):
+        os.makedirs(generation_dir, exist_ok=True)
+        flock = _lock(generation_dir, fcntl.LOCK_SH)
+    if flock:
+        # The generations not used since now are older than this one
+        os.utime(generation_dir)
+        started = os.stat(generation_dir).st_mtime
+
+    previous_cache = getattr(_local, 'cache', None)
+    _local.cache = {"dir": generation_dir, "rescore": rescore}
+    try:
+        yield
+    finally:
+        _local.cache = previous_cache
+        if flock:
+            flock.close()
+
+    if not rescore:
+        _prune(_index_dir(index), generation_dir, started)
+
+
+def cached(query, compute):
+    """
+    Get the raw values of a query from the cache. They are computed and stored in the
+    cache if they are not in it, unless in rescore mode.
+
+    :param query: JSON serializable dict identifying the values (kind, metric, params, window ...)
+    :param compute: function to compute the values
+    :return: the raw values of the query
+    """
+    cache = getattr(_local, 'cache', None)
+    if cache is None:
+        return compute()
+
+    path = os.path.join(cache['dir'], _digest(query) + '.json')
+
+    if cache['rescore']:
+        try:
+            with open(path) as fvalues:
+                values = json.load(fvalues)
+        except FileNotFoundError:
+            raise RuntimeError("Values not cached for %s, a full assessment is needed" % json.dumps(query, sort_keys=True))
+        perfdata.count('raw_values_cached', kind=query['kind'])
+        return values
+
+    values = compute()
+
+    os.makedirs(cache['dir'], exist_ok=True)
+    # Written in a temporal file and moved, so a broken file is never read
+    with tempfile.NamedTemporaryFile('w', dir=cache['dir'], suffix='.tmp', delete=False) as fvalues:
+        json.dump(values, fvalues)
+    os.replace(fvalues.name, path)
+    logging.debug("Values cached for %s", query)
+
+    return values
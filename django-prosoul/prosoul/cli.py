@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+Single entry point for the Prosoul command line tools:
+
+    $ prosoul assess -e http://localhost:9200 -i scava-metrics -m "My model"
+
+Only the module of the selected command is imported, and Django, Elasticsearch,
+matplotlib and kidash are loaded only when the command needs them, so
+`prosoul --help` and the arguments errors are shown right away.
+"""
+
+import argparse
+import importlib
+import sys
+
+from prosoul.prosoul_utils import config_logging
+
+# Command name -> (module implementing it, help)
+COMMANDS = {
+    'assess': ('prosoul.prosoul_assess', 'Assess the projects with a Quality Model'),
+    'vis': ('prosoul.prosoul_vis', 'Create the Kibana dashboards for a Quality Model'),
+    'export': ('prosoul.prosoul_export', 'Export Quality Models to a file'),
+    'import': ('prosoul.prosoul_import', 'Import Quality Models from a file'),
+    'metrics': ('prosoul.prosoul_metrics', 'Compute the metrics of a Quality Model for all the projects'),
+    'metrics-import': ('prosoul.metrics_import', 'Load the metrics definition in Prosoul')
+}
+
+
+def get_params(args=None):
+    """
+    Parse the command line. Only the module of the selected command is imported
+    to add its params.
+
+    :param args: list with the command line args, sys.argv if None
+    :return: the module of the command and the parsed params
+    """
+
+    args = sys.argv[1:] if args is None else args
+
+    parser = argparse.ArgumentParser(prog='prosoul', description="Prosoul command line tools")
+    subparsers = parser.add_subparsers(dest='command', metavar='command')
+    for name in sorted(COMMANDS):
+        subparsers.add_parser(name, help=COMMANDS[name][1], add_help=False)
+
+    # The params of the command are not known until its module is imported
+    if not args or args[0] not in COMMANDS:
+        parser.parse_args(args)
+        parser.error("a command is required (%s)" % ", ".join(sorted(COMMANDS)))
+
+    command = args[0]
+    module = importlib.import_module(COMMANDS[command][0])
+    command_parser = argparse.ArgumentParser(prog='prosoul ' + command, description=COMMANDS[command][1])
+    module.add_params(command_parser)
+
+    return module, command_parser.parse_args(args[1:])
+
+
+def main(args=None):
+    module, params = get_params(args)
+    config_logging(params.debug)
+    module.run(params)
+
+
+if __name__ == '__main__':
+    main()
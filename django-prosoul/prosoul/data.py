@@ -20,9 +20,11 @@
 #
 #
 
+import copy
 import json
 import logging
 import os.path
+import threading
 
 import pkg_resources
 
@@ -30,29 +32,124 @@ PANELS_DIR = 'panels/templates'
 
 
 class VizTemplatesData():
+    """
+    Registry with the panel templates. The templates are parsed just once, the first
+    time they are used, and they are parsed again only if their files are modified.
+    The users of the templates get a copy of them so they can change it freely.
+    """
+
+    # Parsed templates: template path -> (modification time, template dict)
+    templates = {}
+    # Titles of the templates available in PANELS_DIR: template path -> title
+    titles = None
+    # Inverse index of the titles: title -> template path
+    paths = None
+
+    lock = threading.RLock()
 
     def fetch(self):
         """
         Read available panel templates and return them
 
-        :return: dict with the path to the template as key  and its content as value
+        :return: tuples with the path to the template and its title
+        """
+
+        for resource_path, title in self.list_templates().items():
+            yield (resource_path, title)
+
+    @classmethod
+    def list_templates(cls):
+        """
+        Find the templates available inside PANELS_DIR. The templates are listed
+        just once and then the titles index is used.
+
+        :return: dict with the path to the template as key and its title as value
+        """
+
+        with cls.lock:
+            if cls.titles is None:
+                titles = {}
+                # The template files could be located inside the pip package
+                for tfilename in sorted(pkg_resources.resource_listdir(__name__, PANELS_DIR)):
+                    if not tfilename.endswith(".json"):
+                        continue
+                    resource_path = '/'.join((PANELS_DIR, tfilename))
+                    if pkg_resources.resource_isdir(__name__, resource_path):
+                        continue
+                    titles[resource_path] = cls.load_template(resource_path)['dashboard']['value']['title']
+                cls.titles = titles
+                cls.paths = {title: tpath for tpath, title in titles.items()}
+
+            return cls.titles
+
+    @classmethod
+    def find_template(cls, title):
+        """
+        Find the path of a template in PANELS_DIR from its title
+
+        :param title: title of the template
+        :return: the path to the template or None if it is not found
         """
 
-        # The template files could be located inside the pip package
-        templates = pkg_resources.resource_listdir(__name__, PANELS_DIR)
+        cls.list_templates()
 
-        for tfilename in templates:
-            if not tfilename.endswith(".json"):
-                continue
-            resource_path = '/'.join((PANELS_DIR, tfilename))
-            if pkg_resources.resource_isdir(__name__, resource_path):
-                continue
-            tstring = pkg_resources.resource_string(__name__, resource_path).decode("utf-8")
-            template = json.loads(tstring)['dashboard']['value']['title']
-            yield (resource_path, template)
+        return cls.paths.get(title)
 
     @classmethod
-    def read_template(self, tpath):
+    def template_mtime(cls, tpath):
+        """
+        Get the modification time of a template file/resource
+
+        :param tpath: path to the template file/resource
+        :return: the modification time or None if it can not be found (i.e. zipped pip package)
+        """
+
+        if os.path.isfile(tpath):
+            return os.path.getmtime(tpath)
+
+        try:
+            resource_file = pkg_resources.resource_filename(__name__, tpath)
+            return os.path.getmtime(resource_file)
+        except (NotImplementedError, OSError):
+            return None
+
+    @classmethod
+    def load_template(cls, tpath):
+        """
+        Get the parsed template from the registry, reading it again if the file
+        has been modified since it was parsed.
+
+        :param tpath: path to the template file/resource
+        :return: a dict with the contents of the template shared by all the users
+        """
+
+        mtime = cls.template_mtime(tpath)
+
+        with cls.lock:
+            if tpath in cls.templates and cls.templates[tpath][0] == mtime:
+                return cls.templates[tpath][1]
+
+            if os.path.isfile(tpath):
+                with open(tpath, "r") as template_file:
+                    dashboard = json.load(template_file)
+            else:
+                logging.debug("Template file not found. Trying to load it from the pip package.")
+                tstring = pkg_resources.resource_string(__name__, tpath).decode("utf-8")
+                logging.debug("Template loaded from the pip package")
+                dashboard = json.loads(tstring)
+
+            cls.templates[tpath] = (mtime, dashboard)
+
+            if cls.titles is not None and tpath in cls.titles:
+                # Keep the titles index updated
+                cls.paths.pop(cls.titles[tpath], None)
+                cls.titles[tpath] = dashboard['dashboard']['value']['title']
+                cls.paths[cls.titles[tpath]] = tpath
+
+        return dashboard
+
+    @classmethod
+    def read_template(cls, tpath):
         """
         Read the contents of a template file trying to read it from the file system
         and if fails, as a resource inside a pip package.
@@ -60,14 +157,5 @@ class VizTemplatesData():
         :param tpath: path to the template file/resource
         :return: a dict with the contents of the template
         """
-        if os.path.isfile(tpath):
-            template_file = open(tpath, "r")
-            dashboard = json.load(template_file)
-            template_file.close()
-        else:
-            logging.debug("Template file not found. Trying to load it from the pip package.")
-            tstring = pkg_resources.resource_string(__name__, tpath).decode("utf-8")
-            logging.debug("Template loaded from the pip package")
-            dashboard = json.loads(tstring)
 
-        return dashboard
+        return copy.deepcopy(cls.load_template(tpath))
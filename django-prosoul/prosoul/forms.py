@@ -28,6 +28,7 @@ from django import forms
 
 from . import data
 from . import data_editor
+from prosoul.prosoul_assess import SCORES_LAYOUTS
 from prosoul.prosoul_utils import BACKEND_METRICS_DATA
 
 from grimoirelab_toolkit.datetime import (str_to_datetime)
@@ -88,6 +89,8 @@ class VisualizationForm(forms.Form):
         self.fields['from_date'] = forms.DateField(label='From date', widget=widget_date_from)
         self.fields['to_date'] = forms.DateField(label='To date', widget=widget_date_to, initial=str_to_datetime(
             "2100-01-01"))
+        self.fields['rescore'] = forms.BooleanField(label='Only rescore (metrics values of the last assessment)',
+                                                    required=False)
 
 
 class AssessmentForm(forms.Form):
@@ -128,3 +131,12 @@ class AssessmentForm(forms.Form):
         self.fields['from_date'] = forms.DateField(label='From date', widget=widget_date_from)
         self.fields['to_date'] = forms.DateField(label='To date', widget=widget_date_to, initial=str_to_datetime(
             "2100-01-01"))
+        self.fields['rescore'] = forms.BooleanField(label='Only rescore (metrics values of the last assessment)',
+                                                    required=False)
+
+        layouts = []
+        for layout in SCORES_LAYOUTS:
+            layouts += ((layout, layout),)
+
+        self.fields['layout'] = forms.ChoiceField(label='Scores layout (a document per metric or per project)',
+                                                  required=False, widget=widget_select, choices=layouts)
@@ -22,12 +22,9 @@
 #
 #
 
-import functools
-
-from time import time
-
 from django import forms
 
+from prosoul import perfdata
 from prosoul.models import Attribute, Metric, QualityModel
 
 from . import data_editor
@@ -36,17 +33,6 @@ SELECT_LINES = 20
 MAX_ITEMS = 1000  # Implement pagination if there are more items
 
 
-def perfdata(func):
-    @functools.wraps(func)
-    def decorator(self, *args, **kwargs):
-        task_init = time()
-        data = func(self, *args, **kwargs)
-        print("%s: Total data collecting time ... %0.3f sec" %
-              (self.__class__.__name__, time() - task_init))
-        return data
-    return decorator
-
-
 class ProsoulEditorForm(forms.Form):
 
     select_widget = forms.Select(attrs={'size': SELECT_LINES, 'class': 'form-control'})
@@ -82,7 +68,7 @@ class ProsoulEditorForm(forms.Form):
 
 class QualityModelForm(ProsoulEditorForm):
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         super(QualityModelForm, self).__init__(*args, **kwargs)
 
@@ -101,7 +87,7 @@ class QualityModelsForm(ProsoulEditorForm):
 
     select_widget = forms.Select(attrs={'class': 'form-control', 'onclick': 'this.form.submit()'})
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         print(args, kwargs)
 
@@ -118,7 +104,7 @@ class QualityModelsForm(ProsoulEditorForm):
 
 class GoalForm(ProsoulEditorForm):
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         super(GoalForm, self).__init__(*args, **kwargs)
 
@@ -135,7 +121,7 @@ class GoalForm(ProsoulEditorForm):
 
 class GoalsForm(ProsoulEditorForm):
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         super(GoalsForm, self).__init__(*args, **kwargs)
 
@@ -152,7 +138,7 @@ class GoalsForm(ProsoulEditorForm):
 
 class AttributeForm(ProsoulEditorForm):
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         super(AttributeForm, self).__init__(*args, **kwargs)
 
@@ -194,7 +180,7 @@ class AttributesForm(ProsoulEditorForm):
 
         return choices
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         super(AttributesForm, self).__init__(*args, **kwargs)
 
@@ -216,7 +202,7 @@ class MetricDataForm(ProsoulEditorForm):
 
 class MetricsForm(ProsoulEditorForm):
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         super(MetricsForm, self).__init__(*args, **kwargs)
 
@@ -234,7 +220,7 @@ class MetricsForm(ProsoulEditorForm):
 class MetricForm(ProsoulEditorForm):
     # This implementation needs to be revisited and simplified
 
-    @perfdata
+    @perfdata.timed('editor_form')
     def __init__(self, *args, **kwargs):
         self.metric_id = None
         self.metric_orm = None
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+import argparse
+import importlib
+
+from django.core.management.base import BaseCommand
+
+from prosoul.cli import COMMANDS
+from prosoul.prosoul_utils import config_logging
+
+
+class ToolCommand(BaseCommand):
+    """ Management command running one of the Prosoul command line tools with its same params """
+
+    tool = None  # name of the tool in prosoul.cli.COMMANDS
+
+    @property
+    def help(self):
+        return COMMANDS[self.tool][1]
+
+    def module(self):
+        return importlib.import_module(COMMANDS[self.tool][0])
+
+    def add_arguments(self, parser):
+        self.module().add_params(parser)
+
+    def handle(self, *args, **options):
+        config_logging(options['debug'])
+        self.module().run(argparse.Namespace(**options))
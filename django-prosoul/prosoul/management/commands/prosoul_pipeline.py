@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+from django.core.management.base import BaseCommand
+
+from prosoul.pipeline import read_steps, run_pipeline
+from prosoul.prosoul_utils import config_logging
+
+
+class Command(BaseCommand):
+    help = 'Run the steps (import, assess, vis, export ...) declared in a JSON file in the same process'
+
+    def add_arguments(self, parser):
+        parser.add_argument('steps_file', help='JSON file with the steps of the pipeline')
+        parser.add_argument('-g', '--debug', action='store_true')
+
+    def handle(self, *args, **options):
+        config_logging(options['debug'])
+
+        summaries = run_pipeline(read_steps(options['steps_file']))
+
+        for summary in summaries:
+            self.stdout.write("%s: %.2f sec" % (summary['tags']['command'], summary['wall_time']))
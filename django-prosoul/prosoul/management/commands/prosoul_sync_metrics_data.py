@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+from django.core.management.base import BaseCommand
+
+from prosoul.forms import ES_URL, METRICS_INDEX
+from prosoul.metrics_import import sync_metrics_data
+
+
+class Command(BaseCommand):
+    help = 'Add the metrics data for the metric ids in the metrics index not already in Prosoul'
+
+    def add_arguments(self, parser):
+        parser.add_argument("-e", "--elastic-url", default=ES_URL,
+                            help="Elasticsearch URL with the metrics")
+        parser.add_argument('-i', '--index', default=METRICS_INDEX, help='Index with the metrics')
+
+    def handle(self, *args, **options):
+        counts = sync_metrics_data(options['elastic_url'], options['index'])
+
+        self.stdout.write("Metrics data added: %(added)i, unchanged: %(unchanged)i" % counts)
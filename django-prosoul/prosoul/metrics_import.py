@@ -23,166 +23,282 @@
 #
 
 import argparse
+import json
 import logging
-import os
-
-
-from time import time
 
 import requests
 
-import django
-# settings.configure()
-os.environ['DJANGO_SETTINGS_MODULE'] = 'django_prosoul.settings'
-django.setup()
+from django.db import transaction
 
-from prosoul.models import DataSourceType, Metric
+from prosoul import perfdata
+from prosoul.prosoul_utils import config_logging, setup_django
 
+HEADERS_JSON = {"Content-Type": "application/json"}
+PAGE_SIZE = 1000  # number of (data source, metric name) pairs per composite aggregation page
 
-def get_params():
-    parser = argparse.ArgumentParser(usage="usage: metrics_import.py [options]",
-                                     description="Load CROSSMINER metrics definition in Prosoul")
+
+def add_params(parser):
     parser.add_argument("-e", "--elastic-url", required=True,
                         help="Elasticsearch URL with the metrics")
     parser.add_argument('-g', '--debug', action='store_true')
     parser.add_argument('-i', '--index', required='True', help='Index with the metrics')
+    parser.add_argument('--prune', action='store_true',
+                        help='Remove the metrics not found anymore in the index')
 
-    return parser.parse_args()
 
+def get_params(args=None):
+    parser = argparse.ArgumentParser(usage="usage: metrics_import.py [options]",
+                                     description="Load CROSSMINER metrics definition in Prosoul")
+    add_params(parser)
 
-def search_agg():
-    query = """
-    {
-      "query": {
-        "bool": {
-          "must": []
-        }
-      },
-      "size": 0,
-      "aggs": {
-        "2": {
-          "terms": {
-            "field": "metric_class",
-            "size": 10000,
-            "order": {
-              "_count": "desc"
-            }
-          },
-          "aggs": {
-            "3": {
-              "terms": {
-                "field": "metric_name",
-                "size": 10000,
-                "order": {
-                  "_count": "desc"
-                }
-              },
-              "aggs": {
-                "4": {
-                  "terms": {
-                    "field": "metric_name",
-                    "size": 10000,
-                    "order": {
-                      "_count": "desc"
-                    }
-                  }
+    return parser.parse_args(args)
+
+
+def search_composite(after_key=None):
+    """
+    Build the query to get a page of the (data source, metric name) pairs in the index
+
+    :param after_key: key of the last pair in the previous page
+    :return: the query to be sent to Elasticsearch
+    """
+
+    query = {
+        "size": 0,
+        "aggs": {
+            "metrics": {
+                "composite": {
+                    "size": PAGE_SIZE,
+                    "sources": [
+                        {"data_source": {"terms": {"field": "metric_class"}}},
+                        {"metric_name": {"terms": {"field": "metric_name"}}}
+                    ]
                 }
-              }
             }
-          }
         }
-      }
     }
+
+    if after_key:
+        query["aggs"]["metrics"]["composite"]["after"] = after_key
+
+    return json.dumps(query)
+
+
+def fetch_catalog(es_url, index):
+    """
+    Get the metrics catalog from the metrics index paging a composite aggregation
+
+    :param es_url: Elasticsearch URL
+    :param index: index with the metrics
+    :return: a dict with the metric names (set) per data source
+    """
+
+    search_url = es_url + "/" + index + "/_search"
+
+    catalog = {}
+    after_key = None
+
+    while True:
+        res = requests.post(search_url, data=search_composite(after_key), headers=HEADERS_JSON)
+        res.raise_for_status()
+        agg = res.json()["aggregations"]["metrics"]
+
+        for bucket in agg["buckets"]:
+            metric_name = bucket["key"]["metric_name"]
+            if len(metric_name.split(":")) > 4:
+                # Bad metrics: 12:18:43:11:000_bugsConsidered
+                continue
+            catalog.setdefault(bucket["key"]["data_source"], set()).add(metric_name)
+
+        after_key = agg.get("after_key")
+        if not agg["buckets"] or not after_key:
+            break
+
+    return catalog
+
+
+def sync_catalog(catalog, prune=False):
     """
+    Sync the metrics catalog with the metrics in the database. Only the data sources
+    and metrics not already in the database are added, all of them in bulk.
 
-    return query
+    :param catalog: a dict with the metric names (set) per data source
+    :param prune: remove the metrics of the catalog data sources not found in the catalog
+    :return: a dict with the number of added, unchanged and removed metrics (the ones
+             to be removed if prune is not enabled)
+    """
 
+    from prosoul.models import DataSourceType, Metric
+
+    with transaction.atomic():
+        data_sources = set(DataSourceType.objects.filter(name__in=catalog).values_list('name', flat=True))
+        new_data_sources = [DataSourceType(name=name) for name in sorted(set(catalog) - data_sources)]
+        DataSourceType.objects.bulk_create(new_data_sources)
+        data_sources_orm = DataSourceType.objects.filter(name__in=catalog).in_bulk(field_name='name')
+        logging.debug('Added data sources: %i', len(new_data_sources))
+
+        existing = set(Metric.objects.values_list('name', flat=True))
+
+        new_metrics = {}
+        catalog_metrics = set()
+        for data_source in sorted(catalog):
+            catalog_metrics |= catalog[data_source]
+            for name in sorted(catalog[data_source] - existing):
+                # Metric names are unique, the first data source with a metric owns it
+                new_metrics.setdefault(name, Metric(name=name, data_source_type=data_sources_orm[data_source]))
+        Metric.objects.bulk_create(new_metrics.values())
+
+        removed = Metric.objects.filter(data_source_type__name__in=catalog).exclude(name__in=catalog_metrics)
+        nremoved = removed.count()
+        if prune and nremoved:
+            removed.delete()
+
+    return {
+        "added": len(new_metrics),
+        "unchanged": len(catalog_metrics & existing),
+        "removed": nremoved
+    }
 
-def process_agg(res):
-    metrics = {}
 
-    for data_source in res.json()["aggregations"]["2"]["buckets"]:
-        if data_source['key'] not in metrics:
-            metrics[data_source['key']] = {}
+def load_metrics(es_url, index, prune=False):
+    """
+    Load the metrics catalog from the metrics index in the database
 
-        for metric_class in data_source["3"]["buckets"]:
-            if metric_class['key'] not in metrics[data_source['key']]:
-                metrics[data_source['key']][metric_class['key']] = []
+    :param es_url: Elasticsearch URL
+    :param index: index with the metrics
+    :param prune: remove the metrics of the data sources not found anymore in the index
+    :return: a dict with the number of added, unchanged and removed metrics
+    """
 
-            for metric_name in metric_class["4"]["buckets"]:
-                if len(metric_name['key'].split(":")) > 4:
-                    # Bad metrics: 12:18:43:11:000_bugsConsidered
-                    continue
-                metrics[data_source['key']][metric_class['key']].append(metric_name['key'])
+    catalog = fetch_catalog(es_url, index)
 
-    return metrics
+    return sync_catalog(catalog, prune)
 
 
-def add(cls_orm, **params):
-    """ Add an object if it does not exists """
+def search_metric_ids(after_key=None):
+    """
+    Build the query to get a page of the metric ids in the index with their metric name
+
+    :param after_key: key of the last metric id in the previous page
+    :return: the query to be sent to Elasticsearch
+    """
+
+    query = {
+        "size": 0,
+        "aggs": {
+            "metric_ids": {
+                "composite": {
+                    "size": PAGE_SIZE,
+                    "sources": [
+                        {"metric_id": {"terms": {"field": "metric_id"}}}
+                    ]
+                },
+                "aggs": {
+                    "metric_name": {
+                        "terms": {
+                            "field": "metric_name",
+                            "size": 1,
+                            "order": {
+                                "_count": "desc"
+                            }
+                        }
+                    }
+                }
+            }
+        }
+    }
 
-    obj_orm = None
+    if after_key:
+        query["aggs"]["metric_ids"]["composite"]["after"] = after_key
 
-    try:
-        obj_orm = cls_orm.objects.get(**params)
-        # logging.debug('Already exists %s: %s', cls_orm.__name__, params)
-    except cls_orm.DoesNotExist:
-        obj_orm = cls_orm(**params)
-        try:
-            obj_orm.save()
-            logging.debug('Added %s: %s', cls_orm.__name__, params)
-        except django.db.utils.IntegrityError as ex:
-            logging.error("Can't add %s: %s", cls_orm.__name__, params)
-            logging.error(ex)
+    return json.dumps(query)
 
-    return obj_orm
 
+def fetch_metric_ids(es_url, index):
+    """
+    Get the metric ids in the metrics index with the name of each one paging a composite aggregation
 
-def load_metrics(es_url, index):
+    :param es_url: Elasticsearch URL
+    :param index: index with the metrics
+    :return: a list with (metric name, metric id) tuples or None if the index does not exist
+    """
 
     search_url = es_url + "/" + index + "/_search"
 
-    res = requests.post(search_url, data=search_agg())
+    metric_ids = []
+    after_key = None
+
+    while True:
+        res = requests.post(search_url, data=search_metric_ids(after_key), headers=HEADERS_JSON)
+        if res.status_code == 404:
+            return None
+        res.raise_for_status()
+        agg = res.json()["aggregations"]["metric_ids"]
 
-    metrics = process_agg(res)
+        for bucket in agg["buckets"]:
+            names = bucket["metric_name"]["buckets"]
+            if names:
+                metric_ids.append((names[0]["key"], bucket["key"]["metric_id"]))
 
-    ndata_sources = 0
-    nmetrics = 0
+        after_key = agg.get("after_key")
+        if not agg["buckets"] or not after_key:
+            break
 
-    for data_source in metrics:
-        pparams = {"name": data_source}
-        data_source_orm = add(DataSourceType, **pparams)
+    return metric_ids
 
-        ndata_sources += 1
 
-        for metric_class in metrics[data_source]:
-            metric_params = {"mclass": metric_class, "data_source_type": data_source_orm}
-            for metric in metrics[data_source][metric_class]:
-                metric_params["name"] = metric
-                add(Metric, **metric_params)
+def sync_metrics_data(es_url, index):
+    """
+    Add a MetricData for each metric id in the metrics index not already in the database.
+    The MetricData objects are identified by its description "metric_name - metric_id",
+    so the sync can be run as many times as needed.
 
-                nmetrics += 1
+    :param es_url: Elasticsearch URL
+    :param index: index with the metrics
+    :return: a dict with the number of added and unchanged metrics data
+    """
 
-        data_source_orm.save()
+    from prosoul.models import MetricData
 
-    return nmetrics
+    metric_ids = fetch_metric_ids(es_url, index)
+    if metric_ids is None:
+        logging.error("Index %s does not exist", index)
+        return {"added": 0, "unchanged": 0}
 
+    with transaction.atomic():
+        existing = set(MetricData.objects.values_list('description', flat=True))
 
-if __name__ == '__main__':
+        new_metrics_data = {}
+        for name, metric_id in metric_ids:
+            description = "{} - {}".format(name, metric_id)
+            if description not in existing:
+                new_metrics_data[description] = MetricData(implementation=name, description=description)
+        MetricData.objects.bulk_create(new_metrics_data.values())
 
-    task_init = time()
+    logging.debug("Added metrics data: %i", len(new_metrics_data))
 
-    args = get_params()
+    return {
+        "added": len(new_metrics_data),
+        "unchanged": len(metric_ids) - len(new_metrics_data)
+    }
 
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
-        logging.debug("Debug mode activated")
-    else:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
 
-    nmetrics = load_metrics(args.elastic_url, args.index)
+def run(args):
+    """ Load the metrics using the params from the command line """
 
-    logging.debug("Total loading time ... %.2f sec", time() - task_init)
-    print("Metrics loaded", nmetrics)
+    setup_django()
+
+    with perfdata.run('metrics_import', index=args.index) as import_run:
+        counts = load_metrics(args.elastic_url, args.index, args.prune)
+
+    logging.debug("Total loading time ... %.2f sec", import_run.wall_time)
+    print("Metrics added: %(added)i, unchanged: %(unchanged)i, removed: %(removed)i" % counts)
+
+
+def main(args=None):
+    args = get_params(args)
+    config_logging(args.debug)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,336 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+Timers and counters for the hot paths of Prosoul (Elasticsearch queries, quality
+model walks, scoring, publishing and rendering).
+
+Each observation is tagged (model, metric, window ...) and it is aggregated in the
+process registry, exported in Prometheus format in /metrics, and in the run
+(request, assessment ...) active in the thread, whose summary can be dumped as JSON.
+
+Django is only imported by the views and the middleware, so the command line
+tools can use this module before setting up Django.
+"""
+
+import functools
+import json
+import logging
+import threading
+
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from time import perf_counter
+
+HIGH_CARDINALITY_TAGS = ('window',)  # tags kept in the runs summaries but not in the process metrics
+MAX_RUNS = 50  # number of summaries of finished runs kept in memory
+METRICS_PREFIX = 'prosoul_'
+PROMETHEUS_CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Registry:
+    """ Timers and counters aggregated by name and tags """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.timers = {}  # (name, tags) -> [count, total seconds, max seconds]
+        self.counters = {}  # (name, tags) -> value
+
+    def observe(self, name, seconds, tags):
+        key = (name, tuple(sorted(tags.items())))
+        with self.lock:
+            stats = self.timers.setdefault(key, [0, 0.0, 0.0])
+            stats[0] += 1
+            stats[1] += seconds
+            stats[2] = max(stats[2], seconds)
+
+    def count(self, name, value, tags):
+        key = (name, tuple(sorted(tags.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def summary(self):
+        """ Timers (slowest first) and counters in a JSON serializable dict """
+
+        with self.lock:
+            timers = [{"name": name, "tags": dict(tags), "count": stats[0],
+                       "total": round(stats[1], 6), "max": round(stats[2], 6)}
+                      for (name, tags), stats in self.timers.items()]
+            counters = [{"name": name, "tags": dict(tags), "value": value}
+                        for (name, tags), value in self.counters.items()]
+
+        timers.sort(key=lambda timer: timer['total'], reverse=True)
+        counters.sort(key=lambda counter: (counter['name'], sorted(counter['tags'].items())))
+
+        return {"timers": timers, "counters": counters}
+
+    def prometheus(self):
+        """ Timers and counters in the Prometheus text exposition format """
+
+        with self.lock:
+            timers = sorted(self.timers.items())
+            counters = sorted(self.counters.items())
+
+        timers_by_name = {}
+        for (name, tags), values in timers:
+            timers_by_name.setdefault(name, []).append((tags, values))
+
+        lines = []
+        for name, name_timers in sorted(timers_by_name.items()):
+            # A summary just has the count and sum samples, the max is published as its own gauge
+            metric = METRICS_PREFIX + name + "_seconds"
+            lines.append("# TYPE %s summary" % metric)
+            for tags, (count_, total, max_) in name_timers:
+                labels = _prometheus_labels(tags)
+                lines.append("%s_count%s %i" % (metric, labels, count_))
+                lines.append("%s_sum%s %.6f" % (metric, labels, total))
+            lines.append("# TYPE %s_max gauge" % metric)
+            for tags, (count_, total, max_) in name_timers:
+                lines.append("%s_max%s %.6f" % (metric, _prometheus_labels(tags), max_))
+
+        last_name = None
+        for (name, tags), value in counters:
+            metric = METRICS_PREFIX + name + "_total"
+            if name != last_name:
+                lines.append("# TYPE %s counter" % metric)
+                last_name = name
+            lines.append("%s%s %s" % (metric, _prometheus_labels(tags), value))
+
+        return "\n".join(lines) + "\n"
+
+
+class Run:
+    """ Timers and counters of a request, an assessment or any other unit of work """
+
+    def __init__(self, name, tags):
+        self.name = name
+        self.tags = tags
+        self.registry = Registry()
+        self.start = datetime.now(timezone.utc)
+        self.perf_start = None
+        self.previous = None  # run active in the thread when this one was started
+        self.wall_time = None
+
+    def summary(self):
+        summary = {
+            "name": self.name,
+            "tags": self.tags,
+            "start": self.start.isoformat(),
+            "wall_time": round(self.wall_time, 6) if self.wall_time is not None else None
+        }
+        summary.update(self.registry.summary())
+        return summary
+
+    def dump(self, summary_file):
+        """ Dump the summary of the run to a JSON file """
+
+        with open(summary_file, 'w') as fsummary:
+            json.dump(self.summary(), fsummary, indent=True)
+
+
+REGISTRY = Registry()
+RUNS = deque(maxlen=MAX_RUNS)
+_local = threading.local()
+
+
+def _prometheus_labels(tags):
+    if not tags:
+        return ""
+    labels = []
+    for tag, value in tags:
+        value = value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        labels.append('%s="%s"' % (tag, value))
+    return "{" + ",".join(labels) + "}"
+
+
+def _tags(tags):
+    """ Tags of an observation: the ones of the current run updated with the given ones """
+
+    current = current_run()
+    all_tags = dict(current.tags) if current else {}
+    all_tags.update(tags)
+    return {tag: str(value) for tag, value in all_tags.items() if value is not None}
+
+
+def current_run():
+    """ Get the run active in the current thread, if any """
+
+    return getattr(_local, 'run', None)
+
+
+def start_run(name, **tags):
+    """
+    Start collecting the timers and counters of a unit of work done in the current thread
+
+    :param name: name of the run (request, assess ...)
+    :param tags: tags added to all the observations done in the run
+    :return: the Run started
+    """
+
+    current = Run(name, {tag: str(value) for tag, value in tags.items() if value is not None})
+    current.previous = current_run()
+    current.perf_start = perf_counter()
+    _local.run = current
+
+    return current
+
+
+def finish_run(current):
+    """
+    Finish a run started in the current thread. Its summary is kept with the ones of the last runs.
+
+    :param current: the Run to finish
+    :return: the summary of the run
+    """
+
+    current.wall_time = perf_counter() - current.perf_start
+    _local.run = current.previous
+
+    summary = current.summary()
+    RUNS.append(summary)
+    REGISTRY.observe('run', current.wall_time,
+                     {tag: value for tag, value in dict(current.tags, run=current.name).items()
+                      if tag not in HIGH_CARDINALITY_TAGS})
+    logging.debug("Run %s %s finished in %.3f sec", current.name, current.tags, current.wall_time)
+
+    return summary
+
+
+@contextmanager
+def run(name, **tags):
+    """ Collect the timers and counters of the code in the context in a run """
+
+    current = start_run(name, **tags)
+    try:
+        yield current
+    finally:
+        finish_run(current)
+
+
+def observe(name, seconds, **tags):
+    """ Add the duration of an operation to the timer `name` """
+
+    tags = _tags(tags)
+    current = current_run()
+    if current:
+        current.registry.observe(name, seconds, tags)
+    REGISTRY.observe(name, seconds, {tag: tag_value for tag, tag_value in tags.items() if tag not in HIGH_CARDINALITY_TAGS})
+
+
+def count(name, value=1, **tags):
+    """ Increase the counter `name` """
+
+    tags = _tags(tags)
+    current = current_run()
+    if current:
+        current.registry.count(name, value, tags)
+    REGISTRY.count(name, value, {tag: tag_value for tag, tag_value in tags.items() if tag not in HIGH_CARDINALITY_TAGS})
+
+
+@contextmanager
+def timer(name, **tags):
+    """ Time the code in the context using the timer `name` """
+
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, perf_counter() - start, **tags)
+
+
+def timed(name, **tags):
+    """ Decorator to time a function using the timer `name`, tagged with the function name """
+
+    def wrapper(func):
+        @functools.wraps(func)
+        def decorator(*args, **kwargs):
+            with timer(name, function=func.__qualname__, **tags):
+                return func(*args, **kwargs)
+        return decorator
+    return wrapper
+
+
+def window(from_date, to_date):
+    """ Tag for the time window of a computation, the dates can be datetimes or yyyy-mm-dd strings """
+
+    if not isinstance(from_date, str):
+        from_date = from_date.strftime('%Y-%m-%d')
+    if not isinstance(to_date, str):
+        to_date = to_date.strftime('%Y-%m-%d')
+
+    return "%s/%s" % (from_date, to_date)
+
+
+def __allowed(request):
+    """ The perf data is shown to the staff users, or to anyone if PROSOUL_PERFDATA_PUBLIC is enabled """
+
+    from django.conf import settings
+
+    if getattr(settings, 'PROSOUL_PERFDATA_PUBLIC', False):
+        return True
+
+    return request.user.is_active and request.user.is_staff
+
+
+def metrics_view(request):
+    """ Process timers and counters in Prometheus format """
+
+    from django.http import HttpResponse, HttpResponseForbidden
+
+    if not __allowed(request):
+        return HttpResponseForbidden()
+
+    return HttpResponse(REGISTRY.prometheus(), content_type=PROMETHEUS_CONTENT_TYPE)
+
+
+def runs_view(request):
+    """ Summaries of the last runs in JSON format """
+
+    from django.http import HttpResponseForbidden, JsonResponse
+
+    if not __allowed(request):
+        return HttpResponseForbidden()
+
+    return JsonResponse({"runs": list(RUNS)})
+
+
+class PerfDataMiddleware:
+    """ Collect the timers and counters of each request in a run tagged with its view """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        from django.urls import Resolver404, resolve
+
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            match = None
+
+        if match and match.func in (metrics_view, runs_view):
+            return self.get_response(request)
+
+        view = match.view_name if match else 'not_found'
+        with run('request', view=view, method=request.method):
+            response = self.get_response(request)
+            count('http_responses', status=response.status_code)
+
+        return response
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+Run several Prosoul command line tools one after the other in the same process.
+
+The steps share the warm state of the process: Django is set up just once, the
+compiled quality models are kept in memory (they are compiled again after an
+import), and the HTTP session, the Elasticsearch clients and the parsed panel
+templates are reused. The steps are declared in a JSON file, with the params of
+each step as they are given to the `prosoul` command:
+
+    {
+        "steps": [
+            {"command": "import", "args": ["-f", "qm.json"]},
+            {"command": "vis", "args": ["-e", "http://localhost:9200", "-m", "My model"]}
+        ]
+    }
+"""
+
+import json
+import logging
+
+from prosoul import cli, perfdata
+from prosoul.prosoul_assess import clear_models_cache, models_cache
+
+# Commands that change the quality models, the compiled models are dropped after them
+MODEL_WRITERS = ('import',)
+
+
+def read_steps(steps_file):
+    """
+    Read the steps of a pipeline
+
+    :param steps_file: path to the JSON file with the steps
+    :return: a list of (command, args) tuples
+    """
+
+    with open(steps_file) as fsteps:
+        pipeline = json.load(fsteps)
+
+    steps = []
+    for nstep, step in enumerate(pipeline['steps']):
+        if step.get('command') not in cli.COMMANDS:
+            raise RuntimeError("Unknown command in step %i: %s" % (nstep, step.get('command')))
+        steps.append((step['command'], [str(arg) for arg in step.get('args', [])]))
+
+    return steps
+
+
+def run_pipeline(steps):
+    """
+    Run the steps of a pipeline. The params of all the steps are parsed before
+    running the first one, so the errors in them are found without doing any work.
+
+    :param steps: list of (command, args) tuples
+    :return: a list with the summary of the run of each step
+    """
+
+    parsed_steps = [(command,) + cli.get_params([command] + args) for command, args in steps]
+
+    summaries = []
+    with models_cache():
+        for command, module, params in parsed_steps:
+            logging.info("Running the pipeline step %s", command)
+            with perfdata.run('pipeline_step', command=command) as step_run:
+                module.run(params)
+            if command in MODEL_WRITERS:
+                clear_models_cache()
+            logging.info("Pipeline step %s done in %.2f sec", command, step_run.wall_time)
+            summaries.append(step_run.summary())
+
+    return summaries
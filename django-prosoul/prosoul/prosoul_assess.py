@@ -24,37 +24,40 @@
 #
 
 import argparse
+import bisect
+import collections
 import copy
 import csv
-import dateutil
+import hashlib
 import json
 import logging
-import operator
 import os
+import threading
 
-import requests
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from time import perf_counter
 
-import django
-# settings.configure()
-os.environ['DJANGO_SETTINGS_MODULE'] = 'django_prosoul.settings'
-django.setup()
+import dateutil.relativedelta
 
 from grimoirelab_toolkit.datetime import (datetime_utcnow,
                                           str_to_datetime)
 
-import matplotlib.pyplot as plot
-
-from elasticsearch import helpers, Elasticsearch
-
-from prosoul.models import QualityModel
-from prosoul.prosoul_utils import find_metric_name_field
+from prosoul import assess_cache, perfdata
+from prosoul.prosoul_utils import (config_logging, es_connection, find_date_field, find_metric_name_field,
+                                   http_session, setup_django)
 
 ASSESSMENT_CSV_DIR_PATH = 'prosoul/static/prosoul/'
 ASSESSMENT_CSV_FILE_NAME = 'assessment_csv.csv'
+ASSESSMENT_PROJECTS_FILE_NAME = 'assessment_projects.json'
+# The projects assessment is only shown to the logged in users, so it is not dumped in the static files
+ASSESSMENT_PROJECTS_DIR_PATH = os.getenv('PROSOUL_ASSESSMENT_DIR',
+                                         os.path.join(os.path.expanduser('~'), '.local', 'share', 'prosoul'))
 THRESHOLDS = ["Very Poor", "Poor", "Fair", "Good", "Very Good"]
 HEADERS_JSON = {"Content-Type": "application/json"}
 MAX_PROJECTS = 10000  # max number of projects to analyze
 HTTPS_CHECK_CERT = False
+SLOW_QUERY_SECS = float(os.getenv('PROSOUL_SLOW_QUERY_SECS', 10))  # queries slower than it are logged
 
 SCORES = "_scores"
 NULL_SCORES = "_null_scores"
@@ -64,19 +67,100 @@ SCORE_QUARTERS = "_scores_by_quarters"
 NULL_SCORE_QUARTERS = "_null_scores_by_quarters"
 ALL_SCORE_QUARTERS = "_all_scores_by_quarters"
 
+ROLLUPS = "_rollups"
+ROLLUP_QUARTERS = "_rollups_by_quarters"
+
+PROJECT_SCORES = "_project_scores"
+PROJECT_SCORE_QUARTERS = "_project_scores_by_quarters"
+
+# Layouts of the scores: a document per metric and project, or a document per project with all its scores
+SCORES_LAYOUT_METRICS = "metrics"
+SCORES_LAYOUT_PROJECTS = "projects"
+SCORES_LAYOUTS = [SCORES_LAYOUT_METRICS, SCORES_LAYOUT_PROJECTS]
+
+# Mapping of the scores indexes, installed with index templates before publishing them. The strings are
+# keywords (a single field, no text and keyword pair). The score_<metric> fields used by the radar panels
+# still add a field per metric to the mapping, Kibana needs a field for each vertex: they are floats with
+# just doc values, no inverted index, as only aggregations are done on them
+SCORES_MAPPING = {
+    "item": {
+        "dynamic_templates": [
+            {"metric_scores": {"match": "score_*", "mapping": {"type": "float", "index": False}}},
+            {"strings": {"match_mapping_type": "string", "mapping": {"type": "keyword"}}}
+        ],
+        "properties": {
+            "project": {"type": "keyword"},
+            "model": {"type": "keyword"},
+            "goal": {"type": "keyword"},
+            "attribute": {"type": "keyword"},
+            "metric": {"type": "keyword"},
+            "level": {"type": "keyword"},
+            "type": {"type": "keyword"},
+            "calculation_type": {"type": "keyword", "index": False},
+            "score": {"type": "float"},
+            "has_score": {"type": "boolean"},
+            "raw_value": {"type": "float", "index": False},
+            "start_date": {"type": "date"},
+            "end_date": {"type": "date"},
+            "creation_date": {"type": "date"},
+            "backend_metrics_data": {"type": "keyword"},
+            "model_generation": {"type": "keyword"},
+            "goals": {"type": "nested", "properties": {
+                "goal": {"type": "keyword"},
+                "score": {"type": "float"}
+            }},
+            "attributes": {"type": "nested", "properties": {
+                "attribute": {"type": "keyword"},
+                "score": {"type": "float"}
+            }},
+            "metrics": {"type": "nested", "properties": {
+                "goal": {"type": "keyword"},
+                "attribute": {"type": "keyword"},
+                "metric": {"type": "keyword"},
+                "calculation_type": {"type": "keyword", "index": False},
+                "score": {"type": "float"},
+                "raw_value": {"type": "float", "index": False}
+            }}
+        }
+    }
+}
+# Each assessment loads the scores in new indexes (a generation), named after the aliases used to read them
+# and the creation date of the assessment. They have no replicas and are not refreshed while they are loaded
+SCORES_SETTINGS = {"number_of_shards": 1, "number_of_replicas": 0, "refresh_interval": "-1"}
+SCORES_REPLICAS = int(os.getenv('PROSOUL_SCORES_REPLICAS', 1))  # replicas of the scores once they are loaded
+SCORES_GENERATION_FORMAT = "%Y%m%d%H%M%S%f"  # the generations sorted by name are sorted by creation date
+
 SCORES_QUARTER_TYPE = "quarter"
 SCORES_ALL_TYPE = "all"
 
+# Relations of the quality models read in advance when a model is compiled
+MODEL_PREFETCH = ['goals__subgoals', 'goals__attributes__subattributes', 'goals__attributes__metrics__data']
+# Relations of the subgoals and subattributes, read in advance a level of the model each time
+SUBGOALS_PREFETCH = ['subgoals', 'attributes__subattributes', 'attributes__metrics__data']
+SUBATTRIBUTES_PREFETCH = ['subattributes', 'metrics__data']
 
-def get_params():
-    parser = argparse.ArgumentParser(usage="usage: prosoul_assess.py [options]",
-                                     description="Create a Kibana Dashboard to show a Quality Model")
+# State of the contexts active in each thread, so the assessments done at the same time don't share it:
+# - models: compiled quality models by name, only kept inside a models_cache() context
+# - queries: values of the metric queries done inside a queries_memo() context, canonical query -> values
+_local = threading.local()
+
+# Sorted raw values of the metrics kept in memory to check thresholds on them, the least recently
+# used ones are discarded: (params of the metric values, generation of the index data) -> values
+METRIC_VALUES_CACHE_SIZE = 128
+_metric_values_cache = collections.OrderedDict()
+_metric_values_lock = threading.Lock()
+
+# Projects assessment read from ASSESSMENT_PROJECTS_FILE_NAME: file path -> ((modification time, size), projects)
+_projects_cache = {}
+
+
+def add_params(parser):
     parser.add_argument("-e", "--elastic-url", required=True,
                         help="Elasticsearch URL with the metrics")
     parser.add_argument('-g', '--debug', action='store_true')
     parser.add_argument('-i', '--index', required=True, help='Index with the metrics')
-    parser.add_argument('-m', '--model', required=True,
-                        help='Model to be used to build the Dashboard')
+    parser.add_argument('-m', '--model', required=True, action='append',
+                        help='Model to assess (it can be used several times to assess several models together)')
     parser.add_argument('-b', '--backend-metrics-data', default='grimoirelab',
                         help='Backend metrics data to use (grimoirelab, ossmeter, ...)')
     parser.add_argument('--from-date', default='1970-01-01',
@@ -88,8 +172,108 @@ def get_params():
     parser.add_argument('--csvfile', required=False,
                         help='Generate a CSV file with the scores of the assessment)')
     parser.add_argument('--attribute', help='Generate only the assessment for an attribute')
+    parser.add_argument('--perfdata', help='File to dump the timers and counters of the assessment (JSON)')
+    parser.add_argument('--slow-query', type=float, default=SLOW_QUERY_SECS,
+                        help='Log the metric queries slower than these seconds (%i by default)' % SLOW_QUERY_SECS)
+    parser.add_argument('--cost-report', action='store_true',
+                        help='Show the metrics ranked by the cost of their queries')
+    parser.add_argument('--rescore', action='store_true',
+                        help='Compute the scores with the metrics values cached in the last assessment')
+    parser.add_argument('--layout', choices=SCORES_LAYOUTS, default=SCORES_LAYOUT_METRICS,
+                        help='Publish a document per metric and project (metrics, by default) '
+                             'or a document per project with all its scores (projects)')
+
+
+def get_params(args=None):
+    parser = argparse.ArgumentParser(usage="usage: prosoul_assess.py [options]",
+                                     description="Assess the projects using a Quality Model")
+    add_params(parser)
+
+    return parser.parse_args(args)
+
+
+def search(es_url, es_index, es_query, metric, window):
+    """
+    Run a search in Elasticsearch recording its cost for the metric: request size, client side
+    latency, ES took, number of buckets and response size. The queries slower than
+    SLOW_QUERY_SECS are logged.
+
+    :param es_url: Elasticsearch URL
+    :param es_index: Elasticsearch index to search in
+    :param es_query: query to send
+    :param metric: name of the metric computed with the query
+    :param window: time window of the query (from_date/to_date)
+    :return: the search result
+    """
+    if logging.getLogger().isEnabledFor(logging.DEBUG):
+        logging.debug("Query for %s (%s): %s", metric, window, es_query)
+
+    start = perf_counter()
+    res = http_session().get(es_url + "/" + es_index + "/_search", data=es_query, verify=HTTPS_CHECK_CERT,
+                             headers=HEADERS_JSON)
+    latency = perf_counter() - start
+    res.raise_for_status()
+    result = res.json()
+
+    nbuckets = sum(len(agg.get('buckets', [])) for agg in result.get('aggregations', {}).values())
+
+    perfdata.observe('es_query', latency, metric=metric, window=window)
+    perfdata.observe('es_took', result.get('took', 0) / 1000, metric=metric, window=window)
+    perfdata.count('es_request_bytes', len(es_query.encode('utf-8')), metric=metric, window=window)
+    perfdata.count('es_response_bytes', len(res.content), metric=metric, window=window)
+    perfdata.count('es_buckets', nbuckets, metric=metric, window=window)
+
+    if latency >= SLOW_QUERY_SECS:
+        logging.warning("Slow query for %s (%s): %.3f sec (took %s ms, %i buckets, %i bytes)\n%s",
+                        metric, window, latency, result.get('took'), nbuckets, len(res.content), es_query)
+
+    return result
+
 
-    return parser.parse_args()
+def rank_metrics_cost(run_summary):
+    """
+    Rank the metrics by the cost of their queries in an assessment run
+
+    :param run_summary: summary of the run with the timers and counters of the queries
+    :return: a list of dicts with the cost of each metric, the most expensive first
+    """
+    metrics = {}
+
+    for timer in run_summary['timers']:
+        if timer['name'] not in ('es_query', 'es_took') or 'metric' not in timer['tags']:
+            continue
+        cost = metrics.setdefault(timer['tags']['metric'], {'metric': timer['tags']['metric'], 'queries': 0,
+                                                            'latency': 0, 'max_latency': 0, 'took': 0,
+                                                            'request_bytes': 0, 'response_bytes': 0, 'buckets': 0})
+        if timer['name'] == 'es_query':
+            cost['queries'] += timer['count']
+            cost['latency'] += timer['total']
+            cost['max_latency'] = max(cost['max_latency'], timer['max'])
+        else:
+            cost['took'] += timer['total']
+
+    for counter in run_summary['counters']:
+        metric = counter['tags'].get('metric')
+        if metric in metrics and counter['name'].startswith('es_'):
+            metrics[metric][counter['name'][len('es_'):]] += counter['value']
+
+    return sorted(metrics.values(), key=lambda cost: cost['latency'], reverse=True)
+
+
+def show_metrics_cost(metrics_cost, top=None):
+    """
+    Print in standard output the ranking of the metrics by the cost of their queries
+
+    :param metrics_cost: list with the cost of each metric (see `rank_metrics_cost`)
+    :param top: number of metrics to show (all by default)
+    :return:
+    """
+    print("%-40s %8s %10s %10s %10s %10s %12s" % ("metric", "queries", "latency", "max", "took",
+                                                  "buckets", "resp_bytes"))
+    for cost in metrics_cost[:top]:
+        print("%-40s %8i %10.3f %10.3f %10.3f %10i %12i" % (cost['metric'], cost['queries'], cost['latency'],
+                                                            cost['max_latency'], cost['took'],
+                                                            cost['buckets'], cost['response_bytes']))
 
 
 def compute_metric_per_projects_grimoirelab(es_url, es_index, metric_field, metric_data, from_date, to_date):
@@ -173,12 +357,9 @@ def compute_metric_per_projects_grimoirelab(es_url, es_index, metric_field, metr
 
     """ % (MAX_PROJECTS, metric_agg, metric_field, metric_name, metric_filter)
 
-    logging.debug(json.dumps(json.loads(es_query), indent=True))
+    result = search(es_url, es_index, es_query, metric_name, perfdata.window(from_date, to_date))
 
-    res = requests.get(es_url + "/" + es_index + "/_search", data=es_query, verify=HTTPS_CHECK_CERT, headers=HEADERS_JSON)
-    res.raise_for_status()
-
-    project_buckets = res.json()["aggregations"]["3"]["buckets"]
+    project_buckets = result["aggregations"]["3"]["buckets"]
 
     logging.info("Total projects found for %s: %i", metric_name, len(project_buckets))
 
@@ -297,10 +478,9 @@ def compute_metric_per_project_ossmeter(es_url, es_index, metric_field, metric_d
           }
         }""" % calculation_type
 
-    res = requests.get(es_url + "/" + es_index + "/_search", data=es_query, verify=HTTPS_CHECK_CERT, headers=HEADERS_JSON)
-    res.raise_for_status()
+    result = search(es_url, es_index, es_query, metric_name, perfdata.window(from_date, to_date))
 
-    project_buckets = res.json()["aggregations"]["3"]["buckets"]
+    project_buckets = result["aggregations"]["3"]["buckets"]
     for pb in project_buckets:
         if calculation_type == 'median':
             metric_value = pb["2"]["values"]['50.0']
@@ -319,6 +499,34 @@ def compute_metric_per_project(es_url, es_index, metric_data, backend_metrics_da
     from_date_str = from_date.strftime('%Y-%m-%d')
     to_date_str = to_date.strftime('%Y-%m-%d')
 
+    # the raw values are cached and shared for the canonical query of the metric
+    query = {
+        "kind": "metric",
+        "backend": backend_metrics_data,
+        "implementation": metric_data.implementation,
+        "params": json.loads(metric_data.params) if metric_data.params else None,
+        "calculation_type": getattr(metric_data, 'calculation_type', None),
+        "window": [from_date_str, to_date_str]
+    }
+
+    queries = getattr(_local, 'queries', None)
+    memo_key = None
+    if queries is not None:
+        memo_key = json.dumps(dict(query, es_url=es_url, index=es_index), sort_keys=True)
+        if memo_key in queries:
+            perfdata.count('metric_queries_shared', metric=metric_data.implementation)
+            return queries[memo_key]
+
+    metric_per_project = assess_cache.cached(query, lambda: __compute_metric_per_project(es_url, es_index, metric_data,
+                                                                                         backend_metrics_data,
+                                                                                         from_date_str, to_date_str))
+    if memo_key:
+        queries[memo_key] = metric_per_project
+
+    return metric_per_project
+
+
+def __compute_metric_per_project(es_url, es_index, metric_data, backend_metrics_data, from_date_str, to_date_str):
     metric_per_project = None
     metric_field = find_metric_name_field(backend_metrics_data)
     if backend_metrics_data == "ossmeter":
@@ -334,6 +542,143 @@ def compute_metric_per_project(es_url, es_index, metric_data, backend_metrics_da
     return metric_per_project
 
 
+@contextmanager
+def queries_memo():
+    """
+    Do each distinct metric query just once in the context: the metric data shared
+    by several metrics (in the same or in different attributes, goals and models)
+    is computed the first time and its values are reused the next ones.
+    """
+    if getattr(_local, 'queries', None) is not None:
+        # Already sharing the queries of an outer context
+        yield
+        return
+
+    _local.queries = {}
+    try:
+        yield
+    finally:
+        _local.queries = None
+
+
+def metric_key(metric_data):
+    """
+    Key of a metric in the assessments. The params are included so the metrics with the
+    same implementation and different params are not mixed.
+
+    :param metric_data: data of the metric
+    :return: the key of the metric
+    """
+    if metric_data.params:
+        return metric_data.implementation + " " + metric_data.params
+
+    return metric_data.implementation
+
+
+def score_metric_value(value, thresholds, reverse_thresholds=False):
+    """
+    Score the value of a metric: it gets a point for each threshold lower than it
+    (greater than it with reverse thresholds)
+
+    :param value: value of the metric
+    :param thresholds: list with the thresholds of the metric
+    :param reverse_thresholds: the lower the value the better
+    :return: the score of the value, from 0 to the number of thresholds
+    """
+    if not reverse_thresholds:
+        return sum(1 for threshold in thresholds if value > threshold)
+
+    return sum(1 for threshold in thresholds if value < threshold)
+
+
+def sorted_metric_values(es_url, es_index, backend_metrics_data, implementation, params, calculation_type,
+                         from_date, to_date, refresh=False):
+    """
+    Get the raw values of a metric for all the projects, sorted. They are collected from
+    Elasticsearch just the first time, later they are read from memory until the data in
+    the index changes.
+
+    :param es_url: Elasticsearch URL
+    :param es_index: Index with the metrics data
+    :param backend_metrics_data: backend used to collect the metrics data
+    :param implementation: name of the metric in the metrics data
+    :param params: params to compute the metric
+    :param calculation_type: how the metric samples are aggregated (max, min, avg, median, last ...)
+    :param from_date: initial date from which to compute the metric
+    :param to_date: end date until which to compute the metric
+    :param refresh: collect the values again from Elasticsearch
+    :return: a tuple with the sorted values of the metric (the projects without value are not included)
+    """
+    from prosoul.models import MetricData
+
+    key = (es_url, es_index, backend_metrics_data, implementation, params, calculation_type, from_date, to_date,
+           json.dumps(find_data_generation(es_url, es_index)))
+
+    with _metric_values_lock:
+        if refresh:
+            _metric_values_cache.pop(key, None)
+        elif key in _metric_values_cache:
+            _metric_values_cache.move_to_end(key)
+            return _metric_values_cache[key]
+
+    metric_data = MetricData(implementation=implementation, params=params)
+    metric_data.calculation_type = calculation_type
+    values = compute_metric_per_project(es_url, es_index, metric_data, backend_metrics_data, from_date, to_date)
+    values = tuple(sorted(value['metric'] for value in values or [] if value['metric'] is not None))
+
+    with _metric_values_lock:
+        _metric_values_cache[key] = values
+        while len(_metric_values_cache) > METRIC_VALUES_CACHE_SIZE:
+            _metric_values_cache.popitem(last=False)
+
+    return values
+
+
+def clear_metric_values_cache():
+    """ Forget the values of the metrics kept in memory by `sorted_metric_values` """
+
+    with _metric_values_lock:
+        _metric_values_cache.clear()
+
+
+def score_distribution(values, thresholds, reverse_thresholds=False):
+    """
+    Count the values getting each score with some thresholds, using binary searches
+    in the sorted values
+
+    :param values: sorted values of a metric (see `sorted_metric_values`)
+    :param thresholds: list with the thresholds of the metric
+    :param reverse_thresholds: the lower the value the better
+    :return: a list with the number of values getting each score, from 0 to the number of thresholds
+    """
+    thresholds = sorted(thresholds)
+
+    # number of values with a score of at least i, the n-th lowest threshold is the one for a score n
+    if not reverse_thresholds:
+        scored = [len(values)] + [len(values) - bisect.bisect_right(values, threshold) for threshold in thresholds]
+    else:
+        scored = [len(values)] + [bisect.bisect_left(values, threshold) for threshold in reversed(thresholds)]
+    scored.append(0)
+
+    return [scored[score] - scored[score + 1] for score in range(len(thresholds) + 1)]
+
+
+def suggest_thresholds(values, nthresholds=len(THRESHOLDS)):
+    """
+    Suggest thresholds splitting the values of a metric in groups of the same size (the
+    quantiles of the values), so the projects get all the scores in the same proportion
+
+    :param values: sorted values of a metric (see `sorted_metric_values`)
+    :param nthresholds: number of thresholds
+    :return: a list with the thresholds, empty if there are no values
+    """
+    if not values:
+        return []
+
+    # Thresholds are integer numbers in the quality models
+    return [int(round(values[(nquantile * len(values)) // (nthresholds + 1)])) for nquantile in range(1, nthresholds + 1)]
+
+
 def assess_attribute(es_url, es_index, attribute, backend_metrics_data, from_date, to_date):
     """
     Do the assessment for an attribute in the quality model. If a metric does not have thresholds,
@@ -359,61 +704,60 @@ def assess_attribute(es_url, es_index, attribute, backend_metrics_data, from_dat
     metrics_with_data = []
     attribute_assessment = {}  # Includes the assessment for each non-empty metric per project
 
-    for metric in attribute.metrics.all():
-        # We need the metric values and the metric indicators
-        if metric.data:
-            metric.data.calculation_type = metric.calculation_type
-            metrics_with_data.append(metric)
-        else:
-            logging.debug("Can't find data for %s", metric.name)
-
-    logging.debug("Metrics to be included: %s (%s attribute)", metrics_with_data, attribute.name)
-
-    for metric in metrics_with_data:
-        attribute_assessment[metric.data.implementation] = {}
-        metric_value = compute_metric_per_project(es_url, es_index, metric.data, backend_metrics_data, from_date, to_date)
-        if metric_value:
-            for project_metric in metric_value:
-                pname = project_metric['project']
-                pmetric = project_metric['metric']
-                logging.debug("Project %s metric %s value %i", pname, metric.data.implementation, pmetric)
-                logging.debug("Doing the assessment ...")
-                score = 0
-                if metric.thresholds:
-                    if not metric.reverse_thresholds:
-                        for threshold in metric.thresholds.split(","):
-                            if project_metric['metric'] > float(threshold):
-                                score += 1
-                    else:
-                        reverse_thresholds = reversed(metric.thresholds.split(","))
-                        for threshold in reverse_thresholds:
-                            if project_metric['metric'] < float(threshold):
-                                score += 1
-                    threshold = score - 1 if score else 0
-                    logging.debug("Score %s for %s: %i (%s)", project_metric['project'],
-                                  metric.data.implementation, score, THRESHOLDS[threshold])
-
-                if pname not in attribute_assessment[metric.data.implementation]:
-                    attribute_assessment[metric.data.implementation][pname] = {}
-
-                attribute_assessment[metric.data.implementation][pname]['score'] = score
-                attribute_assessment[metric.data.implementation][pname]['raw_value'] = project_metric['metric']
-                attribute_assessment[metric.data.implementation]['cal_type'] = metric.data.calculation_type
-        else:
-            msg = "Metric {} has not value for time range {} - {}".format(metric,
-                                                                          from_date.strftime('%Y-%m-%d'),
-                                                                          to_date.strftime('%Y-%m-%d'))
-            logging.debug(msg)
+    with perfdata.timer('orm_tree_walk', attribute=attribute.name):
+        for metric in attribute.metrics.all():
+            # We need the metric values and the metric indicators
+            if metric.data:
+                # The data could be shared by several metrics (and compiled models), so it is not modified
+                metric_data = copy.copy(metric.data)
+                metric_data.calculation_type = metric.calculation_type
+                metrics_with_data.append((metric, metric_data))
+            else:
+                logging.debug("Can't find data for %s", metric.name)
+
+    logging.debug("Metrics to be included: %s (%s attribute)", [metric for metric, _ in metrics_with_data],
+                  attribute.name)
+
+    for metric, metric_data in metrics_with_data:
+        key = metric_key(metric_data)
+        attribute_assessment[key] = {}
+        metric_value = compute_metric_per_project(es_url, es_index, metric_data, backend_metrics_data, from_date, to_date)
+        thresholds = [float(threshold) for threshold in metric.thresholds.split(",")] if metric.thresholds else None
+        with perfdata.timer('scoring', metric=metric_data.implementation, window=perfdata.window(from_date, to_date)):
+            if metric_value:
+                for project_metric in metric_value:
+                    pname = project_metric['project']
+                    pmetric = project_metric['metric']
+                    logging.debug("Project %s metric %s value %i", pname, metric_data.implementation, pmetric)
+                    logging.debug("Doing the assessment ...")
+                    score = 0
+                    if thresholds:
+                        score = score_metric_value(project_metric['metric'], thresholds, metric.reverse_thresholds)
+                        threshold = score - 1 if score else 0
+                        logging.debug("Score %s for %s: %i (%s)", project_metric['project'],
+                                      metric_data.implementation, score, THRESHOLDS[threshold])
+
+                    if pname not in attribute_assessment[key]:
+                        attribute_assessment[key][pname] = {}
+
+                    attribute_assessment[key][pname]['score'] = score
+                    attribute_assessment[key][pname]['raw_value'] = project_metric['metric']
+                    attribute_assessment[key]['cal_type'] = metric_data.calculation_type
+            else:
+                msg = "Metric {} has not value for time range {} - {}".format(metric,
+                                                                              from_date.strftime('%Y-%m-%d'),
+                                                                              to_date.strftime('%Y-%m-%d'))
+                logging.debug(msg)
 
     return attribute_assessment
 
 
-def goals2projects(assessment, diff_assessment):
+def goals2projects(assessment, diff_assessment=None):
     """
     Converts an goals assessment dict to a projects assessment dict
 
     :param assessment: the goal assessment dict
-    :param diff_assessment: the goal assessment dict with only empty data
+    :param diff_assessment: the goal assessment dict with only empty data (optional)
     :return: the project assessment dict
     """
 
@@ -451,7 +795,8 @@ def goals2projects(assessment, diff_assessment):
 
     projects = {}
     populate_projects(projects, assessment)
-    populate_projects(projects, diff_assessment)
+    if diff_assessment:
+        populate_projects(projects, diff_assessment)
 
     return projects
 
@@ -483,7 +828,7 @@ def enrich_assessment(assessment):
 
 
 def publish_assessment(es_url, scores_index, assessment, start_date, end_date,
-                       score_type=SCORES_ALL_TYPE, creation_date=None):
+                       score_type=SCORES_ALL_TYPE, creation_date=None, model_name=None, refresh=True, metadata=None):
     """
     Publish all the scores for the metrics in assessment in the
     target index: `es_index`+ '_scores' (e.g., scava-metrics_scores). Note
@@ -509,7 +854,10 @@ def publish_assessment(es_url, scores_index, assessment, start_date, end_date,
           "type": "all"/"quarter",
           "start_time": date,
           "end_date": date,
-          "creation": date
+          "creation": date,
+          "model": "quality model name",
+          "backend_metrics_data": "scava-metrics",
+          "model_generation": "digest of the version of the model"
         }
       }
 
@@ -520,37 +868,253 @@ def publish_assessment(es_url, scores_index, assessment, start_date, end_date,
     :param end_date: end date of the assessment
     :param score_type: type of the score items (all or quarter)
     :param creation_date: date when the assessment was done
+    :param model_name: name of the quality model assessed
+    :param refresh: refresh the index after publishing the scores
+    :param metadata: dict with more data of the assessment included in all the items (see `__compute_assessments`)
 
     :return:
     """
-    es_conn = Elasticsearch([es_url], timeout=100, verify_certs=HTTPS_CHECK_CERT)
+    return __publish_items(es_url, scores_index, enrich_assessment(assessment), start_date, end_date,
+                           score_type, creation_date, model_name, refresh, metadata)
+
+
+def enrich_rollups(rollups):
+    """
+    Generate one item with the rolled up score of an attribute, goal or the model for a project.
+    The projects without score for them are included with a null score.
+
+    :param rollups: A dict with the rollups of the assessment (see `rollup_scores`)
+    :return:
+    """
+    levels = [("attribute", rollups["attributes"]), ("goal", rollups["goals"]), ("model", {None: rollups["model"]})]
+
+    for level, level_rollups in levels:
+        for name in level_rollups:
+            for project, score in level_rollups[name].items():
+                item = {
+                    "level": level,
+                    "project": project,
+                    "score": score,
+                    "has_score": score is not None
+                }
+                if name is not None:
+                    item[level] = name
+                yield item
+
+
+def publish_rollups(es_url, rollups_index, rollups, start_date, end_date,
+                    score_type=SCORES_ALL_TYPE, creation_date=None, model_name=None, refresh=True, metadata=None):
+    """
+    Publish the rolled up scores of the attributes, goals and model per project in the
+    target index: `es_index`+ '_rollups' (e.g., scava-metrics_rollups), so the dashboards
+    read them instead of aggregating the scores of the metrics. An item is as the one below,
+    the `attribute` field is `goal` in the goal items and it is not included in the model ones.
+
+    {
+        "level": "attribute"/"goal"/"model",
+        "attribute": "interactions",
+        "project": "netty",
+        "score": 3.5,
+        "has_score": true,
+        "type": "all"/"quarter",
+        "start_date": date,
+        "end_date": date,
+        "creation_date": date,
+        "model": "quality model name",
+        "backend_metrics_data": "scava-metrics",
+        "model_generation": "digest of the version of the model"
+    }
+
+    :param es_url: URL for Elasticsearch
+    :param rollups_index: index in Elasticsearch
+    :param rollups: dict with the rollups of the assessment
+    :param start_date: start date of the assessment
+    :param end_date: end date of the assessment
+    :param score_type: type of the score items (all or quarter)
+    :param creation_date: date when the assessment was done
+    :param model_name: name of the quality model assessed
+    :param refresh: refresh the index after publishing the scores
+    :param metadata: dict with more data of the assessment included in all the items (see `__compute_assessments`)
+
+    :return:
+    """
+    return __publish_items(es_url, rollups_index, enrich_rollups(rollups), start_date, end_date,
+                           score_type, creation_date, model_name, refresh, metadata)
+
+
+def enrich_projects(assessment, diff_assessment, rollups):
+    """
+    Generate one item per project with all its scores: the ones of the metrics (also as
+    `score_<metric>` fields, like the items of `enrich_assessment`) and the rolled up ones
+    of the attributes, goals and model. The metrics without data for a project are
+    included with a null score.
+
+    :param assessment: A dict with the results of the assessment
+    :param diff_assessment: A dict with the metrics without data per project
+    :param rollups: A dict with the rollups of the assessment (see `rollup_scores`)
+    :return:
+    """
+    projects_data = goals2projects(assessment, diff_assessment)
+
+    for project in sorted(set(projects_data) | set(rollups["model"])):
+        item = {
+            "project": project,
+            "score": rollups["model"].get(project),
+            "goals": [{"goal": goal, "score": rollups["goals"][goal].get(project)} for goal in rollups["goals"]],
+            "attributes": [{"attribute": attribute, "score": rollups["attributes"][attribute].get(project)}
+                           for attribute in rollups["attributes"]],
+            "metrics": []
+        }
+        project_data = projects_data.get(project, {})
+        for goal in project_data:
+            for attr in project_data[goal]:
+                for metric, metric_data in project_data[goal][attr].items():
+                    item["metrics"].append({
+                        "goal": goal,
+                        "attribute": attr,
+                        "metric": metric,
+                        "calculation_type": metric_data['cal_type'],
+                        "score": metric_data['score'],
+                        "raw_value": metric_data['raw_value']
+                    })
+                    # a metric in several attributes could have different thresholds in them
+                    if metric_data['score'] is not None:
+                        item["score_" + metric] = max(metric_data['score'], item.get("score_" + metric) or 0)
+        yield item
+
+
+def publish_projects(es_url, projects_index, assessment, diff_assessment, rollups, start_date, end_date,
+                     score_type=SCORES_ALL_TYPE, creation_date=None, model_name=None, refresh=True, metadata=None):
+    """
+    Publish a document per project with all its scores in the target index:
+    `es_index`+ '_project_scores' (e.g., scava-metrics_project_scores). The dashboards
+    of a project read just its document. An item is as the one below:
+
+    {
+        "project": "netty",
+        "score": 3.5,
+        "goals": [{"goal": "activity", "score": 3.5}],
+        "attributes": [{"attribute": "interactions", "score": 3.5}],
+        "metrics": [{"goal": "activity", "attribute": "interactions", "metric": "Threads",
+                     "calculation_type": "max", "score": 5, "raw_value": 32}, ...],
+        "score_Threads": 5,
+        "type": "all"/"quarter",
+        "start_date": date,
+        "end_date": date,
+        "creation_date": date,
+        "model": "quality model name",
+        "backend_metrics_data": "scava-metrics",
+        "model_generation": "digest of the version of the model"
+    }
+
+    :param es_url: URL for Elasticsearch
+    :param projects_index: index in Elasticsearch
+    :param assessment: dict with the assessment data
+    :param diff_assessment: dict with the metrics without data per project
+    :param rollups: dict with the rollups of the assessment
+    :param start_date: start date of the assessment
+    :param end_date: end date of the assessment
+    :param score_type: type of the score items (all or quarter)
+    :param creation_date: date when the assessment was done
+    :param model_name: name of the quality model assessed
+    :param refresh: refresh the index after publishing the scores
+    :param metadata: dict with more data of the assessment included in all the items (see `__compute_assessments`)
+
+    :return:
+    """
+    return __publish_items(es_url, projects_index, enrich_projects(assessment, diff_assessment, rollups),
+                           start_date, end_date, score_type, creation_date, model_name, refresh, metadata)
+
+
+def __publish_items(es_url, index, items, start_date, end_date, score_type, creation_date, model_name, refresh=True,
+                    metadata=None):
+    """ Upload the items of an assessment to an index, with the data of the assessment in all of them """
+
+    from elasticsearch import helpers
+
+    es_conn = es_connection(es_url, HTTPS_CHECK_CERT)
 
     scores = []
 
     # Uploading info to the new ES
-    for item in enrich_assessment(assessment):
+    for item in items:
         item['type'] = score_type
         item['start_date'] = start_date
         item['end_date'] = end_date
         item['creation_date'] = creation_date
+        item['model'] = model_name
+        item.update(metadata or {})
 
         score = {
-            "_index": scores_index,
+            "_index": index,
             "_type": "item",
             "_source": item
         }
         scores.append(score)
 
-    helpers.bulk(es_conn, scores)
+    with perfdata.timer('bulk_publish', index=index):
+        helpers.bulk(es_conn, scores)
 
-    if es_conn.indices.exists(index=scores_index):
-        es_conn.indices.refresh(index=scores_index)
+        if refresh and es_conn.indices.exists(index=index):
+            es_conn.indices.refresh(index=index)
+    perfdata.count('scores_published', len(scores), index=index)
 
-    logging.info("Total scores published in %s: %i", scores_index, len(scores))
+    logging.info("Total scores published in %s: %i", index, len(scores))
 
     return len(scores)
 
 
+def find_last_assessment(es_url, es_index, model_name, from_date, to_date, backend_metrics_data, generation):
+    """
+    Find when the last assessment of a generation of a quality model for a time frame was done
+
+    :param es_url: Elasticsearch URL
+    :param es_index: Elasticsearch index with the metrics data
+    :param model_name: Quality model name
+    :param from_date: date since which the metrics were computed
+    :param to_date: date until which the metrics were computed
+    :param backend_metrics_data: backend used to collect the metrics data
+    :param generation: generation of the quality model (see `model_generation`)
+    :return: the creation date of the last assessment or None if it is not found
+    """
+    es_query = """
+    {
+      "size": 1,
+      "query": {
+        "bool": {
+          "filter": [
+            {"match_phrase": {"model": "%s"}},
+            {"match_phrase": {"type": "%s"}},
+            {"term": {"backend_metrics_data": "%s"}},
+            {"term": {"model_generation": "%s"}}
+          ]
+        }
+      },
+      "sort": [
+        {"creation_date": {"order": "desc", "unmapped_type": "date"}}
+      ]
+    }
+    """ % (model_name, SCORES_ALL_TYPE, backend_metrics_data, generation)
+
+    res = http_session().get(es_url + "/" + es_index + SCORES + "/_search", data=es_query, verify=HTTPS_CHECK_CERT,
+                             headers=HEADERS_JSON)
+    if res.status_code == 404:
+        # The scores index does not exist yet
+        return None
+    res.raise_for_status()
+
+    hits = res.json()["hits"]["hits"]
+    if not hits:
+        return None
+
+    last_score = hits[0]['_source']
+    if last_score['start_date'] != from_date.isoformat() or last_score['end_date'] != to_date.isoformat():
+        # The last assessment was done for a different time frame
+        return None
+
+    return str_to_datetime(last_score['creation_date'])
+
+
 def get_scava_projects(es_url, es_index, from_date, to_date):
     """Get the projects in the `es_index` between to given dates.
 
@@ -564,6 +1128,11 @@ def get_scava_projects(es_url, es_index, from_date, to_date):
     from_date_str = from_date.strftime('%Y-%m-%d')
     to_date_str = to_date.strftime('%Y-%m-%d')
 
+    query = {"kind": "projects", "window": [from_date_str, to_date_str]}
+    return assess_cache.cached(query, lambda: __get_projects(es_url, es_index, from_date_str, to_date_str))
+
+
+def __get_projects(es_url, es_index, from_date_str, to_date_str):
     projects = []
     es_query = """
         {
@@ -601,17 +1170,129 @@ def get_scava_projects(es_url, es_index, from_date, to_date):
         }
         """ % (from_date_str, to_date_str)
 
-    res = requests.get(es_url + "/" + es_index + "/_search", data=es_query, verify=HTTPS_CHECK_CERT,
-                       headers=HEADERS_JSON)
-    res.raise_for_status()
+    result = search(es_url, es_index, es_query, 'projects', perfdata.window(from_date_str, to_date_str))
 
-    project_buckets = res.json()["aggregations"]["3"]["buckets"]
+    project_buckets = result["aggregations"]["3"]["buckets"]
     for pb in project_buckets:
         projects.append(pb['key'])
 
     return projects
 
 
+def find_data_extent(es_url, es_index, backend_metrics_data):
+    """
+    Find the dates of the first and the last samples in the metrics index, for all
+    the projects and for each one of them
+
+    :param es_url: Elasticsearch URL
+    :param es_index: Elasticsearch index with the metrics data
+    :param backend_metrics_data: backend used to collect the metrics data
+    :return: a dict with the "min" and "max" dates, the number of samples ("docs") and the "projects"
+             dict with the (min, max) dates per project, None if there are no samples in the index
+    """
+    date_field = find_date_field(backend_metrics_data)
+    extent_aggs = {
+        "min_date": {"min": {"field": date_field}},
+        "max_date": {"max": {"field": date_field}}
+    }
+    es_query = {
+        "size": 0,
+        "aggs": dict(extent_aggs, projects={
+            "terms": {"field": "project", "size": MAX_PROJECTS},
+            "aggs": extent_aggs
+        })
+    }
+
+    result = search(es_url, es_index, json.dumps(es_query), 'data_extent', 'all')
+
+    def to_datetime(agg):
+        if agg['value'] is None:
+            return None
+        return datetime.fromtimestamp(agg['value'] / 1000, tz=timezone.utc)
+
+    aggs = result['aggregations']
+    min_date = to_datetime(aggs['min_date'])
+    if min_date is None:
+        return None
+
+    docs = result['hits']['total']
+    if isinstance(docs, dict):
+        # Elasticsearch 7 format
+        docs = docs['value']
+
+    projects = {}
+    for bucket in aggs['projects']['buckets']:
+        projects[bucket['key']] = (to_datetime(bucket['min_date']), to_datetime(bucket['max_date']))
+
+    return {"min": min_date, "max": to_datetime(aggs['max_date']), "docs": docs, "projects": projects}
+
+
+def find_data_generation(es_url, es_index):
+    """
+    Find the generation of the data in the metrics index. It changes with every write in the index,
+    also with the ones overwriting samples without changing their number or dates, and when the index
+    is created again. The indexing counters are restarted with the shards, so after a restart a full
+    assessment is needed before rescoring.
+
+    :param es_url: Elasticsearch URL
+    :param es_index: Elasticsearch index (or alias) with the metrics data
+    :return: a list with the uuids of the indexes and the number of docs, and of index and delete operations
+    """
+    res = http_session().get(es_url + "/" + es_index + "/_stats", verify=HTTPS_CHECK_CERT)
+    res.raise_for_status()
+    stats = res.json()
+
+    primaries = stats['_all']['primaries']
+    uuids = sorted(index_stats.get('uuid', index) for index, index_stats in stats['indices'].items())
+
+    return [uuids, primaries['docs']['count'], primaries['indexing']['index_total'],
+            primaries['indexing']['delete_total']]
+
+
+def plan_windows(from_date, to_date, extent):
+    """
+    Split the time frame in windows of 3 months, dropping the ones without samples
+    so no query is done for them. The windows start at from_date, so they are the
+    same ones with and without samples.
+
+    :param from_date: start date of the time frame
+    :param to_date: end date of the time frame
+    :param extent: data extent of the metrics index (see find_data_extent)
+    :return: a list with the (start date, end date) of the windows with samples
+    """
+
+    def day(value):
+        return value.date() if isinstance(value, datetime) else value
+
+    def has_samples(start_date, end_date):
+        # The window dates are used as days in the queries (both included)
+        if extent['projects']:
+            extents = extent['projects'].values()
+        else:
+            extents = [(extent['min'], extent['max'])]
+        return any(day(first) <= day(end_date) and day(last) >= day(start_date) for first, last in extents)
+
+    windows = []
+    nwindows = 0
+    start_date = from_date
+
+    while True:
+        next_date = start_date + dateutil.relativedelta.relativedelta(months=+3)
+        nwindows += 1
+
+        if extent and has_samples(start_date, next_date):
+            windows.append((start_date, next_date))
+
+        if next_date > to_date:
+            break
+
+        start_date = next_date
+
+    logging.info("Windows with samples: %i of %i", len(windows), nwindows)
+
+    return windows
+
+
 def __diff_assess(all_projects, assessment):
     """Based on the given assessment, calculate the diff assessment composed of those projects goals,
     attributes and metrics without data.
@@ -640,9 +1321,250 @@ def __diff_assess(all_projects, assessment):
     return diff_assessment
 
 
-def __assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_date, only_attribute=None):
+@contextmanager
+def models_cache():
+    """
+    Keep in memory the quality models compiled inside the context, so the steps
+    of a pipeline do not read them again from the database. Out of the context
+    the models are always read, so the changes done from the editor are used.
+    """
+    if getattr(_local, 'models', None) is not None:
+        # Already keeping the models of an outer context
+        yield _local.models
+        return
+
+    _local.models = {}
+    try:
+        yield _local.models
+    finally:
+        _local.models = None
+
+
+def clear_models_cache():
+    """ Forget the compiled quality models, they must be read again after an import """
+
+    if getattr(_local, 'models', None) is not None:
+        _local.models.clear()
+
+
+def __prefetch_subtrees(model_orm):
+    """
+    Read in advance the relations of the subgoals and subattributes of a quality model,
+    with a query per relation for each level of the model
+
+    :param model_orm: QualityModel object with the MODEL_PREFETCH relations read
+    """
+    from django.db.models import prefetch_related_objects
+
+    def subattributes(attributes):
+        return [subattribute for attribute in attributes for subattribute in attribute.subattributes.all()]
+
+    goals = list(model_orm.goals.all())
+    goals_seen = {goal.id for goal in goals}
+    attributes_seen = {attribute.id for goal in goals for attribute in goal.attributes.all()}
+
+    subgoals = [subgoal for goal in goals for subgoal in goal.subgoals.all()]
+    level_attributes = subattributes([attribute for goal in goals for attribute in goal.attributes.all()])
+
+    while subgoals or level_attributes:
+        # The ones read in an upper level are not read again (they could be in a cycle)
+        subgoals = [goal for goal in subgoals if goal.id not in goals_seen]
+        level_attributes = [attribute for attribute in level_attributes if attribute.id not in attributes_seen]
+        prefetch_related_objects(subgoals, *SUBGOALS_PREFETCH)
+        prefetch_related_objects(level_attributes, *SUBATTRIBUTES_PREFETCH)
+
+        goals_attributes = [attribute for goal in subgoals for attribute in goal.attributes.all()]
+        goals_seen.update(goal.id for goal in subgoals)
+        attributes_seen.update(attribute.id for attribute in level_attributes + goals_attributes)
+
+        level_attributes = subattributes(level_attributes + goals_attributes)
+        subgoals = [subgoal for goal in subgoals for subgoal in goal.subgoals.all()]
+
+
+def get_quality_model(model_name):
+    """
+    Get the quality model to be used in the assessment. The model is compiled: its goals,
+    attributes and metrics, and all its subgoals and subattributes, are read in advance
+    with a query per relation.
+
+    :param model_name: Quality model name
+    :return: the QualityModel object
+    """
+    models = getattr(_local, 'models', None)
+    if models is not None and model_name in models:
+        return models[model_name]
+
+    from prosoul.models import QualityModel
+
+    try:
+        with perfdata.timer('orm_tree_walk', model=model_name):
+            model_orm = QualityModel.objects.prefetch_related(*MODEL_PREFETCH).get(name=model_name)
+            __prefetch_subtrees(model_orm)
+    except QualityModel.DoesNotExist:
+        logging.error('Can not find the metrics model %s', model_name)
+        raise RuntimeError('Can not find the metrics model ' + model_name)
+
+    if models is not None:
+        models[model_name] = model_orm
+
+    return model_orm
+
+
+def walk_model(model_orm):
+    """
+    Walk all the goals of a quality model, including the subgoals at any level, with all their
+    attributes, including the subattributes at any level. A goal or attribute shared by several
+    parents is returned once.
+
+    :param model_orm: QualityModel object
+    :return: a generator of (goal, attributes) tuples, with the list of attributes of the goal
+    """
+    goals_seen = set()
+
+    def walk_attributes(attributes, attributes_seen):
+        for attribute in attributes:
+            if attribute.id in attributes_seen:
+                continue
+            attributes_seen.add(attribute.id)
+            yield attribute
+            yield from walk_attributes(attribute.subattributes.all(), attributes_seen)
+
+    def walk_goals(goals):
+        for goal in goals:
+            if goal.id in goals_seen:
+                continue
+            goals_seen.add(goal.id)
+            yield goal, list(walk_attributes(goal.attributes.all(), set()))
+            yield from walk_goals(goal.subgoals.all())
+
+    yield from walk_goals(model_orm.goals.all())
+
+
+def model_generation(model_orm):
+    """
+    Get the generation of a quality model. It changes when the model, or any of its goals, attributes,
+    metrics or metrics data, is updated, added or removed, so the assessments of a generation are
+    not reused once the model is edited.
+
+    :param model_orm: QualityModel object (see `get_quality_model`)
+    :return: a digest of the objects of the model and their last update
+    """
+    objects = [model_orm]
+    for goal, attributes in walk_model(model_orm):
+        objects.append(goal)
+        for attribute in attributes:
+            objects.append(attribute)
+            for metric in attribute.metrics.all():
+                objects.extend([metric, metric.data])
+
+    versions = [[type(obj).__name__, obj.id, obj.updated_at.isoformat()] for obj in objects if obj is not None]
+
+    return hashlib.sha1(json.dumps(versions).encode('utf-8')).hexdigest()
+
+
+def rollup_scores(model_orm, assessment, projects=None):
+    """
+    Roll up the scores of the metrics in an assessment to its attributes, goals and model, per project.
+    The score of an attribute is the mean of the scores of its metrics and subattributes, the one of a
+    goal the mean of the scores of its attributes and subgoals, and the one of the model the mean of the
+    scores of its goals. The children without score (None) are not included in the means, and the score
+    of a project is None if none of the children has a score for it.
+
+    It is done in one pass from the bottom of the model, each attribute and goal is rolled up once,
+    with the scores of all the projects in an array.
+
+    :param model_orm: QualityModel object
+    :param assessment: dict with the assessment of the model (goal -> attribute -> metric -> project)
+    :param projects: projects to include in the rollups, in addition to the ones in the assessment
+    :return: a dict with the scores per project of the "attributes" and "goals" (by name) and the "model"
+    """
+    import numpy
+
+    attributes_assessment = {attribute: assessment[goal][attribute] for goal in assessment for attribute in assessment[goal]}
+    all_projects = set(projects or [])
+    for metrics in attributes_assessment.values():
+        for metric in metrics:
+            all_projects.update(project for project in metrics[metric] if project != 'cal_type')
+    all_projects = sorted(all_projects)
+    no_scores = numpy.full(len(all_projects), numpy.nan)
+
+    rollups = {"attributes": {}, "goals": {}}
+
+    def mean_scores(children_scores):
+        if not children_scores:
+            return no_scores
+        scores = numpy.vstack(children_scores)
+        with_score = ~numpy.isnan(scores)
+        totals = numpy.where(with_score, scores, 0).sum(axis=0)
+        counts = with_score.sum(axis=0)
+        return numpy.divide(totals, counts, out=no_scores.copy(), where=counts > 0)
+
+    def metric_scores(metric_assessment):
+        # numpy converts the None scores to nan
+        return numpy.array([metric_assessment[project]['score'] if project in metric_assessment else None
+                            for project in all_projects], dtype=float)
+
+    def attribute_scores(attribute):
+        if attribute.name not in rollups["attributes"]:
+            rollups["attributes"][attribute.name] = no_scores  # a cycle in the model does not add scores
+            metrics = attributes_assessment.get(attribute.name, {})
+            children = [metric_scores(metrics[metric]) for metric in metrics]
+            children += [attribute_scores(subattribute) for subattribute in attribute.subattributes.all()]
+            rollups["attributes"][attribute.name] = mean_scores(children)
+        return rollups["attributes"][attribute.name]
+
+    def goal_scores(goal):
+        if goal.name not in rollups["goals"]:
+            rollups["goals"][goal.name] = no_scores
+            children = [attribute_scores(attribute) for attribute in goal.attributes.all()]
+            children += [goal_scores(subgoal) for subgoal in goal.subgoals.all()]
+            rollups["goals"][goal.name] = mean_scores(children)
+        return rollups["goals"][goal.name]
+
+    model_scores = mean_scores([goal_scores(goal) for goal in model_orm.goals.all()])
+
+    def to_dict(scores):
+        return {project: None if numpy.isnan(score) else float(score) for project, score in zip(all_projects, scores)}
+
+    return {
+        "attributes": {name: to_dict(scores) for name, scores in rollups["attributes"].items()},
+        "goals": {name: to_dict(scores) for name, scores in rollups["goals"].items()},
+        "model": to_dict(model_scores)
+    }
+
+
+def iter_assessment(es_url, es_index, model_name, backend_metrics_data, from_date, to_date, only_attribute=None):
+    """
+    Build the assessment for all projects returning the scores of each attribute
+    as soon as its metrics are computed. The whole assessment is never kept in memory.
+
+    :param es_url: Elasticsearch URL
+    :param es_index: Elasticsearch index with the metrics data
+    :param model_name: Quality model name
+    :param backend_metrics_data: backend to be used for getting the metrics (ossmeter or grimoirelab)
+    :param from_date: date since which the metrics must be computed
+    :param to_date: date until which the metrics must be computed
+    :param only_attribute: do the assessment only for this attribute
+    :return: a generator of score items, one per metric and project
+    """
+    model_orm = get_quality_model(model_name)
+
+    with queries_memo():
+        for goal, attributes in walk_model(model_orm):
+            for attribute in attributes:
+                if only_attribute and attribute.name != only_attribute:
+                    continue
+                res = assess_attribute(es_url, es_index, attribute, backend_metrics_data, from_date, to_date)
+                for item in enrich_assessment({goal.name: {attribute.name: res}}):
+                    item['start_date'] = from_date.isoformat()
+                    item['end_date'] = to_date.isoformat()
+                    yield item
+
+
+def assess_window(es_url, es_index, model_name, backend_metrics_data, from_date, to_date, only_attribute=None):
     """
-    Build the assessment for all projects
+    Build the assessment for all projects in a time window, for all the goals and attributes in the
+    model including the subgoals and subattributes. The scores are not published.
 
     :param es_url: Elasticsearch URL
     :param es_index: Elasticsearch index with the metrics data
@@ -655,34 +1577,264 @@ def __assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_d
     """
     assessment = {}  # Includes the assessment for each attribute
 
-    # Check that the model exists
-    model_orm = None
-    try:
-        model_orm = QualityModel.objects.get(name=model_name)
-    except QualityModel.DoesNotExist:
-        logging.error('Can not find the metrics model %s', model_name)
-        RuntimeError('Can not find the metrics model %s' + model_name)
+    model_orm = get_quality_model(model_name)
 
-    for goal in model_orm.goals.all():
-        assessment[goal.name] = {}
-        for attribute in goal.attributes.all():
-            if only_attribute and attribute.name != only_attribute:
-                continue
-            res = assess_attribute(es_url, es_index, attribute, backend_metrics_data, from_date, to_date)
-            assessment[goal.name][attribute.name] = res
+    attributes_assessment = {}  # the attributes shared by several goals are assessed once
+
+    with queries_memo():
+        for goal, attributes in walk_model(model_orm):
+            assessment[goal.name] = {}
+            for attribute in attributes:
+                if only_attribute and attribute.name != only_attribute:
+                    continue
+                if attribute.id not in attributes_assessment:
+                    attributes_assessment[attribute.id] = assess_attribute(es_url, es_index, attribute,
+                                                                           backend_metrics_data, from_date, to_date)
+                assessment[goal.name][attribute.name] = attributes_assessment[attribute.id]
 
     logging.debug(json.dumps(assessment, indent=True))
 
     return assessment
 
 
-def assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_date, only_attribute=None):
+def model_scores_index(es_index, model_name):
+    """
+    Prefix of the scores indexes of a quality model when several models are assessed together
+
+    :param es_index: Elasticsearch index with the metrics data
+    :param model_name: Quality model name
+    :return: the prefix for the scores indexes of the model (e.g. scava-metrics_my-model)
+    """
+    from django.utils.text import slugify
+
+    return es_index + "_" + slugify(model_name)
+
+
+def __compute_assessments(es_url, es_index, model_names, backend_metrics_data, from_date, to_date, only_attribute,
+                          rescore):
+    """
+    Build the assessment of several quality models for the full time frame and by quarters.
+    The projects in each window are found once, and the metric queries shared by the models
+    are done once.
+
+    :return: a dict with the quarters assessments (start date, end date, assessment, diff assessment and rollups),
+             the full time frame assessment, diff assessment and rollups, and the metadata (backend and generation
+             of the model) per model
+    """
+    extent = find_data_extent(es_url, es_index, backend_metrics_data)
+    # the cached values are valid while the samples in the index are not written again
+    generation = None
+    if extent:
+        generation = find_data_generation(es_url, es_index) + [extent['min'].isoformat(), extent['max'].isoformat()]
+
+    assessments = {model_name: {"quarters": []} for model_name in model_names}
+
+    # the models are read once for all the windows
+    with assess_cache.raw_values_cache(es_url + "/" + es_index, generation, rescore), queries_memo(), models_cache():
+        models_orm = {model_name: get_quality_model(model_name) for model_name in model_names}
+        for model_name in model_names:
+            assessments[model_name]["metadata"] = {"backend_metrics_data": backend_metrics_data,
+                                                   "model_generation": model_generation(models_orm[model_name])}
+        # execute the assessment by quarter, just for the ones with samples
+        for start_date, next_date in plan_windows(from_date, to_date, extent):
+            all_projects = get_scava_projects(es_url, es_index, start_date, next_date)
+            for model_name in model_names:
+                assessment = assess_window(es_url, es_index, model_name, backend_metrics_data, start_date, next_date,
+                                           only_attribute)
+                # diff assessment (assessment including empty data)
+                diff_assessment = __diff_assess(all_projects, assessment)
+                rollups = rollup_scores(models_orm[model_name], assessment, all_projects)
+                assessments[model_name]["quarters"].append((start_date, next_date, assessment, diff_assessment, rollups))
+
+        # execute the assessment over the full time frame
+        all_projects = get_scava_projects(es_url, es_index, from_date, to_date)
+        for model_name in model_names:
+            assessment = assess_window(es_url, es_index, model_name, backend_metrics_data, from_date, to_date,
+                                       only_attribute)
+            assessments[model_name]["all"] = (assessment, __diff_assess(all_projects, assessment),
+                                              rollup_scores(models_orm[model_name], assessment, all_projects))
+
+    return assessments
+
+
+def install_scores_templates(es_url, scores_prefix):
+    """
+    Install the index templates of the generations of the scores indexes of a prefix, with their
+    mapping and settings (see SCORES_MAPPING and SCORES_SETTINGS)
+
+    :param es_url: Elasticsearch URL
+    :param scores_prefix: prefix of the scores indexes
+    :return: the names of the templates installed
+    """
+    es_conn = es_connection(es_url, HTTPS_CHECK_CERT)
+
+    templates = {
+        scores_prefix + SCORES: [SCORES, NULL_SCORES],
+        scores_prefix + SCORE_QUARTERS: [SCORE_QUARTERS, NULL_SCORE_QUARTERS],
+        scores_prefix + ROLLUPS: [ROLLUPS, ROLLUP_QUARTERS, PROJECT_SCORES, PROJECT_SCORE_QUARTERS]
+    }
+
+    for name, suffixes in templates.items():
+        template = {
+            "index_patterns": [scores_generation_index(scores_prefix + suffix, "*") for suffix in suffixes],
+            "settings": SCORES_SETTINGS,
+            "mappings": SCORES_MAPPING
+        }
+        es_conn.indices.put_template(name=name, body=template)
+
+    return sorted(templates)
+
+
+def scores_generation_index(alias, creation_date):
+    """
+    Name of the index of a generation of the scores read with an alias
+
+    :param alias: alias used to read the scores (e.g. scava-metrics_scores)
+    :param creation_date: date when the assessment was done (ISO format), or `*` for all the generations
+    :return: the name of the index (e.g. scava-metrics_scores-20200102030405000000)
+    """
+    if creation_date == "*":
+        return alias + "-*"
+
+    return alias + "-" + str_to_datetime(creation_date).strftime(SCORES_GENERATION_FORMAT)
+
+
+def __publish_assessments(es_url, scores_prefix, model_name, assessments, from_date, to_date, creation_date,
+                          layout=SCORES_LAYOUT_METRICS):
+    """
+    Publish the assessments of a quality model in a new generation of the scores indexes. Once all the
+    scores are loaded, the aliases used to read them are moved from the previous generation to the new
+    one at once, so the dashboards always show a whole assessment. The generations read until then, the
+    older ones already loaded and the scores of the other layout are removed, but not the generations of
+    other assessments still being loaded. If the publishing fails the new generation is removed.
+
+    :param es_url: Elasticsearch URL
+    :param scores_prefix: prefix of the scores indexes
+    :param model_name: Quality model name
+    :param assessments: quarters and full time frame assessments of the model (see __compute_assessments)
+    :param from_date: date since which the metrics were computed
+    :param to_date: date until which the metrics were computed
+    :param creation_date: date when the assessment was done
+    :param layout: layout of the scores, a document per metric and project or per project
+    """
+    es_conn = es_connection(es_url, HTTPS_CHECK_CERT)
+
+    # aliases with data
+    scores_alias = scores_prefix + SCORES
+    scores_quarters_alias = scores_prefix + SCORE_QUARTERS
+    # aliases without data (see issue https://github.com/Bitergia/prosoul/issues/186#issuecomment-553328202)
+    null_scores_alias = scores_prefix + NULL_SCORES
+    null_scores_quarters_alias = scores_prefix + NULL_SCORE_QUARTERS
+    # aliases with all the scores per project (with and without data)
+    projects_alias = scores_prefix + PROJECT_SCORES
+    projects_quarters_alias = scores_prefix + PROJECT_SCORE_QUARTERS
+    # aliases with the rolled up scores of the attributes, goals and model (with null scores)
+    rollups_alias = scores_prefix + ROLLUPS
+    rollups_quarters_alias = scores_prefix + ROLLUP_QUARTERS
+    # aliases to query all scores and all scores per quarters (null and not null values)
+    all_scores_alias = scores_prefix + ALL_SCORES
+    all_scores_quarters_alias = scores_prefix + ALL_SCORE_QUARTERS
+
+    if layout == SCORES_LAYOUT_PROJECTS:
+        layout_aliases = {projects_alias: [], projects_quarters_alias: []}
+    else:
+        layout_aliases = {scores_alias: [all_scores_alias], null_scores_alias: [all_scores_alias],
+                          scores_quarters_alias: [all_scores_quarters_alias],
+                          null_scores_quarters_alias: [all_scores_quarters_alias]}
+    layout_aliases.update({rollups_alias: [], rollups_quarters_alias: []})
+    all_aliases = [scores_alias, null_scores_alias, scores_quarters_alias, null_scores_quarters_alias,
+                   projects_alias, projects_quarters_alias, rollups_alias, rollups_quarters_alias]
+
+    # the new indexes get their mapping and settings from the templates
+    install_scores_templates(es_url, scores_prefix)
+    new_index = {alias: scores_generation_index(alias, creation_date) for alias in layout_aliases}
+    for index in new_index.values():
+        es_conn.indices.create(index=index)
+    new_indexes = ",".join(new_index.values())
+
+    metadata = assessments.get("metadata")
+
+    def publish_window(start_date, end_date, score_type, assessment, diff_assessment, rollups):
+        def index(all_alias, quarters_alias):
+            return new_index[all_alias if score_type == SCORES_ALL_TYPE else quarters_alias]
+
+        if layout == SCORES_LAYOUT_PROJECTS:
+            publish_projects(es_url, index(projects_alias, projects_quarters_alias), assessment, diff_assessment,
+                             rollups, start_date.isoformat(), end_date.isoformat(), score_type=score_type,
+                             creation_date=creation_date, model_name=model_name, refresh=False, metadata=metadata)
+        else:
+            publish_assessment(es_url, index(scores_alias, scores_quarters_alias), assessment,
+                               start_date.isoformat(), end_date.isoformat(), score_type=score_type,
+                               creation_date=creation_date, model_name=model_name, refresh=False, metadata=metadata)
+            # store diff assessment in a separated index
+            publish_assessment(es_url, index(null_scores_alias, null_scores_quarters_alias), diff_assessment,
+                               start_date.isoformat(), end_date.isoformat(), score_type=score_type,
+                               creation_date=creation_date, model_name=model_name, refresh=False, metadata=metadata)
+        publish_rollups(es_url, index(rollups_alias, rollups_quarters_alias), rollups,
+                        start_date.isoformat(), end_date.isoformat(), score_type=score_type,
+                        creation_date=creation_date, model_name=model_name, refresh=False, metadata=metadata)
+
+    try:
+        for start_date, next_date, assessment, diff_assessment, rollups in assessments["quarters"]:
+            publish_window(start_date, next_date, SCORES_QUARTER_TYPE, assessment, diff_assessment, rollups)
+
+        publish_window(from_date, to_date, SCORES_ALL_TYPE, *assessments["all"])
+    except Exception:
+        # a partial assessment is never read
+        es_conn.indices.delete(index=new_indexes, ignore_unavailable=True)
+        raise
+
+    # the new indexes are ready to be read: no more writes in them
+    with perfdata.timer('scores_swap', index=scores_prefix):
+        es_conn.indices.put_settings(index=new_indexes, body={"index": {"number_of_replicas": SCORES_REPLICAS,
+                                                                        "refresh_interval": None}})
+        es_conn.indices.refresh(index=new_indexes)
+        es_conn.indices.forcemerge(index=new_indexes, max_num_segments=1)
+
+        # the previous generations, and the indexes of the versions without generations (named as the aliases)
+        current = es_conn.indices.get(index=",".join(all_aliases + [scores_generation_index(alias, "*")
+                                                                    for alias in all_aliases]),
+                                      ignore_unavailable=True)
+        generation = str_to_datetime(creation_date).strftime(SCORES_GENERATION_FORMAT)
+        old_indexes = []
+        for index, index_data in sorted(current.items()):
+            if index in new_index.values():
+                continue
+            read = index in all_aliases or any(alias in all_aliases for alias in index_data.get('aliases', {}))
+            older = index.rsplit("-", 1)[-1] < generation
+            # the generations being loaded are not refreshed (see SCORES_SETTINGS)
+            loading = index_data.get('settings', {}).get('index', {}).get('refresh_interval') == "-1"
+            if read or (older and not loading):
+                old_indexes.append(index)
+
+        actions = [{"remove_index": {"index": index}} for index in old_indexes]
+        for alias, index in new_index.items():
+            for name in [alias] + layout_aliases[alias]:
+                actions.append({"add": {"index": index, "alias": name}})
+        es_conn.indices.update_aliases({"actions": actions})
+
+    logging.info("Scores published in %s, removed: %s", new_indexes, old_indexes)
+
+
+def assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_date, only_attribute=None,
+           rescore=False, layout=SCORES_LAYOUT_METRICS):
     """
     Assess the quality model for all projects from from-date to to-date and by quarters. The former is stored
     in scava-metrics_scores (and scava-metrics_null_scores), the latter in scava-metrics_scores_by_quarters
     (and scava-metrics_null_scores_by_quarters). Scava-metrics_score indexes are aliased with
     scava-metrics_all_scores, scava-metrics_scores_by_quarters indexes are aliased with
-    scava-metrics_scores_by_quarters_all_scores.
+    scava-metrics_scores_by_quarters_all_scores. The scores rolled up to the attributes, goals and model
+    per project are stored in scava-metrics_rollups and scava-metrics_rollups_by_quarters.
+
+    With the projects `layout` all the scores of a project are stored in a single document, in
+    scava-metrics_project_scores and scava-metrics_project_scores_by_quarters, instead of in the
+    scores indexes.
+
+    All of them are aliases of the indexes of the last assessment (e.g. scava-metrics_scores-<creation date>),
+    which are moved to the new indexes once all the scores are published in them.
+
+    The raw values of the metrics are cached in local disk, so the assessment can be done again
+    with new thresholds using just them (`rescore`).
 
     :param es_url: Elasticsearch URL
     :param es_index: Elasticsearch index with the metrics data
@@ -691,86 +1843,62 @@ def assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_dat
     :param only_attribute: do the assessment only for this attribute
     :param from_date: date since which the metrics must be computed
     :param to_date: date until which the metrics must be computed
+    :param rescore: compute the scores with the raw values cached in the last assessment
+    :param layout: layout of the scores (see SCORES_LAYOUTS)
 
     :return: a dict with the assessment for all goals and attributes per project
     """
-    # delete the indexes, if they exist
-    es_conn = Elasticsearch([es_url], timeout=100, verify_certs=HTTPS_CHECK_CERT)
-    # indexes with data
-    scores_index = es_index + SCORES
-    scores_quarters_index = es_index + SCORE_QUARTERS
-    # indexes without data (see issue https://github.com/Bitergia/prosoul/issues/186#issuecomment-553328202)
-    null_scores_index = es_index + NULL_SCORES
-    null_scores_quarters_index = es_index + NULL_SCORE_QUARTERS
-    # aliases
-    all_scores_alias = es_index + ALL_SCORES
-    all_scores_quarters_alias = es_index + ALL_SCORE_QUARTERS
-
-    for index in [scores_index, null_scores_index, scores_quarters_index, null_scores_quarters_index]:
-        if es_conn.indices.exists(index=index):
-            es_conn.indices.delete(index=index)
-
     creation_date = datetime_utcnow().isoformat()
-    # execute the assessment by quarter
-    start_date = from_date
 
-    while True:
-        next_date = start_date + dateutil.relativedelta.relativedelta(months=+3)
+    # all the assessments are done before publishing them, so the last ones are kept if any of them fails
+    assessments = __compute_assessments(es_url, es_index, [model_name], backend_metrics_data, from_date, to_date,
+                                        only_attribute, rescore)[model_name]
+    __publish_assessments(es_url, es_index, model_name, assessments, from_date, to_date, creation_date, layout)
 
-        assessment = __assess(es_url, es_index, model_name, backend_metrics_data, start_date, next_date, only_attribute)
-        publish_assessment(es_url, scores_quarters_index, assessment,
-                           start_date.isoformat(), next_date.isoformat(),
-                           score_type=SCORES_QUARTER_TYPE, creation_date=creation_date)
+    assessment, diff_assessment, _ = assessments["all"]
+    projects_data = goals2projects(assessment, diff_assessment)
+    dump_csv(projects_data)
+    dump_projects(projects_data)
 
-        # store diff assessment (assessment including empty data) in a separated index
-        all_projects = get_scava_projects(es_url, es_index, start_date, next_date)
-        diff_assessment = __diff_assess(all_projects, assessment)
-        publish_assessment(es_url, null_scores_quarters_index, diff_assessment,
-                           start_date.isoformat(), next_date.isoformat(),
-                           score_type=SCORES_QUARTER_TYPE, creation_date=creation_date)
+    return assessment
 
-        if next_date > to_date:
-            break
 
-        start_date = next_date
+def assess_models(es_url, es_index, model_names, backend_metrics_data, from_date, to_date, only_attribute=None,
+                  rescore=False, layout=SCORES_LAYOUT_METRICS):
+    """
+    Assess several quality models for all projects from from-date to to-date and by quarters, sharing
+    the queries to Elasticsearch: the distinct metric queries of all the models are done once per
+    window. The scores of each model are published in its own indexes, with the same names as the
+    ones of `assess` prefixed with the model (see `model_scores_index`), e.g. scava-metrics_my-model_scores.
 
-    # execute the assessment over the full time frame
-    assessment = __assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_date, only_attribute)
-    publish_assessment(es_url, scores_index, assessment, from_date.isoformat(), to_date.isoformat(),
-                       score_type=SCORES_ALL_TYPE, creation_date=creation_date)
-
-    # store diff assessment (assessment including empty data) in a separated index
-    all_projects = get_scava_projects(es_url, es_index, from_date, to_date)
-    diff_assessment = __diff_assess(all_projects, assessment)
-    publish_assessment(es_url, null_scores_index, diff_assessment,
-                       from_date.isoformat(), to_date.isoformat(),
-                       score_type=SCORES_ALL_TYPE, creation_date=creation_date)
-
-    for index in [scores_index, null_scores_index, scores_quarters_index, null_scores_quarters_index]:
-        if not es_conn.indices.exists(index=index):
-            es_conn.indices.create(index=index)
-
-    # set aliases to query all scores and all scores per quarters (null and not null values)
-    es_conn.indices.update_aliases({
-        "actions": [
-            {"add": {"index": null_scores_index, "alias": all_scores_alias}},
-            {"add": {"index": scores_index, "alias": all_scores_alias}},
-            {"add": {"index": null_scores_quarters_index, "alias": all_scores_quarters_alias}},
-            {"add": {"index": scores_quarters_index, "alias": all_scores_quarters_alias}},
-        ]
-    })
+    :param es_url: Elasticsearch URL
+    :param es_index: Elasticsearch index with the metrics data
+    :param model_names: list with the Quality models names
+    :param backend_metrics_data: backend to be used for getting the metrics (ossmeter or grimoirelab)
+    :param only_attribute: do the assessment only for this attribute
+    :param from_date: date since which the metrics must be computed
+    :param to_date: date until which the metrics must be computed
+    :param rescore: compute the scores with the raw values cached in the last assessment
+    :param layout: layout of the scores (see SCORES_LAYOUTS)
 
-    projects_data = goals2projects(assessment, diff_assessment)
-    dump_csv(projects_data)
+    :return: a dict with the assessment for all goals and attributes per project for each model
+    """
+    creation_date = datetime_utcnow().isoformat()
 
-    return assessment
+    assessments = __compute_assessments(es_url, es_index, model_names, backend_metrics_data, from_date, to_date,
+                                        only_attribute, rescore)
+    for model_name in model_names:
+        __publish_assessments(es_url, model_scores_index(es_index, model_name), model_name, assessments[model_name],
+                              from_date, to_date, creation_date, layout)
+
+    return {model_name: assessments[model_name]["all"][0] for model_name in model_names}
 
 
 def extract_metrics(qm_assessment):
     """
-    Extract all metrics from a quality model assessment
-    :param qm_assessment: a dict with the quality model assessment
-    :return: a list with all the metrics
+    Extract the scores of all metrics from the quality model assessment of a project
+    :param qm_assessment: a dict with the quality model assessment of a project (goal -> attribute -> metric)
+    :return: a list with the scores of all the metrics with score
     """
 
     metrics = []
@@ -778,7 +1906,9 @@ def extract_metrics(qm_assessment):
     for goal in qm_assessment:
         for attr in qm_assessment[goal]:
             for metric in qm_assessment[goal][attr]:
-                metrics.append(qm_assessment[goal][attr][metric]['score'])
+                score = qm_assessment[goal][attr][metric]['score']
+                if score is not None:
+                    metrics.append(score)
 
     return metrics
 
@@ -788,15 +1918,16 @@ def build_project_big_number(project):
     Get all metrics for a project and compute the average
 
     :param project: a dict with a project assessment
-    :return: the average of all metrics
+    :return: the average of all metrics, None if no metric has score
     """
 
     average = None
     metrics = []
 
     metrics = extract_metrics(project)
-    average = sum(metrics) / len(metrics)
-    average = round(average, 2)
+    if metrics:
+        average = sum(metrics) / len(metrics)
+        average = round(average, 2)
 
     return average
 
@@ -827,6 +1958,75 @@ def dump_csv(projects_data):
                                                         projects_data[project][goal][attr][metric]['score']])
 
 
+def summarize_project(project_data):
+    """
+    Summarize the assessment of a project
+
+    :param project_data: dict with the project assessment (goal -> attribute -> metric)
+    :return: a dict with the mean score of the metrics with data, the number of them
+             and the number of metrics in the assessment
+    """
+
+    scores = [project_data[goal][attr][metric]['score']
+              for goal in project_data for attr in project_data[goal] for metric in project_data[goal][attr]]
+    with_data = [score for score in scores if score is not None]
+
+    return {
+        "score": round(sum(with_data) / len(with_data), 2) if with_data else None,
+        "metrics_with_data": len(with_data),
+        "metrics": len(scores)
+    }
+
+
+def dump_projects(projects_data):
+    """
+    Dump the projects assessment to a JSON file in ASSESSMENT_PROJECTS_DIR_PATH, with a
+    summary per project to list them without reading their whole assessment
+
+    :param projects_data: dict with the projects assessment (project -> goal -> attribute -> metric)
+    :return:
+    """
+
+    projects = {
+        "summary": {project: summarize_project(projects_data[project]) for project in projects_data},
+        "projects": projects_data
+    }
+
+    os.makedirs(ASSESSMENT_PROJECTS_DIR_PATH, exist_ok=True)
+    with open(os.path.join(ASSESSMENT_PROJECTS_DIR_PATH, ASSESSMENT_PROJECTS_FILE_NAME), 'w') as fprojects:
+        json.dump(projects, fprojects, sort_keys=True)
+
+    # The ones dumped by the previous versions in the static files are removed
+    static_file = ASSESSMENT_CSV_DIR_PATH + ASSESSMENT_PROJECTS_FILE_NAME
+    if os.path.exists(static_file):
+        os.remove(static_file)
+
+
+def load_projects():
+    """
+    Load the projects assessment dumped by the last assessment. The file is parsed
+    again only if it has been modified.
+
+    :return: a dict with the summary and the assessment per project, None if there is no assessment
+    """
+
+    projects_file = os.path.join(ASSESSMENT_PROJECTS_DIR_PATH, ASSESSMENT_PROJECTS_FILE_NAME)
+
+    try:
+        stat = os.stat(projects_file)
+    except OSError:
+        return None
+
+    version = (stat.st_mtime_ns, stat.st_size)
+    cached = _projects_cache.get(projects_file)
+    if not cached or cached[0] != version:
+        with open(projects_file) as fprojects:
+            cached = (version, json.load(fprojects))
+        _projects_cache[projects_file] = cached
+
+    return cached[1]
+
+
 def build_report(assessment, kind):
     """
 
@@ -870,10 +2070,13 @@ def show_report(report_data, kind, plot_data=False):
     if kind not in kinds:
         raise RuntimeError("Report kind not supported " + kind)
 
-    sorted_report = sorted(report.items(), key=operator.itemgetter(1), reverse=True)
+    # the projects without score are the last ones
+    sorted_report = sorted(report_data.items(), key=lambda item: (item[1] is not None, item[1] or 0), reverse=True)
     for item in sorted_report:
         print(item)
     if plot_data:
+        import matplotlib.pyplot as plot
+
         scores = [item[1] for item in sorted_report]
         x = range(0, len(scores))
         plot.plot(x, scores)
@@ -881,22 +2084,42 @@ def show_report(report_data, kind, plot_data=False):
         plot.show()
 
 
-if __name__ == '__main__':
+def run(args):
+    """ Assess the projects using the params from the command line """
 
-    args = get_params()
+    global SLOW_QUERY_SECS
 
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
-        logging.debug("Debug mode activated")
-    else:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
+    setup_django()
 
     from_date = None if not args.from_date else str_to_datetime(args.from_date)
     to_date = None if not args.to_date else str_to_datetime(args.to_date)
 
-    assessment = assess(args.elastic_url, args.index, args.model, args.backend_metrics_data,
-                        from_date, to_date, args.attribute)
-    report = build_report(assessment, "big_number")
-    show_report(report, "big_number", args.plot)
+    SLOW_QUERY_SECS = args.slow_query
+
+    with perfdata.run('assess', model=",".join(args.model)) as assess_run:
+        if len(args.model) == 1:
+            assessments = {args.model[0]: assess(args.elastic_url, args.index, args.model[0],
+                                                 args.backend_metrics_data, from_date, to_date,
+                                                 args.attribute, args.rescore, args.layout)}
+        else:
+            assessments = assess_models(args.elastic_url, args.index, args.model, args.backend_metrics_data,
+                                        from_date, to_date, args.attribute, args.rescore, args.layout)
+    if args.perfdata:
+        assess_run.dump(args.perfdata)
+    if args.cost_report:
+        show_metrics_cost(rank_metrics_cost(assess_run.summary()))
+    for model_name in args.model:
+        if len(args.model) > 1:
+            print(model_name)
+        report = build_report(assessments[model_name], "big_number")
+        show_report(report, "big_number", args.plot)
+
+
+def main(args=None):
+    args = get_params(args)
+    config_logging(args.debug)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
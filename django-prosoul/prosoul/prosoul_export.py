@@ -26,22 +26,12 @@ import argparse
 import json
 import logging
 import os
-import sys
 
-from time import time
+from prosoul import perfdata
+from prosoul.prosoul_utils import config_logging, setup_django
 
-import django
-# settings.configure()
-os.environ['DJANGO_SETTINGS_MODULE'] = 'django_prosoul.settings'
-django.setup()
 
-from prosoul.models import QualityModel
-from django.db.models import Q
-
-
-def get_params():
-    parser = argparse.ArgumentParser(usage="usage: prosoul_export.py [options]",
-                                     description="Export a Metrics Model to a file")
+def add_params(parser):
     parser.add_argument("-f", "--file", required=True,
                         help="File path in which to export the Metrics Models")
     parser.add_argument('-g', '--debug', action='store_true')
@@ -49,7 +39,13 @@ def get_params():
     parser.add_argument('--format', default='grimoirelab',
                         help="Import file format (default grimoirelab)")
 
-    return parser.parse_args()
+
+def get_params(args=None):
+    parser = argparse.ArgumentParser(usage="usage: prosoul_export.py [options]",
+                                     description="Export a Metrics Model to a file")
+    add_params(parser)
+
+    return parser.parse_args(args)
 
 
 def fetch_model(model_name):
@@ -114,6 +110,8 @@ def fetch_model(model_name):
 
         return goal_json
 
+    from prosoul.models import QualityModel
+
     model_json = {}
 
     logging.debug("Fetch the model %s", model_name)
@@ -135,7 +133,11 @@ def fetch_model(model_name):
     return model_json
 
 
+@perfdata.timed('orm_tree_walk')
 def fetch_models(model_name=None, user=None):
+    from django.db.models import Q
+    from prosoul.models import QualityModel
+
     models_json = {"qualityModels": []}
 
     if model_name:
@@ -370,62 +372,64 @@ def show_report(models_json):
     print("Factoids:", nfactoids)
 
 
-if __name__ == '__main__':
-
-    task_init = time()
-
-    args = get_params()
+def run(args):
+    """ Export the models using the params from the command line """
 
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
-        logging.debug("Debug mode activated")
-    else:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
+    setup_django()
 
     if os.path.isfile(args.file):
         logging.info("%s exists. Remove it before running.", args.file)
-        sys.exit(0)
-
-    with open(args.file, "w") as fmodel:
-        try:
-            if args.model:
-                logging.info("Exporting model %s to file %s", args.model, args.file)
-                models_json = fetch_models(args.model)
-            else:
-                logging.info("Exporting all models to file %s", args.file)
-                models_json = fetch_models()
-
-            show_report(models_json)
-
-            if args.format == 'ossmeter':
-                models_json = gl2ossmeter(models_json)
-            elif args.format == 'alambic':
-                models_json = gl2alambic(models_json)
-            elif args.format == 'viewer':
-                models_json = gl2viewer(models_json)
-            elif args.format == 'grimoirelab':
-                models_json = models_json
-            else:
-                raise RuntimeError('Export format not supported ' + args.format)
-
-            if args.format != 'viewer':
-                json.dump(models_json, fmodel, indent=True)
-            else:
-                json.dump(models_json[0], fmodel, indent=True)
-                logging.info('Generating extra files for attributes and metrics')
-                # attributes_full.json
-                attributes_file = os.path.join(os.path.dirname(fmodel.name), "attributes_full.json")
-                with open(attributes_file, "w") as fattrs:
-                    json.dump(models_json[1], fattrs, indent=True)
-                # metrics_full.json
-                metrics_file = os.path.join(os.path.dirname(fmodel.name), "metrics_full.json")
-                with open(metrics_file, "w") as fmetrics:
-                    json.dump(models_json[2], fmetrics, indent=True)
-
-        except Exception:
-            os.remove(args.file)
-            raise
-
-    logging.debug("Total exporting time ... %.2f sec", time() - task_init)
+        return
+
+    with perfdata.run('export', model=args.model) as export_run:
+        with open(args.file, "w") as fmodel:
+            try:
+                if args.model:
+                    logging.info("Exporting model %s to file %s", args.model, args.file)
+                    models_json = fetch_models(args.model)
+                else:
+                    logging.info("Exporting all models to file %s", args.file)
+                    models_json = fetch_models()
+
+                show_report(models_json)
+
+                if args.format == 'ossmeter':
+                    models_json = gl2ossmeter(models_json)
+                elif args.format == 'alambic':
+                    models_json = gl2alambic(models_json)
+                elif args.format == 'viewer':
+                    models_json = gl2viewer(models_json)
+                elif args.format == 'grimoirelab':
+                    models_json = models_json
+                else:
+                    raise RuntimeError('Export format not supported ' + args.format)
+
+                if args.format != 'viewer':
+                    json.dump(models_json, fmodel, indent=True)
+                else:
+                    json.dump(models_json[0], fmodel, indent=True)
+                    logging.info('Generating extra files for attributes and metrics')
+                    # attributes_full.json
+                    attributes_file = os.path.join(os.path.dirname(fmodel.name), "attributes_full.json")
+                    with open(attributes_file, "w") as fattrs:
+                        json.dump(models_json[1], fattrs, indent=True)
+                    # metrics_full.json
+                    metrics_file = os.path.join(os.path.dirname(fmodel.name), "metrics_full.json")
+                    with open(metrics_file, "w") as fmetrics:
+                        json.dump(models_json[2], fmetrics, indent=True)
+
+            except Exception:
+                os.remove(args.file)
+                raise
+
+    logging.debug("Total exporting time ... %.2f sec", export_run.wall_time)
+
+
+def main(args=None):
+    args = get_params(args)
+    config_logging(args.debug)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
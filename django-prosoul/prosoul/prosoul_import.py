@@ -25,27 +25,17 @@
 import argparse
 import json
 import logging
-import os
 
-from time import time
-
-import django
-# settings.configure()
-os.environ['DJANGO_SETTINGS_MODULE'] = 'django_prosoul.settings'
-django.setup()
-
-from django.test import TestCase
-
-from prosoul.models import Attribute, DataSourceType, Factoid, Goal, Metric, MetricData, QualityModel
+from django.db.utils import IntegrityError
 
+from prosoul import perfdata
 from prosoul.prosoul_export import fetch_models, gl2alambic, gl2ossmeter, show_report
+from prosoul.prosoul_utils import config_logging, setup_django
 
 SUPPORTED_FORMATS = ['alambic', 'grimoirelab', 'ossmeter']
 
 
-def get_params():
-    parser = argparse.ArgumentParser(usage="usage: prosoul_import.py [options]",
-                                     description="Import Metrics Models in Prosoul")
+def add_params(parser):
     parser.add_argument('-g', '--debug', action='store_true')
     parser.add_argument("-f", "--file", required=True,
                         help="File path from which to load the Metrics Models")
@@ -54,7 +44,13 @@ def get_params():
     parser.add_argument('-c', '--check', action='store_true',
                         help='Export the data and compare it with the imported')
 
-    return parser.parse_args()
+
+def get_params(args=None):
+    parser = argparse.ArgumentParser(usage="usage: prosoul_import.py [options]",
+                                     description="Import Metrics Models in Prosoul")
+    add_params(parser)
+
+    return parser.parse_args(args)
 
 
 def add(cls_orm, **params):
@@ -70,7 +66,7 @@ def add(cls_orm, **params):
         try:
             obj_orm.save()
             logging.debug('Added %s: %s', cls_orm.__name__, params)
-        except django.db.utils.IntegrityError as ex:
+        except IntegrityError as ex:
             obj_orm = None
             logging.error("Can't add %s: %s", cls_orm.__name__, params)
             logging.error(ex)
@@ -78,7 +74,9 @@ def add(cls_orm, **params):
     return obj_orm
 
 
+@perfdata.timed('model_import')
 def feed_models(models_json):
+    from prosoul.models import Attribute, DataSourceType, Factoid, Goal, Metric, MetricData, QualityModel
 
     def feed_attribute(attribute):
         aparams = {"name": attribute['name']}
@@ -279,6 +277,8 @@ def convert_to_grimoirelab(format_, model_json):
 
 
 def compare_models(models_json, format_=None):
+    from django.test import TestCase
+
     # The Prosoul database must only contains the models imported
     exported_models_json = fetch_models()
     if format_ == 'ossmeter':
@@ -291,22 +291,15 @@ def compare_models(models_json, format_=None):
     logging.info("Check completed")
 
 
-if __name__ == '__main__':
-    task_init = time()
-
-    args = get_params()
+def run(args):
+    """ Import the models using the params from the command line """
 
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
-        logging.debug("Debug mode activated")
-    else:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
+    setup_django()
 
     logging.info("Importing models from file %s", args.file)
-    with open(args.file) as fmodel:
-        import_models_json = json.load(fmodel)
+    with perfdata.run('import', format=args.format) as import_run:
+        with open(args.file) as fmodel:
+            import_models_json = json.load(fmodel)
         models_json = import_models_json
         if args.format != "grimoirelab":
             models_json = convert_to_grimoirelab(args.format, import_models_json)
@@ -314,8 +307,18 @@ if __name__ == '__main__':
 
         show_report(models_json)
 
-        logging.debug("Total importing time ... %.2f sec", time() - task_init)
+    logging.debug("Total importing time ... %.2f sec", import_run.wall_time)
+
+    if args.check:
+        logging.info('Checking data ...')
+        compare_models(import_models_json, args.format)
 
-        if args.check:
-            logging.info('Checking data ...')
-            compare_models(import_models_json, args.format)
+
+def main(args=None):
+    args = get_params(args)
+    config_logging(args.debug)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,23 +22,15 @@
 
 import argparse
 import logging
-import os
 from statistics import mean, median, stdev
 
-import matplotlib.pyplot as plot
+from grimoirelab_toolkit.datetime import str_to_datetime
 
-import django
-# settings.configure()
-os.environ['DJANGO_SETTINGS_MODULE'] = 'django_prosoul.settings'
-django.setup()
-
-from prosoul.models import QualityModel
 from prosoul.prosoul_assess import compute_metric_per_project
+from prosoul.prosoul_utils import config_logging, setup_django
 
 
-def get_params():
-    parser = argparse.ArgumentParser(usage="usage: mdashboard.py [options]",
-                                     description="Create a Kibana Dashboard to show a Quality Model")
+def add_params(parser):
     parser.add_argument("-e", "--elastic-url", required=True,
                         help="Elasticsearch URL with the metrics")
     parser.add_argument('-g', '--debug', action='store_true')
@@ -51,11 +43,21 @@ def get_params():
     parser.add_argument('--metrics', nargs='*', help='Metrics names to be computed')
     parser.add_argument('--plot', action='store_true',
                         help='Show a plot with the metrics values (use it with --metric option)')
+    parser.add_argument('--from-date', default='1970-01-01',
+                        help="Compute the metrics from this date (default 1970-01-01)")
+    parser.add_argument('--to-date', default='2100-01-01',
+                        help="Compute the metrics until this date (default 2100-01-01)")
+
+
+def get_params(args=None):
+    parser = argparse.ArgumentParser(usage="usage: prosoul_metrics.py [options]",
+                                     description="Compute the metrics of a Quality Model for all the projects")
+    add_params(parser)
 
-    return parser.parse_args()
+    return parser.parse_args(args)
 
 
-def compute_metrics(names, es_url, es_index, model_name, backend_metrics_data):
+def compute_metrics(names, es_url, es_index, model_name, backend_metrics_data, from_date, to_date):
     """
     Compute the value for a list of metrics
     :param names: list with the names of the metrics to be computed
@@ -65,12 +67,13 @@ def compute_metrics(names, es_url, es_index, model_name, backend_metrics_data):
     metrics_values = {}
 
     for name in names:
-        metrics_values[name] = compute_metric(name, es_url, es_index, model_name, backend_metrics_data)
+        metrics_values[name] = compute_metric(name, es_url, es_index, model_name, backend_metrics_data,
+                                              from_date, to_date)
 
     return metrics_values
 
 
-def compute_metric(name, es_url, es_index, model_name, backend_metrics_data):
+def compute_metric(name, es_url, es_index, model_name, backend_metrics_data, from_date, to_date):
     """
     Compute the value for a metric
 
@@ -79,6 +82,8 @@ def compute_metric(name, es_url, es_index, model_name, backend_metrics_data):
     :param es_index: index with the metrics data
     :param model_name: quality model name to be used
     :param backend_metrics_data: backend used to collect the metrics data
+    :param from_date: date from which to compute the metric
+    :param to_date: date until which to compute the metric
     :return: a list with the metric value per project
     """
 
@@ -100,7 +105,8 @@ def compute_metric(name, es_url, es_index, model_name, backend_metrics_data):
         raise RuntimeError("metric %s has no data" % name)
 
     # Time to compute the metric
-    metric_value = compute_metric_per_project(es_url, es_index, metric.data, backend_metrics_data)
+    metric_value = compute_metric_per_project(es_url, es_index, metric.data, backend_metrics_data,
+                                              from_date, to_date)
 
     return metric_value
 
@@ -117,6 +123,8 @@ def list_metrics(es_url, es_index, model_name, backend_metrics_data):
 
     """
 
+    from prosoul.models import QualityModel
+
     logging.debug("Listing the metrics available")
 
     metrics = []
@@ -126,7 +134,7 @@ def list_metrics(es_url, es_index, model_name, backend_metrics_data):
     try:
         model_orm = QualityModel.objects.get(name=model_name)
     except QualityModel.DoesNotExist:
-        RuntimeError('Can not find the metrics model %s' + model_name)
+        raise RuntimeError('Can not find the metrics model %s' % model_name)
 
     for goal in model_orm.goals.all():
         for attribute in goal.attributes.all():
@@ -160,6 +168,8 @@ def show_metric_stats(name, metric_project_values, plot_data=False):
           "Median:", round(median(metrics), 2), "Stdev:", round(stdev(metrics), 2))
 
     if plot_data:
+        import matplotlib.pyplot as plot
+
         # Plot the metrics
         x = range(0, len(metrics))
         plot.plot(x, metrics)
@@ -167,22 +177,26 @@ def show_metric_stats(name, metric_project_values, plot_data=False):
         plot.show()
 
 
-if __name__ == '__main__':
-
-    args = get_params()
+def run(args):
+    """ List or compute the metrics using the params from the command line """
 
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
-        logging.debug("Debug mode activated")
-    else:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
+    setup_django()
 
     if args.list:
         metrics = list_metrics(args.elastic_url, args.index, args.model, args.backend_metrics_data)
         print(metrics)
     elif args.metrics:
-        metrics_value = compute_metrics(args.metrics, args.elastic_url, args.index, args.model, args.backend_metrics_data)
+        metrics_value = compute_metrics(args.metrics, args.elastic_url, args.index, args.model, args.backend_metrics_data,
+                                        str_to_datetime(args.from_date), str_to_datetime(args.to_date))
         for name, metric_value in metrics_value.items():
             show_metric_stats(name, metric_value, plot_data=args.plot)
+
+
+def main(args=None):
+    args = get_params(args)
+    config_logging(args.debug)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
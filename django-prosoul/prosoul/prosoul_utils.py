@@ -20,9 +20,84 @@
 #   Valerio Cosentino <valcos@bitergia.com>
 #
 #
+import logging
+import os
+import threading
 
 # Supported backends for providing the data for metrics in the quality models
 BACKEND_METRICS_DATA = ['scava-metrics', 'grimoirelab', 'ossmeter']
+DJANGO_SETTINGS_MODULE = 'django_prosoul.settings'
+ES_TIMEOUT = 100
+
+# Elasticsearch clients shared by all the steps done in the process, and HTTP session
+# of each thread (requests sessions are not thread safe)
+_es_connections = {}
+_connections_lock = threading.Lock()
+_local = threading.local()
+
+
+def setup_django():
+    """
+    Set up Django so the ORM can be used from the scripts. It does nothing if
+    it is already set up (the scripts are also used from the web application).
+    """
+
+    from django.apps import apps
+
+    if apps.ready:
+        return
+
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', DJANGO_SETTINGS_MODULE)
+    django.setup()
+
+
+def config_logging(debug=False):
+    """ Configure the logging for the scripts """
+
+    if debug:
+        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
+        logging.debug("Debug mode activated")
+    else:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
+    logging.getLogger("requests").setLevel(logging.WARNING)
+
+
+def http_session():
+    """
+    Get the HTTP session shared by the requests to Elasticsearch and Kibana done
+    in the thread, so the connections opened by a step are reused by the next ones.
+    """
+
+    if getattr(_local, 'http_session', None) is None:
+        import requests
+
+        _local.http_session = requests.Session()
+
+    return _local.http_session
+
+
+def es_connection(es_url, verify_certs=False):
+    """
+    Get the Elasticsearch client for an URL. The clients are shared, so their
+    connections pool is reused by all the steps done in the process.
+
+    :param es_url: Elasticsearch URL
+    :param verify_certs: check the certificate of the Elasticsearch server
+    :return: an Elasticsearch client
+    """
+
+    key = (es_url, verify_certs)
+
+    with _connections_lock:
+        if key not in _es_connections:
+            from elasticsearch import Elasticsearch
+
+            _es_connections[key] = Elasticsearch([es_url], timeout=ES_TIMEOUT, verify_certs=verify_certs)
+
+    return _es_connections[key]
 
 
 def find_metric_name_field(backend_metrics_data):
@@ -39,3 +114,17 @@ def find_metric_name_field(backend_metrics_data):
         metric_name = 'metric_name'
 
     return metric_name
+
+
+def find_date_field(backend_metrics_data):
+    """ Find the field with the date of the metrics samples for a given backend for metrics """
+
+    if backend_metrics_data not in BACKEND_METRICS_DATA:
+        raise RuntimeError('Backend for metrics data not supported: ' + backend_metrics_data)
+
+    if backend_metrics_data == 'grimoirelab':
+        date_field = 'grimoire_creation_date'
+    else:
+        date_field = 'datetime'
+
+    return date_field
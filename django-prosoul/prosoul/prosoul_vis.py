@@ -24,31 +24,31 @@
 #
 
 import argparse
+import copy
 import json
 import logging
-import os
+
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
 
-import django
-# settings.configure()
-os.environ['DJANGO_SETTINGS_MODULE'] = 'django_prosoul.settings'
-django.setup()
+from django.db import connection
 
+from prosoul import perfdata
 from prosoul.data import VizTemplatesData
-from prosoul.models import QualityModel
-from prosoul.prosoul_assess import assess
-from prosoul.prosoul_utils import find_metric_name_field
+from prosoul.prosoul_assess import (assess, find_last_assessment, get_quality_model, model_generation, models_cache,
+                                    walk_model)
+from prosoul.prosoul_utils import config_logging, find_metric_name_field, http_session, setup_django
 
-from kidash.kidash import feed_dashboard
+from grimoirelab_toolkit.datetime import (datetime_utcnow,
+                                          str_to_datetime)
 
 ES_HEADERS = {"Content-Type": "application/json", "kbn-xsrf": "true"}
 ASSESS_PANEL = 'panels/scava-projects-radar.json'
+UPLOAD_WORKERS = 8  # max number of dashboards uploaded to Kibana at the same time
 
 
-def get_params():
-    parser = argparse.ArgumentParser(usage="usage: prosoul_vis.py [options]",
-                                     description="Create a Kibana Dashboard to show a Quality Model")
+def add_params(parser):
     parser.add_argument("-e", "--elastic-url", default="http://localhost:9200",
                         help="Elasticsearch URL with the metrics (http://localhost:9200 by default)")
     parser.add_argument("-k", "--kibana-url", default="http://localhost:5601",
@@ -63,8 +63,28 @@ def get_params():
                         help='Model to be used to build the Dashboard')
     parser.add_argument('-b', '--backend-metrics-data', default='scava-metrics',
                         help='Backend metrics data to use (Scava metrics, grimoirelab, ossmeter, ...)')
+    parser.add_argument('--from-date', default='1970-01-01',
+                        help='Start date from which to compute the metrics (1970-01-01 by default)')
+    parser.add_argument('--to-date', default='2100-01-01',
+                        help='End date to compute the metrics (2100-01-01 by default)')
+    parser.add_argument('--assess-max-age', type=int,
+                        help='Reuse the last assessment if it is newer than these seconds')
+
+
+def get_params(args=None):
+    parser = argparse.ArgumentParser(usage="usage: prosoul_vis.py [options]",
+                                     description="Create a Kibana Dashboard to show a Quality Model")
+    add_params(parser)
+
+    return parser.parse_args(args)
+
 
-    return parser.parse_args()
+def feed_dashboard(dashboard, es_url, kibana_url):
+    """ Upload a dashboard to Kibana. kidash is imported only when a dashboard is uploaded. """
+
+    from kidash.kidash import feed_dashboard as kidash_feed_dashboard
+
+    kidash_feed_dashboard(dashboard, es_url, kibana_url)
 
 
 def build_filters(metrics, metric_name):
@@ -119,9 +139,9 @@ def create_alias(es_url, es_index, es_alias):
         ]
     }""" % (es_index, es_alias)
 
-    res = requests.post(es_url + "/_aliases",
-                        headers=ES_HEADERS,
-                        data=add_alias, verify=False)
+    res = http_session().post(es_url + "/_aliases",
+                              headers=ES_HEADERS,
+                              data=add_alias, verify=False)
     try:
         res.raise_for_status()
         logging.debug("Created alias %s for index %s" % (es_alias, es_index))
@@ -130,25 +150,22 @@ def create_alias(es_url, es_index, es_alias):
         raise
 
 
-def build_dashboard(es_url, kibana_url, es_index, template_filename, goal, attribute,
-                    backend_metrics_data):
+@perfdata.timed('template_render')
+def render_dashboard(template, goal, attribute, backend_metrics_data):
     """
-    Build a Kibana dashboard using as template template_filename showing the data for
-    an attribute in a goal from the quality model.
+    Render in memory a Kibana dashboard from an already parsed template showing the data
+    for an attribute in a goal from the quality model. Only the dashboard object is
+    included: the index patterns, searches and visualizations in the template are shared
+    by all the attribute dashboards.
 
-    :param es_url: Elasticsearch URL
-    :param kibana_url: Kibana URL
-    :param es_index: index with the metrics data
-    :param template_filename: template to be used to create the dashboard
+    :param template: dict with the template to be used to create the dashboard
     :param goal: quality model goal to be included
     :param attribute: atribute in the goal to be included
     :param backend_metrics_data: metrics backend to be used for getting the data
-    :return: a dict with the dashboard created
+    :return: a dict with the dashboard rendered
     """
 
-    logging.debug('Building the dashboard for the attribute: %s (goal %s)', attribute, goal)
-
-    # Check that the model and the template dashboard exists
+    logging.debug('Rendering the dashboard for the attribute: %s (goal %s)', attribute, goal)
 
     # Collect metrics to be included in this attribute
     metrics_data = []
@@ -161,15 +178,9 @@ def build_dashboard(es_url, kibana_url, es_index, template_filename, goal, attri
 
     logging.debug("Metrics to be included: %s", metrics_data)
 
-    # Upload the dashboard created from the template dashboard
-    logging.debug("Uploading the template panel %s", template_filename)
-    dashboard = VizTemplatesData.read_template(template_filename)
-
-    # An alias is created from the index with the metrics to the template index
-    index_pattern_name = dashboard['index_patterns'][0]['id']
-    create_alias(es_url, es_index, index_pattern_name)
+    dashboard = {'dashboard': copy.deepcopy(template['dashboard'])}
 
-    # Add the filters to the template dashboard and export it to Kibana
+    # Add the filters to the template dashboard
     search_json = json.loads(dashboard['dashboard']['value']['kibanaSavedObjectMeta']['searchSourceJSON'])
     metric_name = find_metric_name_field(backend_metrics_data)
     search_json['filter'] = build_filters(metrics_data, metric_name)
@@ -177,11 +188,66 @@ def build_dashboard(es_url, kibana_url, es_index, template_filename, goal, attri
     dashboard['dashboard']['value']['title'] = goal.name + "_" + attribute.name
     dashboard['dashboard']['id'] = goal.name + "_" + attribute.name
 
-    feed_dashboard(dashboard, es_url, kibana_url)
+    return dashboard
 
-    logging.info('Created the attribute dashboard %s', dashboard['dashboard']['value']['title'])
 
-    return dashboard
+@perfdata.timed('dashboard_upload')
+def upload_dashboards(dashboards, es_url, kibana_url, workers=UPLOAD_WORKERS):
+    """
+    Upload concurrently a list of dashboards to Kibana
+
+    :param dashboards: list of dicts with the dashboards to be uploaded
+    :param es_url: Elasticsearch URL
+    :param kibana_url: Kibana URL
+    :param workers: max number of dashboards uploaded at the same time
+    :return:
+    """
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        uploads = [executor.submit(feed_dashboard, dashboard, es_url, kibana_url) for dashboard in dashboards]
+        # Wait for all the uploads, raising the first error found
+        for upload in uploads:
+            upload.result()
+
+
+def build_attributes_dashboards(es_url, kibana_url, es_index, template_filename, model_orm,
+                                backend_metrics_data, workers=UPLOAD_WORKERS):
+    """
+    Build the Kibana dashboards for all the attributes in a quality model, including the
+    subgoals and subattributes. The template is read and its alias created just once, all
+    the dashboards are rendered in memory and then uploaded concurrently.
+
+    :param es_url: Elasticsearch URL
+    :param kibana_url: Kibana URL
+    :param es_index: index with the metrics data
+    :param template_filename: template to be used to create the dashboards
+    :param model_orm: quality model with the goals and attributes to be included
+    :param backend_metrics_data: metrics backend to be used for getting the data
+    :param workers: max number of dashboards uploaded at the same time
+    :return: a list with the dashboards created
+    """
+
+    logging.debug("Uploading the template panel %s", template_filename)
+    template = VizTemplatesData.read_template(template_filename)
+
+    # An alias is created from the index with the metrics to the template index
+    index_pattern_name = template['index_patterns'][0]['id']
+    create_alias(es_url, es_index, index_pattern_name)
+
+    # The objects shared by all the dashboards are uploaded just once
+    shared_objects = {key: value for key, value in template.items() if key != 'dashboard'}
+    feed_dashboard(shared_objects, es_url, kibana_url)
+
+    dashboards = []
+    for goal, attributes in walk_model(model_orm):
+        for attribute in attributes:
+            dashboards.append(render_dashboard(template, goal, attribute, backend_metrics_data))
+
+    upload_dashboards(dashboards, es_url, kibana_url, workers)
+
+    logging.info('Created %i attribute dashboards', len(dashboards))
+
+    return dashboards
 
 
 def build_menu(es_url, qm_menu, assessment_menu):
@@ -232,22 +298,45 @@ def build_menu(es_url, qm_menu, assessment_menu):
         }
     } """
 
-    res = requests.put(es_url + "/.kibana/_mapping/doc", headers=ES_HEADERS, verify=False,
-                       data=menu_mapping)
+    res = http_session().put(es_url + "/.kibana/_mapping/doc", headers=ES_HEADERS, verify=False,
+                             data=menu_mapping)
     res.raise_for_status()
 
     # Upload the menu created
-    res = requests.put(es_url + "/.kibana/doc/metadashboard", headers=ES_HEADERS, verify=False,
-                       data=json.dumps(kibana_menu))
+    res = http_session().put(es_url + "/.kibana/doc/metadashboard", headers=ES_HEADERS, verify=False,
+                             data=json.dumps(kibana_menu))
     res.raise_for_status()
     logging.debug("Menu created: %s" % json.dumps(kibana_menu, indent=True))
 
 
+def assess_in_thread(es_url, es_index, model_name, backend_metrics_data, from_date, to_date, model_orm=None):
+    """
+    Do the assessment from a thread different from the main one. The database connection
+    opened by the thread for reading the model must be closed by the thread itself.
+
+    :param model_orm: the model compiled in the main thread, so it is not read again (it is just read
+                      by both threads, all its relations are read in advance by `get_quality_model`)
+    """
+
+    try:
+        with perfdata.run('assess', model=model_name), models_cache() as models:
+            if model_orm is not None:
+                models[model_name] = model_orm
+            return assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_date)
+    finally:
+        connection.close()
+
+
 def build_dashboards(es_url, kibana_url, es_index, template_file, template_assess_file,
-                     model_name, backend_metrics_data, from_date, to_date):
+                     model_name, backend_metrics_data, from_date, to_date, assess_max_age=None):
     """
     Create all the dashboards needed to viz a Quality Model
 
+    The assessment of the projects is done at the same time that the dashboards and
+    the menu are built and uploaded. If `assess_max_age` is defined and there is an
+    assessment for the same version of the model, backend and time frame more recent than
+    it, the assessment is reused and it is not done again.
+
     :param es_url: Elasticsearch URL
     :param kibana_url: Kibana URL
     :param es_index: index in elasticsearch with the metrics data
@@ -257,6 +346,7 @@ def build_dashboards(es_url, kibana_url, es_index, template_file, template_asses
     :param backend_metrics_data: backend to use to collect the metrics data
     :param from_date: date since which the metrics must be computed
     :param to_date: date until which the metrics must be computed
+    :param assess_max_age: max age in seconds of an assessment to be reused
     :return:
     """
 
@@ -268,43 +358,61 @@ def build_dashboards(es_url, kibana_url, es_index, template_file, template_asses
     qm_menu = {}  # Kibana menu for accessing the Quality Model dashboards
     assess_menu = {}  # Kibana menu for accessing the assessment dashboard
 
-    # Check that the model and the template dashboard exists
-    model_orm = None
-    try:
-        model_orm = QualityModel.objects.get(name=model_name)
-    except QualityModel.DoesNotExist:
-        logging.error('Can not find the metrics model %s', model_name)
-        raise RuntimeError("Can not find the metrics model " + model_name)
-
-    # Build a new dashboard for each attribute in the quality model
-    for goal in model_orm.goals.all():
-        for attribute in goal.attributes.all():
-            dash_json = build_dashboard(es_url, kibana_url, es_index, template_file, goal,
-                                        attribute, backend_metrics_data)
-            qm_menu[dash_json['dashboard']['value']['title']] = dash_json['dashboard']['id']
+    # Check that the model exists, the compiled model is passed to the assessment thread
+    model_orm = get_quality_model(model_name)
 
     # Project assessment is included also in the viz
-    assess(es_url, es_index, model_name, backend_metrics_data, from_date, to_date)
-    # Upload the radar viz to show the assessment
-    assess_dash = VizTemplatesData.read_template(template_assess_file)
-    feed_dashboard(assess_dash, es_url, kibana_url)
-    assess_menu[assess_dash['dashboard']['value']['title']] = assess_dash['dashboard']['id']
+    last_assessment = None
+    if assess_max_age is not None:
+        # only an assessment of the same version of the model and backend is reused
+        last_assessment = find_last_assessment(es_url, es_index, model_name, from_date, to_date, backend_metrics_data,
+                                               model_generation(model_orm))
+
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assessment = None
+        if last_assessment and (datetime_utcnow() - last_assessment).total_seconds() <= assess_max_age:
+            logging.info('Reusing the assessment done at %s', last_assessment.isoformat())
+        else:
+            assessment = executor.submit(assess_in_thread, es_url, es_index, model_name,
+                                         backend_metrics_data, from_date, to_date, model_orm)
 
-    build_menu(es_url, qm_menu, assess_menu)
+        # Build a new dashboard for each attribute in the quality model
+        dashboards = build_attributes_dashboards(es_url, kibana_url, es_index, template_file, model_orm,
+                                                 backend_metrics_data)
+        for dash_json in dashboards:
+            qm_menu[dash_json['dashboard']['value']['title']] = dash_json['dashboard']['id']
 
+        # Upload the radar viz to show the assessment
+        assess_dash = VizTemplatesData.read_template(template_assess_file)
+        feed_dashboard(assess_dash, es_url, kibana_url)
+        assess_menu[assess_dash['dashboard']['value']['title']] = assess_dash['dashboard']['id']
 
-if __name__ == '__main__':
+        build_menu(es_url, qm_menu, assess_menu)
 
-    args = get_params()
+        if assessment:
+            # Wait for the assessment, raising its errors if any
+            assessment.result()
 
-    if args.debug:
-        logging.basicConfig(level=logging.DEBUG, format='%(asctime)s %(message)s')
-        logging.debug("Debug mode activated")
-    else:
-        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
-    logging.getLogger("urllib3").setLevel(logging.WARNING)
-    logging.getLogger("requests").setLevel(logging.WARNING)
+
+def run(args):
+    """ Create the dashboards using the params from the command line """
+
+    setup_django()
+
+    from_date = str_to_datetime(args.from_date)
+    to_date = str_to_datetime(args.to_date)
 
     build_dashboards(args.elastic_url, args.kibana_url, args.index,
                      args.template_file, args.template_assess_file,
-                     args.model, args.backend_metrics_data)
+                     args.model, args.backend_metrics_data, from_date, to_date,
+                     args.assess_max_age)
+
+
+def main(args=None):
+    args = get_params(args)
+    config_logging(args.debug)
+    run(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -22,11 +22,22 @@
 
 # Serializers define the API representation.
 
+import datetime
+import json
+
 from django.contrib.auth.models import User
 from django.contrib.auth.validators import UnicodeUsernameValidator
+from django.db import transaction
+from django.http import StreamingHttpResponse
 
+from prosoul.forms import ES_URL, METRICS_INDEX
 from prosoul.models import Attribute, DataSourceType, Factoid, Goal, Metric, MetricData, QualityModel
-from rest_framework import serializers, viewsets
+from prosoul.prosoul_assess import (iter_assessment, score_distribution, sorted_metric_values, suggest_thresholds,
+                                    THRESHOLDS)
+from prosoul.prosoul_utils import BACKEND_METRICS_DATA
+from rest_framework import permissions, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.response import Response
 
 
 PROSOUL_FIELDS = ('id', 'name', 'active', 'description', 'created_at', 'updated_at', 'created_by')
@@ -72,6 +83,31 @@ class CreateUpdateNestedMixin():
 
         return related_objects_data
 
+    def find_nested_objects(self, field, objects_data):
+        """
+        Find the objects referenced from a list of nested objects data
+
+        When all the nested objects are referenced by name, which is the usual case,
+        all of them are resolved with just one query.
+
+        :param field: field with the nested objects (i.e. metrics)
+        :param objects_data: list with the data needed to find each nested object
+        :return: a list with the nested objects found, in the same order than objects_data
+        """
+        nested_model = self.Meta.nested_fields_model[field]
+
+        if not all(list(object_data.keys()) == ['name'] for object_data in objects_data):
+            return [nested_model.objects.get(**object_data) for object_data in objects_data]
+
+        names = [object_data['name'] for object_data in objects_data]
+        objects = nested_model.objects.in_bulk(names, field_name='name')
+        for name in names:
+            if name not in objects:
+                raise nested_model.DoesNotExist("%s matching query does not exist: %s" %
+                                                (nested_model.__name__, name))
+
+        return [objects[name] for name in names]
+
     def update_nested_objects(self, instance, nested_objects_data):
         """
         Add to the instance object fields the nested objects
@@ -98,13 +134,57 @@ class CreateUpdateNestedMixin():
                     nested_object = self.Meta.nested_fields_model[field].objects.get(**nested_objects_data[field])
                 setattr(instance, field, nested_object)
             else:
-                # Empty the nested objects for this field (i.e. Attribute.metrics.set([])
-                getattr(instance, field).set([])
-                if nested_objects_data[field]:
-                    for object_data in nested_objects_data[field]:
-                        # Create the object model from the data
-                        object = self.Meta.nested_fields_model[field].objects.get(**object_data)
-                        getattr(instance, field).add(object)
+                # Only the differences with the current nested objects are removed and added
+                nested_objects = self.find_nested_objects(field, nested_objects_data[field])
+                related_manager = getattr(instance, field)
+                current_ids = set(related_manager.values_list('id', flat=True))
+                new_ids = set(nested_object.id for nested_object in nested_objects)
+                if current_ids - new_ids:
+                    related_manager.remove(*(current_ids - new_ids))
+                if new_ids - current_ids:
+                    related_manager.add(*(new_ids - current_ids))
+
+
+class BulkCreateUpdateMixin():
+    """
+    Mixin for ViewSets to create or update several objects in just one request.
+
+    The objects are sent as a list and they are found by name: if an object with
+    the same name already exists it is updated, if not it is created. All
+    the objects are processed in the same transaction.
+    """
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        if not isinstance(request.data, list):
+            return Response({"detail": "A list of objects is expected"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # An error per object, empty for the valid ones (as in the DRF list serializers)
+        errors = [{} if isinstance(object_data, dict) else
+                  {"non_field_errors": ["Invalid data. Expected a dictionary, but got %s." % type(object_data).__name__]}
+                  for object_data in request.data]
+        if any(errors):
+            return Response(errors, status=status.HTTP_400_BAD_REQUEST)
+
+        def object_name(object_data):
+            # The name is validated by the serializer, just the valid ones are used to find the objects
+            name = object_data.get('name')
+            return name if isinstance(name, str) else None
+
+        model = self.get_queryset().model
+        names = [object_name(object_data) for object_data in request.data if object_name(object_data)]
+        # All the existing objects are found with just one query
+        instances = model.objects.in_bulk(names, field_name='name')
+
+        objects = []
+        with transaction.atomic():
+            for object_data in request.data:
+                serializer = self.get_serializer(instances.get(object_name(object_data)), data=object_data)
+                serializer.is_valid(raise_exception=True)
+                serializer.save()
+                objects.append(serializer.data)
+
+        return Response(objects, status=status.HTTP_200_OK)
 
 
 class UserSerializer(serializers.HyperlinkedModelSerializer):
@@ -362,38 +442,130 @@ class QualityModelSerializer(serializers.HyperlinkedModelSerializer, CreateUpdat
         return instance
 
 
+class AssessmentParamsSerializer(serializers.Serializer):
+    """ Params needed to do an assessment of the projects """
+    model = serializers.CharField()
+    es_url = serializers.CharField(default=ES_URL)
+    index = serializers.CharField(default=METRICS_INDEX)
+    backend = serializers.ChoiceField(choices=BACKEND_METRICS_DATA, default='scava-metrics')
+    from_date = serializers.DateField(default=datetime.date(1970, 1, 1))
+    to_date = serializers.DateField(default=datetime.date(2100, 1, 1))
+    attribute = serializers.CharField(required=False)
+
+    def validate_model(self, value):
+        if not QualityModel.objects.filter(name=value).exists():
+            raise serializers.ValidationError("Can not find the quality model " + value)
+        return value
+
+
+class ThresholdsParamsSerializer(serializers.Serializer):
+    """ Params needed to check the scores of the projects with some thresholds of a metric """
+    es_url = serializers.CharField(default=ES_URL)
+    index = serializers.CharField(default=METRICS_INDEX)
+    backend = serializers.ChoiceField(choices=BACKEND_METRICS_DATA, default='scava-metrics')
+    from_date = serializers.DateField(default=datetime.date(1970, 1, 1))
+    to_date = serializers.DateField(default=datetime.date(2100, 1, 1))
+    # The ones of the metric by default
+    thresholds = serializers.RegexField(r'^\d+(\.\d+)?(,\d+(\.\d+)?)*$', required=False)
+    reverse_thresholds = serializers.BooleanField(required=False, allow_null=True, default=None)
+    # Collect again the metric values from Elasticsearch
+    refresh = serializers.BooleanField(default=False)
+
+
 # ViewSets define the view behavior.
-class AttributeViewSet(viewsets.ModelViewSet):
+class AssessmentViewSet(viewsets.ViewSet):
+    """
+    Do an assessment and stream the scores as newline-delimited JSON while
+    they are computed. Each line is the score of a metric for a project.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def stream_assessment(self, data):
+        params = AssessmentParamsSerializer(data=data)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        scores = iter_assessment(params['es_url'], params['index'], params['model'], params['backend'],
+                                 params['from_date'], params['to_date'], params.get('attribute'))
+
+        return StreamingHttpResponse((json.dumps(score) + "\n" for score in scores),
+                                     content_type="application/x-ndjson")
+
+    def list(self, request):
+        return self.stream_assessment(request.query_params)
+
+    def create(self, request):
+        return self.stream_assessment(request.data)
+
+
+class AttributeViewSet(BulkCreateUpdateMixin, viewsets.ModelViewSet):
     queryset = Attribute.objects.all()
     serializer_class = AttributeSerializer
 
 
-class DataSourceTypeViewSet(viewsets.ModelViewSet):
+class DataSourceTypeViewSet(BulkCreateUpdateMixin, viewsets.ModelViewSet):
     queryset = DataSourceType.objects.all()
     serializer_class = DataSourceTypeSerializer
 
 
-class FactoidViewSet(viewsets.ModelViewSet):
+class FactoidViewSet(BulkCreateUpdateMixin, viewsets.ModelViewSet):
     queryset = Factoid.objects.all()
     serializer_class = FactoidSerializer
 
 
-class GoalViewSet(viewsets.ModelViewSet):
+class GoalViewSet(BulkCreateUpdateMixin, viewsets.ModelViewSet):
     queryset = Goal.objects.all()
     serializer_class = GoalSerializer
 
 
-class MetricViewSet(viewsets.ModelViewSet):
+class MetricViewSet(BulkCreateUpdateMixin, viewsets.ModelViewSet):
     queryset = Metric.objects.all()
     serializer_class = MetricSerializer
 
+    @action(detail=True)
+    def thresholds(self, request, pk=None):
+        """
+        Distribution of the scores of the projects with some thresholds for the metric, and
+        thresholds suggested from the quantiles of its values. The values of the metric are
+        collected from Elasticsearch once, and the next checks are done in memory while the
+        data in the index does not change.
+        """
+        metric = self.get_object()
+        if not metric.data:
+            return Response({"detail": "The metric %s has no data" % metric.name}, status=status.HTTP_400_BAD_REQUEST)
+
+        params = ThresholdsParamsSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        params = params.validated_data
+
+        values = sorted_metric_values(params['es_url'], params['index'], params['backend'],
+                                      metric.data.implementation, metric.data.params, metric.calculation_type,
+                                      params['from_date'], params['to_date'], params['refresh'])
+
+        thresholds = params.get('thresholds', metric.thresholds)
+        thresholds = [float(threshold) for threshold in thresholds.split(",")] if thresholds else []
+        reverse_thresholds = params['reverse_thresholds']
+        if reverse_thresholds is None:
+            reverse_thresholds = metric.reverse_thresholds
+
+        return Response({
+            "metric": metric.name,
+            "projects": len(values),
+            "min": values[0] if values else None,
+            "max": values[-1] if values else None,
+            "thresholds": thresholds,
+            "reverse_thresholds": reverse_thresholds,
+            "scores": score_distribution(values, thresholds, reverse_thresholds),
+            "suggested_thresholds": suggest_thresholds(values, len(thresholds) or len(THRESHOLDS))
+        })
+
 
 class MetricDataViewSet(viewsets.ModelViewSet):
     queryset = MetricData.objects.all()
     serializer_class = MetricDataSerializer
 
 
-class QualityModelViewSet(viewsets.ModelViewSet):
+class QualityModelViewSet(BulkCreateUpdateMixin, viewsets.ModelViewSet):
     queryset = QualityModel.objects.all()
     serializer_class = QualityModelSerializer
 
@@ -0,0 +1,71 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2015-2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+#
+#
+
+"""
+Generation of the quality models stored in Prosoul. It changes each time an object
+of a model (goal, attribute, metric ...) or a relation between them is changed,
+so the data built from the models can be cached using the generation in its key.
+
+The generation is read from the database: the number of objects of each kind and
+the last time one of them was updated. So all the server processes, and the changes
+done from the command line tools, share it whatever the cache backend is.
+"""
+
+import hashlib
+import json
+
+from django.db.models.signals import m2m_changed
+
+
+def models_generation():
+    """ Get the current generation of the quality models """
+
+    from django.apps import apps
+    from django.db.models import Count, Max
+
+    from prosoul.models import ProsoulModel
+
+    objects = []
+    for model in sorted(apps.get_app_config('prosoul').get_models(), key=lambda model: model.__name__):
+        if not issubclass(model, ProsoulModel):
+            continue
+        stats = model.objects.aggregate(count=Count('id'), updated_at=Max('updated_at'))
+        updated_at = stats['updated_at'].isoformat() if stats['updated_at'] else None
+        objects.append([model.__name__, stats['count'], updated_at])
+
+    return hashlib.md5(json.dumps(objects).encode('utf-8')).hexdigest()
+
+
+def relations_changed(sender, instance, action, **kwargs):
+    """ Update the object whose relations have changed, so a new generation of the quality models starts """
+
+    from django.utils import timezone
+
+    if sender._meta.app_label != 'prosoul' or not action.startswith('post_'):
+        # Relations changes are notified before and after doing them
+        return
+
+    # Updated without save() to not notify it again
+    type(instance).objects.filter(pk=instance.pk).update(updated_at=timezone.now())
+
+
+def connect_signals():
+    """ Track the changes in the relations between the Prosoul objects, the objects track their own changes """
+
+    m2m_changed.connect(relations_changed, dispatch_uid='prosoul_relations_changed')
@@ -21,9 +21,21 @@
 #
 #
 
-# import json
+import datetime
+import io
+import json
+import os
+import tempfile
+import threading
 
-# from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, contextmanager
+from types import SimpleNamespace
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase
 from django.urls import reverse
 from django.contrib.auth.management.commands.createsuperuser import get_user_model
 
@@ -33,7 +45,19 @@ from rest_framework.test import APITestCase
 
 # from .prosoul_import import compare_models, convert_to_grimoirelab, feed_models
 
-from .models import Goal
+from . import assess_cache, cli, perfdata, prosoul_export, prosoul_import, views
+from .data import VizTemplatesData
+from .metrics_import import load_metrics, sync_metrics_data
+from .models import Attribute, DataSourceType, Goal, Metric, MetricData, QualityModel
+from .pipeline import read_steps, run_pipeline
+from .prosoul_assess import (assess_models, build_report, clear_metric_values_cache, compute_metric_per_project,
+                             dump_projects, enrich_projects, enrich_rollups, find_data_extent, find_data_generation,
+                             find_last_assessment, get_quality_model, install_scores_templates, iter_assessment,
+                             model_generation, models_cache, plan_windows, rank_metrics_cost, rollup_scores,
+                             score_distribution, score_metric_value, search, walk_model)
+from .prosoul_utils import http_session
+from .prosoul_vis import UPLOAD_WORKERS, assess_in_thread, build_attributes_dashboards
+from .signals import models_generation
 
 USER = "admin"
 PASSWD = "admin"
@@ -214,6 +238,921 @@ class ProsoulREST(APITestCase):
         response = self.client.post(url, format='json', data=new_qualitymodel)
         self.assertEqual(response.status_code, 201)
 
+    def test_nested_objects_update(self):
+        self.client.login(username=USER, password=PASSWD)
+        url = reverse('prosoul:metric-list')
+        for name in ["m1", "m2", "m3"]:
+            self.client.post(url, format='json', data={"name": name})
+        url = reverse('prosoul:attribute-list')
+        response = self.client.post(url, format='json',
+                                    data={"name": "attribute", "metrics": [{"name": "m1"}, {"name": "m2"}]})
+        self.assertEqual(response.status_code, 201)
+        attribute_url = url + str(response.data['id']) + "/"
+        response = self.client.put(attribute_url, format='json',
+                                   data={"name": "attribute", "metrics": [{"name": "m2"}, {"name": "m3"}]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted([metric['name'] for metric in response.data['metrics']]), ["m2", "m3"])
+
+    def test_api_bulk(self):
+        url = reverse('prosoul:metric-bulk')
+        new_metrics = [{"name": "m1"}, {"name": "m2", "thresholds": "1,2,3,4,5"}]
+
+        # Test bulk creation without auth
+        response = self.client.post(url, format='json', data=new_metrics)
+        self.assertEqual(response.status_code, 403)
+
+        self.client.login(username=USER, password=PASSWD)
+        response = self.client.post(url, format='json', data=new_metrics)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([metric['name'] for metric in response.data], ["m1", "m2"])
+
+        # Existing metrics are updated and new ones created
+        update_metrics = [{"name": "m2", "thresholds": "2,4,6,8,10"}, {"name": "m3"}]
+        response = self.client.post(url, format='json', data=update_metrics)
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(reverse('prosoul:metric-list'), format='json')
+        self.assertEqual(len(response.data), 3)
+        thresholds = {metric['name']: metric['thresholds'] for metric in response.data}
+        self.assertEqual(thresholds["m2"], "2,4,6,8,10")
+
+        # Relations are also supported in bulk
+        url = reverse('prosoul:attribute-bulk')
+        new_attributes = [{"name": "a1", "metrics": [{"name": "m1"}, {"name": "m3"}]},
+                          {"name": "a2", "metrics": [{"name": "m2"}]}]
+        response = self.client.post(url, format='json', data=new_attributes)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data[0]['metrics']), 2)
+
+        # A list of objects is needed
+        response = self.client.post(url, format='json', data={"name": "a1"})
+        self.assertEqual(response.status_code, 400)
+
+        # Each object must be a dict, the errors are reported per object
+        response = self.client.post(url, format='json', data=[{"name": "a1"}, "a2"])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("non_field_errors", response.data[1])
+        response = self.client.post(url, format='json', data=[{"name": ["a1"]}])
+        self.assertEqual(response.status_code, 400)
+
+    def test_api_assessments(self):
+        metric_data = MetricData.objects.create(implementation="commits")
+        metric = Metric.objects.create(name="Commits", data=metric_data, thresholds="1,2,3,4,5")
+        attribute = Attribute.objects.create(name="Activity")
+        attribute.metrics.add(metric)
+        goal = Goal.objects.create(name="Product")
+        goal.attributes.add(attribute)
+        QualityModel.objects.create(name="qm").goals.add(goal)
+
+        url = reverse('prosoul:assessment-list')
+        response = self.client.get(url, {"model": "qm"})
+        self.assertEqual(response.status_code, 403)
+
+        self.client.login(username=USER, password=PASSWD)
+        response = self.client.get(url, {"model": "not-found"})
+        self.assertEqual(response.status_code, 400)
+
+        project_values = [{"project": "p1", "metric": 10}, {"project": "p2", "metric": 2.5}]
+        with mock.patch('prosoul.prosoul_assess.compute_metric_per_project', return_value=project_values):
+            response = self.client.get(url, {"model": "qm", "from_date": "2019-01-01"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], "application/x-ndjson")
+            scores = [json.loads(line.decode('utf-8')) for line in b"".join(response.streaming_content).splitlines()]
+
+        self.assertEqual(len(scores), 2)
+        self.assertEqual(scores[0]['project'], "p1")
+        self.assertEqual(scores[0]['score'], 5)
+        self.assertEqual(scores[1]['score'], 2)
+        self.assertEqual(scores[1]['raw_value'], 2.5)
+        self.assertEqual(scores[1]['start_date'], "2019-01-01")
+
+    def test_api_metric_thresholds(self):
+        metric_data = MetricData.objects.create(implementation="commits")
+        metric = Metric.objects.create(name="Commits", data=metric_data, thresholds="1,2,3,4,5")
+        other_metric = Metric.objects.create(name="Issues", data=MetricData.objects.create(implementation="issues"))
+        url = reverse('prosoul:metric-thresholds', args=[metric.id])
+        clear_metric_values_cache()
+
+        self.client.login(username=USER, password=PASSWD)
+        project_values = [{"project": "p" + str(value), "metric": value} for value in range(12, 0, -1)]
+        with mock.patch('prosoul.prosoul_assess.compute_metric_per_project', return_value=project_values) as compute, \
+                mock.patch('prosoul.prosoul_assess.find_data_generation', return_value=[["uuid"], 12, 12, 0]) as generation:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['projects'], 12)
+            self.assertEqual(response.data['scores'], [1, 1, 1, 1, 1, 7])
+            self.assertEqual(response.data['suggested_thresholds'], [3, 5, 7, 9, 11])
+
+            # The values of the metric are collected just once
+            response = self.client.get(url, {"thresholds": "3,5,7,9,11", "reverse_thresholds": "true"})
+            self.assertEqual(response.data['scores'], [2, 2, 2, 2, 2, 2])
+            self.assertTrue(response.data['reverse_thresholds'])
+            self.assertEqual(compute.call_count, 1)
+
+            # The thresholds are decimal numbers, as in the assessment
+            response = self.client.get(url, {"thresholds": "2.5,5.5"})
+            self.assertEqual(response.data['thresholds'], [2.5, 5.5])
+            self.assertEqual(response.data['scores'], [2, 3, 7])
+
+            response = self.client.get(url, {"thresholds": "1,a"})
+            self.assertEqual(response.status_code, 400)
+
+            # Refreshing the values of a metric doesn't discard the ones of the other metrics
+            other_url = reverse('prosoul:metric-thresholds', args=[other_metric.id])
+            self.client.get(other_url)
+            self.client.get(url, {"refresh": "true"})
+            self.assertEqual(compute.call_count, 3)
+            self.client.get(other_url)
+            self.assertEqual(compute.call_count, 3)
+
+            # The values are collected again when the data in the index changes
+            generation.return_value = [["uuid"], 12, 13, 0]
+            self.client.get(url)
+            self.assertEqual(compute.call_count, 4)
+
+        # The distribution is the same one as scoring each value
+        values = [1, 2, 2, 5, 7.5, 10]
+        for reverse_thresholds in (False, True):
+            scores = [score_metric_value(value, [2, 5, 9], reverse_thresholds) for value in values]
+            self.assertEqual(score_distribution(values, [9, 2, 5], reverse_thresholds),
+                             [scores.count(score) for score in range(4)])
+
+
+class ProsoulTemplates(SimpleTestCase):
+
+    def test_list_templates(self):
+        templates = dict(VizTemplatesData().fetch())
+        self.assertEqual(templates['panels/templates/attribute-template.json'], 'AttributeTemplate')
+        self.assertEqual(VizTemplatesData.find_template('AttributeTemplate'),
+                         'panels/templates/attribute-template.json')
+        self.assertIsNone(VizTemplatesData.find_template('NotFound'))
+
+    def test_read_template(self):
+        tpath = 'panels/templates/attribute-template.json'
+        template = VizTemplatesData.read_template(tpath)
+        self.assertEqual(template['dashboard']['value']['title'], 'AttributeTemplate')
+
+        # Each read returns a copy of the template parsed only once
+        template['dashboard']['value']['title'] = 'Changed'
+        self.assertEqual(VizTemplatesData.read_template(tpath)['dashboard']['value']['title'], 'AttributeTemplate')
+        self.assertIs(VizTemplatesData.load_template(tpath), VizTemplatesData.load_template(tpath))
+
+
+class FakeElasticsearchMixin:
+    """
+    Fake Elasticsearch for the assessments: the queries of the metrics and projects are answered
+    with canned buckets, the scores indexes are created in a mock client and published nowhere
+    """
+
+    @staticmethod
+    def es_response(body, content=None):
+        """ Response of Elasticsearch with a JSON body """
+
+        response = mock.Mock(status_code=200, content=content or json.dumps(body).encode('utf-8'))
+        response.json.return_value = body
+        return response
+
+    @staticmethod
+    def buckets_body(values):
+        """ Body of the response to a query per project: project -> value (None for the projects query) """
+
+        buckets = []
+        for project, value in values.items():
+            bucket = {"key": project, "doc_count": 1}
+            if value is not None:
+                bucket["2"] = {"value": value}
+            buckets.append(bucket)
+        return {"aggregations": {"3": {"buckets": buckets}}}
+
+    @contextmanager
+    def fake_es(self, metrics=None, projects=None, indices=None, **patches):
+        """
+        Fake Elasticsearch for the assessments done in the context
+
+        :param metrics: values of the metrics answered to their queries, implementation -> project -> value
+        :param projects: projects answered to the projects queries, by default the ones with metrics values
+        :param indices: scores indexes already in Elasticsearch, as returned by `indices.get`
+        :param patches: other functions of prosoul_assess replaced, name -> replacement
+        :return: a namespace with the mocks of the queries (get), the client (es_conn) and the publishing functions
+        """
+        metrics = metrics or {}
+        if projects is None:
+            projects = sorted({project for values in metrics.values() for project in values})
+
+        def search(url, data=None, **kwargs):
+            if '"2"' not in data:
+                return self.es_response(self.buckets_body({project: None for project in projects}))
+            for implementation, values in metrics.items():
+                if '"%s"' % implementation in data:
+                    return self.es_response(self.buckets_body(values))
+            raise AssertionError("Unexpected query: " + data)
+
+        patches.setdefault('find_data_extent', mock.Mock(return_value=None))
+        with ExitStack() as stack:
+            fake = SimpleNamespace(get=stack.enter_context(mock.patch('requests.Session.get', side_effect=search)))
+            fake.es_conn = stack.enter_context(mock.patch('prosoul.prosoul_assess.es_connection')).return_value
+            fake.es_conn.indices.get.return_value = indices or {}
+            for name in ('publish_assessment', 'publish_rollups', 'publish_projects'):
+                setattr(fake, name, stack.enter_context(mock.patch('prosoul.prosoul_assess.' + name)))
+            for name, replacement in patches.items():
+                stack.enter_context(mock.patch('prosoul.prosoul_assess.' + name, replacement))
+            yield fake
+
+
+class ProsoulAssessment(FakeElasticsearchMixin, SimpleTestCase):
+
+    def test_find_last_assessment(self):
+        from_date = datetime.datetime(2019, 1, 1)
+        to_date = datetime.datetime(2020, 1, 1)
+        score = {"model": "qm", "type": "all", "creation_date": "2020-02-01T10:00:00+00:00",
+                 "start_date": from_date.isoformat(), "end_date": to_date.isoformat(),
+                 "backend_metrics_data": "scava-metrics", "model_generation": "g1"}
+        response = self.es_response({"hits": {"hits": [{"_source": score}]}})
+
+        def find_last(to_date=to_date):
+            return find_last_assessment("http://es", "metrics", "qm", from_date, to_date, "scava-metrics", "g1")
+
+        with mock.patch('requests.Session.get', return_value=response) as get:
+            last = find_last()
+            self.assertEqual(get.call_args[0][0], "http://es/metrics_scores/_search")
+            # Only the assessments of the same version of the model and backend are found
+            self.assertIn('{"term": {"backend_metrics_data": "scava-metrics"}}', get.call_args[1]['data'])
+            self.assertIn('{"term": {"model_generation": "g1"}}', get.call_args[1]['data'])
+            self.assertEqual(last.isoformat(), score['creation_date'])
+
+            # An assessment for a different time frame can not be reused
+            self.assertIsNone(find_last(datetime.datetime(2021, 1, 1)))
+
+        response.status_code = 404
+        with mock.patch('requests.Session.get', return_value=response):
+            self.assertIsNone(find_last())
+
+    def test_metrics_cost(self):
+        from_date = datetime.datetime(2019, 1, 1)
+        to_date = datetime.datetime(2020, 1, 1)
+        response = self.es_response(dict(self.buckets_body({"p1": 3, "p2": 4}), took=20), content=b"x" * 100)
+        metric_data = MetricData(implementation="commits")
+        metric_data.calculation_type = "max"
+
+        with perfdata.run('assess') as assess_run:
+            with mock.patch('requests.Session.get', return_value=response), \
+                    mock.patch('prosoul.prosoul_assess.SLOW_QUERY_SECS', 0), \
+                    self.assertLogs(level='WARNING') as logs:
+                values = compute_metric_per_project("http://es", "scava-metrics", metric_data, "scava-metrics",
+                                                    from_date, to_date)
+                compute_metric_per_project("http://es", "scava-metrics", metric_data, "scava-metrics",
+                                           from_date, to_date)
+
+        self.assertEqual(values, [{"project": "p1", "metric": 3}, {"project": "p2", "metric": 4}])
+        self.assertIn("Slow query for commits (2019-01-01/2020-01-01)", logs.output[0])
+
+        costs = rank_metrics_cost(assess_run.summary())
+        self.assertEqual(len(costs), 1)
+        self.assertEqual(costs[0]['metric'], "commits")
+        self.assertEqual(costs[0]['queries'], 2)
+        self.assertEqual(costs[0]['buckets'], 4)
+        self.assertEqual(costs[0]['response_bytes'], 200)
+        self.assertAlmostEqual(costs[0]['took'], 0.04)
+
+        # The size of the requests is in bytes, also for the queries with non ASCII chars
+        query = json.dumps({"query": {"term": {"project": "café"}}}, ensure_ascii=False)
+        with perfdata.run('search') as search_run, mock.patch('requests.Session.get', return_value=response):
+            search("http://es", "scava-metrics", query, "commits", "all")
+        counters = {counter['name']: counter['value'] for counter in search_run.summary()['counters']}
+        self.assertEqual(counters['es_request_bytes'], len(query) + 1)
+
+    def test_plan_windows(self):
+        def epoch_ms(day):
+            return datetime.datetime(*day, tzinfo=datetime.timezone.utc).timestamp() * 1000
+
+        response = self.es_response({"hits": {"total": 20}, "aggregations": {
+            "min_date": {"value": epoch_ms((2019, 2, 10))},
+            "max_date": {"value": epoch_ms((2019, 12, 1))},
+            "projects": {"buckets": [
+                {"key": "p1", "min_date": {"value": epoch_ms((2019, 2, 10))}, "max_date": {"value": epoch_ms((2019, 3, 1))}},
+                {"key": "p2", "min_date": {"value": epoch_ms((2019, 11, 1))}, "max_date": {"value": epoch_ms((2019, 12, 1))}}
+            ]}
+        }})
+
+        with mock.patch('requests.Session.get', return_value=response) as get:
+            extent = find_data_extent("http://es", "scava-metrics", "scava-metrics")
+            self.assertIn('"field": "datetime"', get.call_args[1]['data'])
+
+        self.assertEqual(extent['min'].date(), datetime.date(2019, 2, 10))
+        self.assertEqual(extent['docs'], 20)
+        self.assertEqual(sorted(extent['projects']), ["p1", "p2"])
+
+        # Only the quarters with samples of some project are assessed, the one in the gap between them is not
+        windows = plan_windows(datetime.datetime(1970, 1, 1), datetime.datetime(2100, 1, 1), extent)
+        self.assertEqual([(start.date().isoformat(), end.date().isoformat()) for start, end in windows],
+                         [("2019-01-01", "2019-04-01"), ("2019-10-01", "2020-01-01")])
+
+        # Without samples no window is assessed
+        self.assertEqual(plan_windows(datetime.datetime(2019, 1, 1), datetime.datetime(2020, 1, 1), None), [])
+
+    def test_rescore_cache(self):
+        from_date = datetime.datetime(2019, 1, 1)
+        to_date = datetime.datetime(2020, 1, 1)
+        response = self.es_response(self.buckets_body({"p1": 3}))
+        metric_data = MetricData(implementation="commits", params='{"filter": {"term": {"a": 1}}}')
+        metric_data.calculation_type = "max"
+
+        def metric_values():
+            return compute_metric_per_project("http://es", "scava-metrics", metric_data, "scava-metrics",
+                                              from_date, to_date)
+
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch('prosoul.assess_cache.CACHE_DIR_PATH', cache_dir):
+            with assess_cache.raw_values_cache("http://es/scava-metrics", [10, "2019"]), \
+                    mock.patch('requests.Session.get', return_value=response):
+                values = metric_values()
+
+            # The values are read from the cache, without querying Elasticsearch
+            with assess_cache.raw_values_cache("http://es/scava-metrics", [10, "2019"], rescore=True), \
+                    mock.patch('requests.Session.get', side_effect=AssertionError) as get:
+                self.assertEqual(metric_values(), values)
+                metric_data.calculation_type = "min"
+                with self.assertRaises(RuntimeError):
+                    metric_values()
+                self.assertFalse(get.called)
+
+            # The data in the index changed, the cached values are not used
+            with assess_cache.raw_values_cache("http://es/scava-metrics", [11, "2019"], rescore=True):
+                metric_data.calculation_type = "max"
+                with self.assertRaises(RuntimeError):
+                    metric_values()
+
+            # A full assessment for the new data removes the values of the old ones, unless they are in use
+            index_dir = os.path.join(cache_dir, 'raw_values', os.listdir(os.path.join(cache_dir, 'raw_values'))[0])
+
+            def age_generations():
+                # The runs are done faster than the resolution of the modification time of the dirs
+                for generation_dir in os.listdir(index_dir):
+                    os.utime(os.path.join(index_dir, generation_dir), (0, 0))
+
+            with assess_cache.raw_values_cache("http://es/scava-metrics", [10, "2019"], rescore=True):
+                age_generations()
+                with assess_cache.raw_values_cache("http://es/scava-metrics", [11, "2019"]):
+                    pass
+                # The failed assessments don't remove any values
+                with self.assertRaises(RuntimeError), assess_cache.raw_values_cache("http://es/scava-metrics", [12, "2019"]):
+                    raise RuntimeError("Assessment failed")
+                self.assertEqual(len(os.listdir(index_dir)), 3)
+                metric_data.calculation_type = "max"
+                self.assertEqual(metric_values(), values)
+            age_generations()
+            with assess_cache.raw_values_cache("http://es/scava-metrics", [11, "2019"]):
+                pass
+            self.assertEqual(len(os.listdir(index_dir)), 1)
+
+            # The assessments in other threads don't use the cache of the context
+            thread_values = []
+            with assess_cache.raw_values_cache("http://es/scava-metrics", [11, "2019"], rescore=True), \
+                    mock.patch('requests.Session.get', return_value=response):
+                thread = threading.Thread(target=lambda: thread_values.append(metric_values()))
+                thread.start()
+                thread.join()
+            self.assertEqual(thread_values, [values])
+
+    def test_data_generation(self):
+        def stats(docs, index_total):
+            return self.es_response({
+                "_all": {"primaries": {"docs": {"count": docs}, "indexing": {"index_total": index_total, "delete_total": 0}}},
+                "indices": {"scava-metrics": {"uuid": "a1b2"}}
+            })
+
+        with mock.patch('requests.Session.get', return_value=stats(10, 10)):
+            generation = find_data_generation("http://es", "scava-metrics")
+        self.assertEqual(generation, [["a1b2"], 10, 10, 0])
+
+        # Overwriting samples changes the generation, even if the number of docs is the same
+        with mock.patch('requests.Session.get', return_value=stats(10, 15)):
+            self.assertNotEqual(find_data_generation("http://es", "scava-metrics"), generation)
+
+
+class ProsoulSharedQueries(FakeElasticsearchMixin, TestCase):
+
+    def test_shared_metric_data(self):
+        commits = MetricData.objects.create(implementation="commits")
+        commits_filtered = MetricData.objects.create(implementation="commits", params='{"filter": {"term": {"a": 1}}}')
+        model = QualityModel.objects.create(name="qm")
+        for nattr in range(2):
+            attribute = Attribute.objects.create(name="attribute %i" % nattr)
+            attribute.metrics.add(Metric.objects.create(name="commits %i" % nattr, data=commits, thresholds="1,2"))
+            attribute.metrics.add(Metric.objects.create(name="filtered %i" % nattr, data=commits_filtered))
+            goal = Goal.objects.create(name="goal %i" % nattr)
+            goal.attributes.add(attribute)
+            model.goals.add(goal)
+
+        from_date = datetime.datetime(2019, 1, 1)
+        to_date = datetime.datetime(2020, 1, 1)
+
+        with self.fake_es({"commits": {"p1": 3}}) as fake:
+            scores = list(iter_assessment("http://es", "scava-metrics", "qm", "scava-metrics", from_date, to_date))
+
+        # A query per distinct metric data, and both metrics with the same implementation are scored
+        self.assertEqual(fake.get.call_count, 2)
+        self.assertEqual(sorted(score['metric'] for score in scores),
+                         ["commits", "commits", 'commits {"filter": {"term": {"a": 1}}}',
+                          'commits {"filter": {"term": {"a": 1}}}'])
+
+    def test_assess_models(self):
+        commits = MetricData.objects.create(implementation="commits")
+        for model_name in ("qm", "Other QM"):
+            attribute = Attribute.objects.create(name=model_name + " attribute")
+            attribute.metrics.add(Metric.objects.create(name=model_name + " commits", data=commits, thresholds="1,2"))
+            goal = Goal.objects.create(name=model_name + " goal")
+            goal.attributes.add(attribute)
+            QualityModel.objects.create(name=model_name).goals.add(goal)
+
+        with self.fake_es({"commits": {"p1": 3}}) as fake:
+            assessments = assess_models("http://es", "scava-metrics", ["qm", "Other QM"], "scava-metrics",
+                                        datetime.datetime(2019, 1, 1), datetime.datetime(2020, 1, 1))
+
+        # The projects and the metric are queried once for both models
+        self.assertEqual(fake.get.call_count, 2)
+        self.assertEqual(assessments["Other QM"]["Other QM goal"]["Other QM attribute"]["commits"]["p1"]["score"], 2)
+        # The scores are published in a new generation of the indexes
+        self.assertEqual(sorted(call[0][1].rsplit("-", 1)[0] for call in fake.publish_assessment.call_args_list),
+                         ["scava-metrics_other-qm_null_scores", "scava-metrics_other-qm_scores",
+                          "scava-metrics_qm_null_scores", "scava-metrics_qm_scores"])
+
+    def test_hierarchical_model(self):
+        def create_metric(name, implementation):
+            metric_data = MetricData.objects.create(implementation=implementation)
+            return Metric.objects.create(name=name, data=metric_data, thresholds="1,2,3,4")
+
+        # goal -> attribute -> subattribute, and the subattribute is shared with a subgoal
+        attribute = Attribute.objects.create(name="attribute")
+        attribute.metrics.add(create_metric("commits", "commits"))
+        subattribute = Attribute.objects.create(name="subattribute")
+        subattribute.metrics.add(create_metric("bugs", "bugs"))
+        attribute.subattributes.add(subattribute)
+        goal = Goal.objects.create(name="goal")
+        goal.attributes.add(attribute)
+        subgoal = Goal.objects.create(name="subgoal")
+        subgoal.attributes.add(subattribute)
+        goal.subgoals.add(subgoal)
+        QualityModel.objects.create(name="qm").goals.add(goal)
+
+        model_orm = get_quality_model("qm")
+        with self.assertNumQueries(0):
+            walk = [(goal.name, [attribute.name for attribute in attributes]) for goal, attributes in walk_model(model_orm)]
+        self.assertEqual(walk, [("goal", ["attribute", "subattribute"]), ("subgoal", ["subattribute"])])
+
+        # The generation of the model changes when any object in it is edited
+        generation = model_generation(model_orm)
+        self.assertEqual(model_generation(get_quality_model("qm")), generation)
+        Metric.objects.filter(name="bugs").first().save()
+        self.assertNotEqual(model_generation(get_quality_model("qm")), generation)
+
+        with self.fake_es({"commits": {"p1": 4, "p2": 4}, "bugs": {"p1": 2}}) as fake:
+            assessment = assess_models("http://es", "scava-metrics", ["qm"], "scava-metrics",
+                                       datetime.datetime(2019, 1, 1), datetime.datetime(2020, 1, 1))["qm"]
+
+        # The subattribute is assessed once, with a query for each metric and one for the projects
+        self.assertEqual(fake.get.call_count, 3)
+        self.assertIs(assessment["goal"]["subattribute"], assessment["subgoal"]["subattribute"])
+        self.assertEqual(assessment["subgoal"]["subattribute"]["bugs"]["p1"]["score"], 1)
+
+        # p2 has no value for bugs, so just commits is used for it
+        rollups = rollup_scores(model_orm, assessment)
+        self.assertEqual(rollups["attributes"]["attribute"], {"p1": 2, "p2": 3})
+        self.assertEqual(rollups["goals"]["goal"], {"p1": 1.5, "p2": 3})
+        self.assertEqual(rollups["model"], {"p1": 1.5, "p2": 3})
+
+    def test_rollups(self):
+        attribute = Attribute.objects.create(name="attribute")
+        for name in ("commits", "bugs"):
+            metric_data = MetricData.objects.create(implementation=name)
+            attribute.metrics.add(Metric.objects.create(name=name, data=metric_data, thresholds="1,2,3,4"))
+        goal = Goal.objects.create(name="goal")
+        goal.attributes.add(attribute)
+        QualityModel.objects.create(name="qm").goals.add(goal)
+
+        # p3 is in the projects, but it has not metrics data
+        with self.fake_es({"commits": {"p1": 4, "p2": 2}, "bugs": {"p1": 2}}, projects=["p1", "p2", "p3"]) as fake:
+            assessment = assess_models("http://es", "scava-metrics", ["qm"], "scava-metrics",
+                                       datetime.datetime(2019, 1, 1), datetime.datetime(2020, 1, 1))["qm"]
+
+        index, rollups = fake.publish_rollups.call_args_list[-1][0][1:3]
+        self.assertTrue(index.startswith("scava-metrics_qm_rollups-"))
+        self.assertEqual(rollups["attributes"]["attribute"], {"p1": 2, "p2": 1, "p3": None})
+        self.assertEqual(rollups["model"], {"p1": 2, "p2": 1, "p3": None})
+
+        items = [item for item in enrich_rollups(rollups) if item["project"] == "p3"]
+        self.assertEqual(sorted(item["level"] for item in items), ["attribute", "goal", "model"])
+        self.assertTrue(all(item["score"] is None and not item["has_score"] for item in items))
+
+        # p2 has no score for bugs
+        self.assertEqual(build_report(assessment, "big_number"), {"p1": 2, "p2": 1})
+
+    def test_projects_layout(self):
+        attribute = Attribute.objects.create(name="attribute")
+        attribute.metrics.add(Metric.objects.create(name="commits", thresholds="1,2",
+                                                    data=MetricData.objects.create(implementation="commits")))
+        goal = Goal.objects.create(name="goal")
+        goal.attributes.add(attribute)
+        QualityModel.objects.create(name="qm").goals.add(goal)
+
+        with self.fake_es({"commits": {"p1": 3}}, projects=["p1", "p2"]) as fake:
+            assess_models("http://es", "scava-metrics", ["qm"], "scava-metrics",
+                          datetime.datetime(2019, 1, 1), datetime.datetime(2020, 1, 1), layout="projects")
+
+        # The scores are published just in a document per project
+        fake.publish_assessment.assert_not_called()
+        index, assessment, diff_assessment, rollups = fake.publish_projects.call_args_list[-1][0][1:5]
+        self.assertTrue(index.startswith("scava-metrics_qm_project_scores-"))
+
+        items = {item["project"]: item for item in enrich_projects(assessment, diff_assessment, rollups)}
+        self.assertEqual(sorted(items), ["p1", "p2"])
+        self.assertEqual(items["p1"]["score_commits"], 2)
+        self.assertEqual(items["p1"]["goals"], [{"goal": "goal", "score": 2}])
+        self.assertEqual(items["p1"]["metrics"][0]["raw_value"], 3)
+        # p2 has no data for commits
+        self.assertNotIn("score_commits", items["p2"])
+        self.assertIsNone(items["p2"]["score"])
+        self.assertIsNone(items["p2"]["metrics"][0]["score"])
+
+    def test_scores_templates(self):
+        with mock.patch('prosoul.prosoul_assess.es_connection') as es_conn:
+            install_scores_templates("http://es", "scava-metrics")
+
+        templates = {call[1]['name']: call[1]['body'] for call in es_conn.return_value.indices.put_template.call_args_list}
+        self.assertEqual(templates["scava-metrics_scores"]["index_patterns"],
+                         ["scava-metrics_scores-*", "scava-metrics_null_scores-*"])
+        self.assertIn("scava-metrics_project_scores-*", templates["scava-metrics_rollups"]["index_patterns"])
+        self.assertEqual(templates["scava-metrics_scores"]["settings"]["number_of_replicas"], 0)
+
+        # The scores of the metrics are not added to the inverted index
+        mapping = templates["scava-metrics_scores"]["mappings"]["item"]
+        self.assertEqual(mapping["dynamic_templates"][0]["metric_scores"]["mapping"], {"type": "float", "index": False})
+        self.assertEqual(mapping["properties"]["project"], {"type": "keyword"})
+
+    def test_scores_swap(self):
+        QualityModel.objects.create(name="qm")
+        creation_date = "2020-01-02T03:04:05.000006+00:00"
+        generation = "-20200102030405000006"
+        utcnow = mock.Mock()
+        utcnow.return_value.isoformat.return_value = creation_date
+
+        # The generation read, an older one already loaded, an index of the versions without generations,
+        # and the generations of other assessments being loaded
+        loading = {"index": {"refresh_interval": "-1"}}
+        current_indices = {
+            "scava-metrics_qm_scores-20191231000000000000": {"aliases": {"scava-metrics_qm_scores": {}}},
+            "scava-metrics_qm_rollups-20191230000000000000": {"aliases": {}, "settings": {"index": {}}},
+            "scava-metrics_qm_null_scores": {"aliases": {}},
+            "scava-metrics_qm_scores_by_quarters-20191230000000000000": {"aliases": {}, "settings": loading},
+            "scava-metrics_qm_scores-20200102040000000000": {"aliases": {}, "settings": {"index": {}}},
+            "scava-metrics_qm_scores" + generation: {"aliases": {}, "settings": loading}
+        }
+        with self.fake_es(indices=current_indices, datetime_utcnow=utcnow) as fake:
+            assess_models("http://es", "scava-metrics", ["qm"], "scava-metrics",
+                          datetime.datetime(2019, 1, 1), datetime.datetime(2019, 2, 1))
+
+        indices = fake.es_conn.indices
+        created = sorted(call[1]['index'] for call in indices.create.call_args_list)
+        self.assertIn("scava-metrics_qm_scores" + generation, created)
+        self.assertIn("scava-metrics_qm_rollups_by_quarters" + generation, created)
+        self.assertNotIn("scava-metrics_qm_project_scores" + generation, created)
+        indices.delete.assert_not_called()
+
+        # The aliases are moved and the old indexes removed in a single request
+        indices.update_aliases.assert_called_once()
+        actions = indices.update_aliases.call_args[0][0]["actions"]
+        self.assertEqual([action["remove_index"]["index"] for action in actions if "remove_index" in action],
+                         ["scava-metrics_qm_null_scores", "scava-metrics_qm_rollups-20191230000000000000",
+                          "scava-metrics_qm_scores-20191231000000000000"])
+        aliases = [action["add"]["alias"] for action in actions
+                   if "add" in action and action["add"]["index"] == "scava-metrics_qm_scores" + generation]
+        self.assertEqual(aliases, ["scava-metrics_qm_scores", "scava-metrics_qm_all_scores"])
+
+        # A failed publishing removes the new generation
+        with self.fake_es(datetime_utcnow=utcnow) as fake, self.assertRaises(RuntimeError):
+            fake.publish_rollups.side_effect = RuntimeError
+            assess_models("http://es", "scava-metrics", ["qm"], "scava-metrics",
+                          datetime.datetime(2019, 1, 1), datetime.datetime(2019, 2, 1))
+
+        indices = fake.es_conn.indices
+        self.assertIn("scava-metrics_qm_scores" + generation, indices.delete.call_args[1]['index'].split(","))
+        indices.update_aliases.assert_not_called()
+
+
+class ProsoulAssessmentViews(TestCase):
+
+    def test_projects_table(self):
+        self.client.force_login(get_user_model().objects.create_user(username="assessor"))
+
+        def project(score):
+            return {"goal": {"attribute": {"commits": {"score": score, "raw_value": score, "cal_type": "max"}}}}
+
+        projects_data = {"p0": project(1), "p1": project(None), "p2": project(5)}
+
+        with tempfile.TemporaryDirectory() as csv_dir, \
+                mock.patch('prosoul.prosoul_assess.ASSESSMENT_CSV_DIR_PATH', csv_dir + "/"), \
+                mock.patch('prosoul.prosoul_assess.ASSESSMENT_PROJECTS_DIR_PATH', os.path.join(csv_dir, "data")), \
+                mock.patch('prosoul.views.PROJECTS_PER_PAGE', 2):
+            response = self.client.get(reverse('prosoul:assess'), {"page": 1})
+            self.assertContains(response, "Empty assessment")
+
+            dump_projects(projects_data)
+            # The assessment is not in the static files, served without login
+            self.assertEqual(os.listdir(csv_dir), ["data"])
+
+            response = self.client.get(reverse('prosoul:assess'), {"page": 1})
+            self.assertEqual([row['project'] for row in response.context['projects_rows']], ["p0", "p1"])
+            self.assertEqual(response.context['projects_rows'][1]['score'], None)
+            response = self.client.get(reverse('prosoul:assess'), {"page": 2})
+            self.assertEqual(response.context['projects_rows'],
+                             [{"project": "p2", "score": 5, "metrics_with_data": 1, "metrics": 1}])
+            self.assertNotContains(response, '"raw_value":')
+
+            response = self.client.get(reverse('prosoul:assessment_project'), {"project": "p2"})
+            self.assertEqual(response.json(), projects_data['p2'])
+            response = self.client.get(reverse('prosoul:assessment_project'), {"project": "p3"})
+            self.assertEqual(response.status_code, 404)
+
+
+class ProsoulViewer(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(get_user_model().objects.create_user(username="viewer"))
+
+    def test_viewer_cache(self):
+        model = QualityModel.objects.create(name="qm")
+        goal = Goal.objects.create(name="goal")
+        model.goals.add(goal)
+        QualityModel.objects.create(name="other")
+
+        with mock.patch('prosoul.views.fetch_model', wraps=views.fetch_model) as fetch:
+            response = self.client.get(reverse('prosoul:viewer'), {"qmodel_selected": "qm"})
+            self.assertEqual(response.context['qmodels'], ["qm", "other"])
+            # Goals are first level attributes in the viewer
+            self.assertEqual(list(response.context['attributes_data']['children']), ["goal"])
+            self.client.get(reverse('prosoul:viewer'), {"qmodel_selected": "qm"})
+            self.assertEqual(fetch.call_count, 1)
+
+            # The generation of the models is read from the database, not from the cache of the process
+            generation = models_generation()
+            cache.clear()
+            self.assertEqual(models_generation(), generation)
+
+            # Editing a model invalidates the cached data
+            goal.attributes.add(Attribute.objects.create(name="attribute"))
+            self.assertNotEqual(models_generation(), generation)
+            response = self.client.get(reverse('prosoul:viewer'), {"qmodel_selected": "qm"})
+            self.assertEqual(fetch.call_count, 2)
+            self.assertEqual(sorted(response.context['attributes_data']['children']), ["attribute", "goal"])
+
+        response = self.client.get(reverse('prosoul:viewer'), {"qmodel_selected": "unknown"})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProsoulDashboards(TestCase):
+
+    def test_build_attributes_dashboards(self):
+        model = QualityModel.objects.create(name="qm")
+        goal = Goal.objects.create(name="goal")
+        subgoal = Goal.objects.create(name="subgoal")
+        for name, parent in (("attribute", goal), ("other", goal), ("subattribute", subgoal)):
+            attribute = Attribute.objects.create(name=name)
+            attribute.metrics.add(Metric.objects.create(name=name, data=MetricData.objects.create(implementation=name)))
+            parent.attributes.add(attribute)
+        goal.subgoals.add(subgoal)
+        model.goals.add(goal)
+
+        search_source = {"query": {"query_string": {"query": "*"}}}
+        template = {"index_patterns": [{"id": "scava-metrics"}], "searches": [{"id": "search"}],
+                    "dashboard": {"id": "template", "value": {"title": "template", "kibanaSavedObjectMeta": {
+                        "searchSourceJSON": json.dumps(search_source)}}}}
+
+        with mock.patch('prosoul.prosoul_vis.VizTemplatesData.read_template', return_value=template) as read_template, \
+                mock.patch('prosoul.prosoul_vis.create_alias') as create_alias, \
+                mock.patch('prosoul.prosoul_vis.feed_dashboard') as feed_dashboard, \
+                mock.patch('prosoul.prosoul_vis.upload_dashboards') as upload_dashboards:
+            dashboards = build_attributes_dashboards("es_url", "kibana_url", "metrics", "template.json",
+                                                     get_quality_model("qm"), "scava-metrics")
+
+        # The template is read and its alias created just once for all the attributes
+        read_template.assert_called_once_with("template.json")
+        create_alias.assert_called_once_with("es_url", "metrics", "scava-metrics")
+        # Only the objects shared by the dashboards are fed directly
+        feed_dashboard.assert_called_once_with({"index_patterns": [{"id": "scava-metrics"}], "searches": [{"id": "search"}]},
+                                               "es_url", "kibana_url")
+        upload_dashboards.assert_called_once_with(dashboards, "es_url", "kibana_url", UPLOAD_WORKERS)
+
+        self.assertEqual(sorted(dashboard['dashboard']['id'] for dashboard in dashboards),
+                         ["goal_attribute", "goal_other", "subgoal_subattribute"])
+        dashboard = next(dashboard for dashboard in dashboards if dashboard['dashboard']['id'] == "goal_other")
+        search_json = json.loads(dashboard['dashboard']['value']['kibanaSavedObjectMeta']['searchSourceJSON'])
+        self.assertEqual(search_json['query'], search_source['query'])
+        self.assertEqual(search_json['filter'][0]['meta']['params'], ["other"])
+        # The template is not modified by the rendering
+        self.assertEqual(template['dashboard']['value']['title'], "template")
+
+
+class ProsoulPerfData(TestCase):
+
+    def test_run(self):
+        with perfdata.run('assess', model='qm') as assess_run:
+            with perfdata.timer('es_query', metric='commits', window='2019-01-01/2019-04-01'):
+                pass
+            perfdata.count('scores_published', 3, index='scores')
+
+        summary = assess_run.summary()
+        self.assertEqual(summary['name'], 'assess')
+        self.assertIsNotNone(summary['wall_time'])
+        self.assertEqual(summary['timers'][0]['tags'],
+                         {'model': 'qm', 'metric': 'commits', 'window': '2019-01-01/2019-04-01'})
+        self.assertEqual(summary['counters'][0]['value'], 3)
+        self.assertIsNone(perfdata.current_run())
+
+        # The runs of the commands are finished also when they fail
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            models_file = os.path.join(tmp_dir, "models.json")
+            with mock.patch('sys.stdout', new_callable=io.StringIO), self.assertRaises(RuntimeError):
+                prosoul_export.run(prosoul_export.get_params(["-f", models_file, "--format", "unknown"]))
+            self.assertIsNone(perfdata.current_run())
+            self.assertFalse(os.path.exists(models_file))
+            with self.assertRaises(FileNotFoundError):
+                prosoul_import.run(prosoul_import.get_params(["-f", models_file]))
+            self.assertIsNone(perfdata.current_run())
+
+        # The perf data is only shown to the staff users
+        self.assertEqual(self.client.get(reverse('prosoul:perfdata_metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('prosoul:perfdata_runs')).status_code, 403)
+        get_user_model().objects.create_user(USER, password=PASSWD, is_staff=True)
+        self.client.login(username=USER, password=PASSWD)
+
+        response = self.client.get(reverse('prosoul:perfdata_metrics'))
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        # The window is only included in the run summaries
+        self.assertIn('prosoul_es_query_seconds_count{metric="commits",model="qm"}', content)
+        self.assertIn('prosoul_scores_published_total{index="scores",model="qm"}', content)
+        # The max of the timers is a gauge of its own
+        self.assertIn('# TYPE prosoul_es_query_seconds summary', content)
+        self.assertIn('# TYPE prosoul_es_query_seconds_max gauge\nprosoul_es_query_seconds_max{metric="commits",model="qm"}',
+                      content)
+
+        response = self.client.get(reverse('prosoul:perfdata_runs'))
+        self.assertIn(summary, response.json()['runs'])
+
+        self.client.logout()
+        with self.settings(PROSOUL_PERFDATA_PUBLIC=True):
+            self.assertEqual(self.client.get(reverse('prosoul:perfdata_metrics')).status_code, 200)
+
+
+class ProsoulCli(SimpleTestCase):
+
+    def test_get_params(self):
+        module, params = cli.get_params(['export', '-f', 'models.json', '-m', 'qm'])
+        self.assertEqual(module.__name__, 'prosoul.prosoul_export')
+        self.assertEqual((params.file, params.model, params.format), ('models.json', 'qm', 'grimoirelab'))
+
+        with mock.patch('sys.stderr', new_callable=io.StringIO):
+            with self.assertRaises(SystemExit):
+                cli.get_params([])
+            with self.assertRaises(SystemExit):
+                cli.get_params(['unknown'])
+
+
+class ProsoulPipeline(TestCase):
+
+    def test_models_cache(self):
+        model = QualityModel.objects.create(name="qm")
+        goal = Goal.objects.create(name="goal")
+        attribute = Attribute.objects.create(name="attribute")
+        metric = Metric.objects.create(name="metric", data=MetricData.objects.create(implementation="commits"))
+        attribute.metrics.add(metric)
+        goal.attributes.add(attribute)
+        model.goals.add(goal)
+
+        with models_cache():
+            compiled = get_quality_model("qm")
+            with self.assertNumQueries(0):
+                self.assertIs(get_quality_model("qm"), compiled)
+                implementations = [metric.data.implementation for goal in compiled.goals.all()
+                                   for attribute in goal.attributes.all() for metric in attribute.metrics.all()]
+            self.assertEqual(implementations, ["commits"])
+
+            # The assessments in other threads don't use the models of the context
+            thread_caches = []
+
+            def thread_cache():
+                with models_cache() as cache:
+                    thread_caches.append(dict(cache))
+
+            thread = threading.Thread(target=thread_cache)
+            thread.start()
+            thread.join()
+            self.assertEqual(thread_caches, [{}])
+
+        # Out of the context the models are always read
+        self.assertIsNot(get_quality_model("qm"), compiled)
+
+        # The model compiled by the dashboards build is used by its assessment thread
+        thread_models = []
+
+        def assess(*args):
+            thread_models.append(get_quality_model("qm"))
+            return http_session()
+
+        with mock.patch('prosoul.prosoul_vis.assess', side_effect=assess):
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                thread_session = executor.submit(assess_in_thread, "es_url", "es_index", "qm", False,
+                                                 None, None, compiled).result()
+        self.assertEqual(thread_models, [compiled])
+        # HTTP sessions are not shared between threads
+        self.assertIsNot(thread_session, http_session())
+        self.assertIs(http_session(), http_session())
+
+    def test_run_pipeline(self):
+        models_json = {"qualityModels": [{"name": "qm", "goals": [{"name": "goal", "description": "", "attributes": [
+            {"name": "attribute", "description": "", "metrics": [
+                {"name": "metric", "description": "", "data": {"implementation": "commits", "params": "",
+                                                               "data_source_type": "git"}}
+            ]}
+        ]}]}]}
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            models_file = os.path.join(tmp_dir, "models.json")
+            with open(models_file, "w") as fmodels:
+                json.dump(models_json, fmodels)
+            steps_file = os.path.join(tmp_dir, "steps.json")
+            with open(steps_file, "w") as fsteps:
+                json.dump({"steps": [{"command": "import", "args": ["-f", models_file]},
+                                     {"command": "export", "args": ["-f", os.path.join(tmp_dir, "export.json"),
+                                                                    "-m", "qm"]}]}, fsteps)
+
+            with mock.patch('sys.stdout', new_callable=io.StringIO):
+                summaries = run_pipeline(read_steps(steps_file))
+
+            self.assertEqual([summary['tags']['command'] for summary in summaries], ["import", "export"])
+            with open(os.path.join(tmp_dir, "export.json")) as fexport:
+                exported = json.load(fexport)
+            self.assertEqual(exported['qualityModels'][0]['goals'][0]['attributes'][0]['metrics'][0]['name'], "metric")
+
+            with open(steps_file, "w") as fsteps:
+                json.dump({"steps": [{"command": "unknown"}]}, fsteps)
+            with self.assertRaises(RuntimeError):
+                read_steps(steps_file)
+
+
+class ProsoulMetricsImport(TestCase):
+
+    def test_load_metrics(self):
+        def page(buckets, after_key):
+            response = mock.Mock()
+            aggs = {"metrics": {"buckets": [{"key": {"data_source": ds, "metric_name": name}, "doc_count": 1}
+                                            for ds, name in buckets]}}
+            if after_key:
+                aggs["metrics"]["after_key"] = after_key
+            response.json.return_value = {"aggregations": aggs}
+            return response
+
+        ds_git = DataSourceType.objects.create(name="git")
+        Metric.objects.create(name="commits", data_source_type=ds_git)
+        Metric.objects.create(name="gone", data_source_type=ds_git)
+
+        pages = [page([("git", "commits"), ("git", "authors")], {"data_source": "git", "metric_name": "authors"}),
+                 page([("bugzilla", "bugs"), ("bugzilla", "12:18:43:11:000_bugs")], None)]
+        with mock.patch('prosoul.metrics_import.requests.post', side_effect=pages) as post:
+            counts = load_metrics("http://es", "scava-metrics")
+            self.assertEqual(post.call_count, 2)
+            self.assertEqual(json.loads(post.call_args[1]['data'])['aggs']['metrics']['composite']['after'],
+                             {"data_source": "git", "metric_name": "authors"})
+
+        self.assertEqual(counts, {"added": 2, "unchanged": 1, "removed": 1})
+        self.assertEqual(Metric.objects.get(name="bugs").data_source_type.name, "bugzilla")
+        self.assertTrue(Metric.objects.filter(name="gone").exists())
+
+        pages = [page([("git", "commits"), ("git", "authors"), ("bugzilla", "bugs")], None)]
+        with mock.patch('prosoul.metrics_import.requests.post', side_effect=pages):
+            counts = load_metrics("http://es", "scava-metrics", prune=True)
+
+        self.assertEqual(counts, {"added": 0, "unchanged": 3, "removed": 1})
+        self.assertFalse(Metric.objects.filter(name="gone").exists())
+
+    def test_sync_metrics_data(self):
+        MetricData.objects.create(implementation="commits", description="commits - 1")
+        response = mock.Mock(status_code=200)
+        response.json.return_value = {"aggregations": {"metric_ids": {"buckets": [
+            {"key": {"metric_id": "1"}, "metric_name": {"buckets": [{"key": "commits"}]}},
+            {"key": {"metric_id": "2"}, "metric_name": {"buckets": [{"key": "bugs"}]}}
+        ]}}}
+
+        out = io.StringIO()
+        with mock.patch('prosoul.metrics_import.requests.post', return_value=response):
+            call_command('prosoul_sync_metrics_data', stdout=out)
+            self.assertIn("added: 1, unchanged: 1", out.getvalue())
+            # Running it again does not add anything
+            self.assertEqual(sync_metrics_data("http://es", "scava-metrics"), {"added": 0, "unchanged": 2})
+
+        self.assertEqual(MetricData.objects.get(description="bugs - 2").implementation, "bugs")
+
 
 # class ProsoulImportExport(TestCase):
 #
@@ -26,11 +26,11 @@ from django.views.generic import RedirectView
 
 from rest_framework import routers
 
-from . import views
+from . import perfdata, views
 from prosoul.views_editor import AttributeView, EditorView, GoalView, MetricView, MetricDataView, QualityModelView
 from prosoul.views_editor import import_from_file, export_to_file
 
-from prosoul.rest import AttributeViewSet, DataSourceTypeViewSet, FactoidViewSet, GoalViewSet
+from prosoul.rest import AssessmentViewSet, AttributeViewSet, DataSourceTypeViewSet, FactoidViewSet, GoalViewSet
 from prosoul.rest import MetricViewSet, MetricDataViewSet, QualityModelViewSet, UserViewSet
 
 app_name = 'prosoul'
@@ -66,8 +66,11 @@ urlpatterns = [
     url(r'^create_visualization$', views.Visualize.as_view()),
     url(r'^assess$', views.Assessment.as_view(), name='assess'),
     url(r'^create_assessment$', views.Assessment.as_view()),
+    url(r'^assessment_project$', views.project_assessment, name='assessment_project'),
     url(r'^download_assessment_csv', views.download_csv),
-    url(r'^download_project_assessment_csv/(?P<project>[\w ]+)', views.download_csv)
+    url(r'^download_project_assessment_csv/(?P<project>[\w ]+)', views.download_csv),
+    url(r'^metrics$', perfdata.metrics_view, name='perfdata_metrics'),
+    url(r'^metrics/runs$', perfdata.runs_view, name='perfdata_runs')
 ]
 
 urlpatterns += urlpatterns_edit
@@ -77,6 +80,7 @@ urlpatterns += urlpatterns_edit
 
 # Routers provide an easy way of automatically determining the URL conf.
 router = routers.DefaultRouter()
+router.register(r'assessments', AssessmentViewSet, basename='assessment')
 router.register(r'attributes', AttributeViewSet)
 router.register(r'factoid', FactoidViewSet)
 router.register(r'goal', GoalViewSet)
@@ -22,22 +22,34 @@
 #
 #
 
+import hashlib
 import json
 import os
 
 from django import shortcuts
+from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.http import HttpResponse, Http404
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.http import HttpResponse, Http404, JsonResponse
 from django.template import loader
 from django.views import View
 
-from prosoul.prosoul_export import fetch_models, gl2viewer
-from prosoul.prosoul_assess import assess, ASSESSMENT_CSV_DIR_PATH, ASSESSMENT_CSV_FILE_NAME
+from prosoul.models import QualityModel
+from prosoul.prosoul_export import fetch_model, gl2viewer
+from prosoul.prosoul_assess import (assess, load_projects, ASSESSMENT_CSV_DIR_PATH, ASSESSMENT_CSV_FILE_NAME,
+                                    SCORES_LAYOUT_METRICS)
 from prosoul.prosoul_vis import build_dashboards
 from prosoul.forms import AssessmentForm, VisualizationForm
+from prosoul.signals import models_generation
 
 ATTR_TEMPLATE = 'panels/templates/attribute-template.json'
+ASSESSMENT_MAX_AGE = 3600  # assessments of the same model version newer than it (in seconds) are reused in visualizations
 KIBANA_HOST = str(os.getenv('KIBITER_HOST', 'http://localhost:80'))
+PROJECTS_PER_PAGE = 50  # projects in each page of the assessment table
+VIEWER_CACHE_PREFIX = 'prosoul_viewer'
+VIEWER_CACHE_TIMEOUT = 24 * 3600  # the data of older generations of the models expires
 
 
 class Viewer(LoginRequiredMixin, View):
@@ -45,23 +57,20 @@ class Viewer(LoginRequiredMixin, View):
     http_method_names = ['get']
 
     def get(self, request):
-        """ Basic Models Viewer just dumping the JSON of all models """
-        models = fetch_models(None, request.user)
-        if not models['qualityModels']:
+        """ Basic Models Viewer just dumping the JSON of the selected model """
+        models = list(QualityModel.objects.filter(Q(created_by=request.user) | Q(created_by=None))
+                      .values_list('name', flat=True))
+        if not models:
             return shortcuts.redirect('prosoul:editor')
-        model_selected = models['qualityModels'][0]['name']
+        model_selected = models[0]
         if request.method == 'GET' and 'qmodel_selected' in request.GET:
             model_selected = request.GET['qmodel_selected']
-        viewer_data = gl2viewer(models, model_name=model_selected)
+        if model_selected not in models:
+            raise Http404
         context = {'active_page': "viewer",
                    'qmodel_selected': model_selected,
-                   'qmodels': models['qualityModels'],
-                   'qm_data': viewer_data[0],
-                   'qm_data_str': json.dumps(viewer_data[0]).replace('\"', '\\"'),
-                   'attributes_data': viewer_data[1],
-                   'attributes_data_str': json.dumps(viewer_data[1]).replace('\"', '\\"'),
-                   'metrics_data': viewer_data[2],
-                   'metrics_data_str': json.dumps(viewer_data[2]).replace('\"', '\\"')}
+                   'qmodels': models}
+        context.update(viewer_data(model_selected))
 
         template = loader.get_template('prosoul/viewer.html')
 
@@ -70,6 +79,32 @@ class Viewer(LoginRequiredMixin, View):
         return HttpResponse(render_index)
 
 
+def viewer_data(model_name):
+    """
+    Get the data of a model for the viewer. It is built just once per generation of
+    the quality models, so it is built again only after the models are edited.
+
+    :param model_name: name of the quality model
+    :return: a dict with the model, attributes and metrics data and their JSON strings
+    """
+
+    cache_key = "%s:%s:%s" % (VIEWER_CACHE_PREFIX, models_generation(),
+                              hashlib.md5(model_name.encode('utf-8')).hexdigest())
+    data = cache.get(cache_key)
+
+    if data is None:
+        viewer_json = gl2viewer({"qualityModels": [fetch_model(model_name)]}, model_name=model_name)
+        data = {'qm_data': viewer_json[0],
+                'qm_data_str': json.dumps(viewer_json[0]).replace('\"', '\\"'),
+                'attributes_data': viewer_json[1],
+                'attributes_data_str': json.dumps(viewer_json[1]).replace('\"', '\\"'),
+                'metrics_data': viewer_json[2],
+                'metrics_data_str': json.dumps(viewer_json[2]).replace('\"', '\\"')}
+        cache.set(cache_key, data, VIEWER_CACHE_TIMEOUT)
+
+    return data
+
+
 class Visualize(LoginRequiredMixin, View):
 
     http_method_names = ['get', 'post']
@@ -99,7 +134,8 @@ class Visualize(LoginRequiredMixin, View):
                 try:
                     assess_template = None
                     build_dashboards(es_url, kibana_url, es_index, attribute_template, assess_template,
-                                     qmodel_name, backend_metrics_data, from_date, to_date)
+                                     qmodel_name, backend_metrics_data, from_date, to_date,
+                                     assess_max_age=ASSESSMENT_MAX_AGE)
                 except Exception as ex:
                     error = "Problem creating the visualizations " + str(ex)
 
@@ -119,72 +155,29 @@ class Assessment(LoginRequiredMixin, View):
     http_method_names = ['get', 'post']
 
     def get(self, request):
-        template = loader.get_template('prosoul/assessment.html')
         context = {'active_page': "assess", "assess_config_form": AssessmentForm()}
-        render_index = template.render(context, request)
-        return HttpResponse(render_index)
+        if 'page' in request.GET:
+            # Browse the projects of the last assessment
+            context.update(Assessment.projects_page(request.GET['page']))
+        return shortcuts.render(request, 'prosoul/assessment.html', context)
 
-    def render_tables(assessment):
-        """ Convert the JSON with the assessmet in an HTML table
-
-        Sample format:
-
-        {
-         "Community": {
-          "Attention": {
-           "GitHubEnrich {\"filter\": {\"term\": {\"state\": \"closed\"}}}": {
-            "perceval": 5,
-            "GrimoireELK": 5
-           }
-          }
-         },
-         "Product": {
-          "Vitality": {
-           "GitHubEnrich": {
-            "perceval": 2,
-            "GrimoireELK": 2
-           },
-           "GitEnrich": {
-            "perceval": 3,
-            "GrimoireELK": 3
-           }
-          }
-         }
-        }
+    @staticmethod
+    def projects_page(page):
+        """ Context with a page of the projects table of the last assessment
+
+        The assessment is not rendered: only the summary of the projects in the page
+        is included, the assessment of a project is fetched when it is selected.
         """
 
-        projects_data = {}
-        metrics = []
-        projects_list = []
-
-        for goal in assessment:
-            for attribute in assessment[goal]:
-                for metric in assessment[goal][attribute]:
-                    metric_cal_type = assessment[goal][attribute][metric].get('cal_type', '-')
-                    metrics.append({'name': metric, 'cal_type': metric_cal_type})
-                    for project in assessment[goal][attribute][metric]:
-                        if project != 'cal_type':
-                            if project not in projects_data:
-                                projects_data[project] = {}
-                            if goal not in projects_data[project]:
-                                projects_data[project][goal] = {}
-                            if attribute not in projects_data[project][goal]:
-                                projects_data[project][goal][attribute] = {}
-                            projects_data[project][goal][attribute][metric] = assessment[goal][attribute][metric][project]
-
-        print(projects_data)
-
-        metrics = list(metrics)
-        # TODO: move this table rendering to Django templates
-        tables = ""
-
-        for project in projects_data:
-            tables += "<h3>Project: " + project + " <a class='btn btn-primary' " \
-                                                  "href='./download_project_assessment_csv/" + project \
-                      + "'> Download as CSV</a></h3> "
-            projects_list.append(project)
-
-        return tables, projects_list
+        projects = load_projects()
+        if not projects or not projects['summary']:
+            return {"errors": "Empty assessment. Review the form data."}
+
+        paginator = Paginator(sorted(projects['summary']), PROJECTS_PER_PAGE)
+        projects_page = paginator.get_page(page)
+        rows = [dict(projects['summary'][project], project=project) for project in projects_page]
+
+        return {"projects_page": projects_page, "projects_rows": rows}
 
     def post(self, request):
         error = None
@@ -197,27 +190,37 @@ class Assessment(LoginRequiredMixin, View):
             backend_metrics_data = form.cleaned_data['backend_metrics_data']
             from_date = form.cleaned_data['from_date']
             to_date = form.cleaned_data['to_date']
+            rescore = form.cleaned_data['rescore']
+            layout = form.cleaned_data['layout'] or SCORES_LAYOUT_METRICS
 
             # Time to execute the assessment creation
             try:
-                assessment = assess(es_url, es_index, qmodel_name, backend_metrics_data, from_date, to_date)
+                assess(es_url, es_index, qmodel_name, backend_metrics_data, from_date, to_date, rescore=rescore,
+                       layout=layout)
             except Exception as ex:
                 error = "Problem creating the assessment " + str(ex)
 
             context.update({"errors": error})
             if not error:
-                (assessment_table, projects) = Assessment.render_tables(assessment)
-                if assessment_table:
-                    context.update({"assessment": assessment_table, "projects": projects,
-                                    "assessment_raw": json.dumps(assessment)})
-                else:
-                    context.update({"errors": "Empty assessment. Review the form data."})
+                context.update(Assessment.projects_page(1))
             return shortcuts.render(request, 'prosoul/assessment.html', context)
         else:
             context.update({"errors": form.errors})
             return shortcuts.render(request, 'prosoul/assessment.html', context)
 
 
+@login_required
+def project_assessment(request):
+    """ Assessment of a project (goal -> attribute -> metric) in the last assessment """
+
+    projects = load_projects()
+    project = request.GET.get('project')
+    if not projects or project not in projects['projects']:
+        raise Http404
+
+    return JsonResponse(projects['projects'][project])
+
+
 def download_csv(request, project=None):
     if project:
         file_path = ASSESSMENT_CSV_DIR_PATH + "assessment_csv_" + project + ".csv"
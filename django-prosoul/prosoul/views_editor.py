@@ -22,14 +22,9 @@
 #
 #
 
-import functools
 import json
 
 from datetime import datetime
-from time import time
-
-from django.db.models import Count
-from elasticsearch import Elasticsearch
 
 from django import shortcuts
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
@@ -45,9 +40,9 @@ from django.db.utils import IntegrityError
 
 from django.views import View
 
+from prosoul import perfdata
 from prosoul.prosoul_export import fetch_models
 from prosoul.prosoul_import import convert_to_grimoirelab, feed_models, SUPPORTED_FORMATS
-from prosoul.forms import ES_URL, METRICS_INDEX
 from prosoul.models import Attribute, Goal, Metric, MetricData, QualityModel
 
 from . import forms_editor
@@ -60,18 +55,7 @@ HTTPS_CHECK_CERT = False
 # Logic not moved inside classes yet
 #
 
-def perfdata(func):
-    @functools.wraps(func)
-    def decorator(*args, **kwargs):
-        task_init = time()
-        data = func(*args, **kwargs)
-        print("%s: %0.3f sec" % (func, time() - task_init))
-        return data
-
-    return decorator
-
-
-@perfdata
+@perfdata.timed('editor_view')
 def build_forms_context(state=None):
     """ Get all forms to be shown in the editor """
     qmodel_form = forms_editor.QualityModelsForm(state=state)
@@ -132,8 +116,6 @@ def import_from_file(request):
         fpath = '.imported/' + file_name  # FIXME Define path where all these files must be saved
         save_path = default_storage.save(fpath, ContentFile(myfile.read()))
 
-        task_init = time()
-
         with open(save_path) as fmodel:
             models_json = {}
             import_models_json = json.load(fmodel)
@@ -155,8 +137,6 @@ def import_from_file(request):
             if not models_json:
                 raise RuntimeError("File %s couldn't be imported." % myfile.name)
 
-        print("Total loading time ... %.2f sec", time() - task_init)
-
     if 'qualityModels' in import_models_json:
         return shortcuts.redirect("/prosoul/viewer?qmodel_selected={}"
                                   .format(import_models_json['qualityModels'][0]['name']))
@@ -173,7 +153,6 @@ def export_to_file(request, qmodel=None):
         qmodel = QualityModel.objects.get(id=qmodel_id)
 
     file_name = "qmodel_%s.json" % qmodel
-    task_init = time()
     try:
         models_json = fetch_models(qmodel)
     except (QualityModel.DoesNotExist, Exception) as ex:
@@ -186,7 +165,6 @@ def export_to_file(request, qmodel=None):
             # If request comes as a GET request, return HTTP 404: Not Found
             return HttpResponse(status=404)
 
-    print("Total loading time ... %.2f sec", time() - task_init)
     if models_json:
         models = json.dumps(models_json, indent=True, sort_keys=True)
         response = HttpResponse(models, content_type="application/json")
@@ -291,12 +269,10 @@ class JustPostByEditorMixin():
 class EditorView(JustPostByEditorMixin, UserPassesTestMixin, LoginRequiredMixin, View):
     http_method_names = ['get']
 
-    @perfdata
+    @perfdata.timed('editor_view')
     def get(self, request):
         """ Shows the Prosoul Editor """
 
-        get_metrics_data()
-
         context = build_forms_context()
 
         return shortcuts.render(request, 'prosoul/editor.html', context)
@@ -786,59 +762,3 @@ class GoalView(LoginRequiredMixin, JustPostByEditorMixin, View):
             # TODO: Show error
             print(form.errors)
             raise Http404
-
-
-def get_metrics_data():
-    es = Elasticsearch([ES_URL], timeout=120, max_retries=20, retry_on_timeout=True, verify_certs=HTTPS_CHECK_CERT)
-
-    metrics_names = []
-
-    if not es.indices.exists(index=METRICS_INDEX):
-        print("Index %s doesnt exist!" % METRICS_INDEX)
-        return
-
-    page = es.search(
-        index=METRICS_INDEX,
-        scroll="1m",
-        size=10,
-        body={
-            "size": 0,
-            "aggs": {
-                "unique_metric_id": {
-                    "terms": {
-                        "field": "metric_id",
-                        "size": 5000,
-                        "order": {
-                            "_count": "desc"
-                        }
-                    },
-                    "aggs": {
-                        "unique_metric_name": {
-                            "terms": {
-                                "field": "metric_name",
-                                "size": 1,
-                                "order": {
-                                    "_count": "desc"
-                                }
-                            }
-                        }
-                    }
-                }
-            }
-        }
-    )
-
-    buckets = page['aggregations']['unique_metric_id']['buckets']
-
-    for bucket in buckets:
-        metric_data = {
-            "name": bucket['unique_metric_name']['buckets'][0]['key'],
-            "show_name": "{} - {}".format(bucket['unique_metric_name']['buckets'][0]['key'], bucket['key'])
-        }
-        metrics_names.append(metric_data)
-
-    count = MetricData.objects.aggregate(last_id_inserted=Count('id'))['last_id_inserted'] + 1
-    for id, m in enumerate(metrics_names):
-        if not MetricData.objects.filter(description=m['show_name']).exists():
-            MetricData.objects.create(id=count, implementation=m['name'], description=m['show_name'])
-            count = count + 1
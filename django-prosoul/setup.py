@@ -37,7 +37,7 @@ os.chdir(os.path.normpath(os.path.join(os.path.abspath(__file__), os.pardir)))
 setup(
     name='django-prosoul',
     version='0.4.0',
-    packages=['prosoul'],
+    packages=['prosoul', 'prosoul.management', 'prosoul.management.commands'],
     include_package_data=True,
     license='GPLv3',
     description='Prosoul is a software quality models manager to create, import/export, view and edit models',
@@ -63,12 +63,16 @@ setup(
     install_requires=[
         'django>=2.0',
         'matplotlib',
+        'numpy',
         'grimoire-elk',
         'sortinghat',
         'kidash',
         'djangorestframework',
         'grimoirelab-toolkit'
     ],
+    entry_points={
+        'console_scripts': ['prosoul=prosoul.cli:main']
+    },
     python_requires='>=3.4'
 
 )
@@ -25,15 +25,24 @@
 
 import argparse
 import hashlib
+import json
 import logging
 
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import requests
+
 from dateutil import parser
 
 from grimoire_elk.elk.elastic import ElasticSearch
 
-from report.metrics.git import Git
 from report.report import Report
 
+CHUNK_SIZE = 1000  # metric samples uploaded in each bulk request
+WORKERS = 4  # metrics computed at the same time
+
 
 # From perceval
 def uuid(*args):
@@ -67,39 +76,141 @@ def uuid(*args):
     return uuid_sha1
 
 
-def fetch_metric(es_url, ds):
-
-    start = parser.parse('2000-01-01')
-    end = parser.parse('2018-01-01')
-
-    metrics = Git.get_section_metrics()['overview']['activity_metrics']
-
-    logging.debug("Computing metrics for %s: %s ", ds, metrics)
-
-    for metric in metrics:
-        es_index = Report.ds2index[Report.ds2class[ds]]
-        ds = metric.ds.name
-        m = metric(es_url, es_index, start=start, end=end)
-        # print("AGG: ", m.get_agg())
-        metric_ts = m.get_ts()
-        for i in range(0, len(metric_ts['date'])):
-            metric_sample = {
-                "metric_id": m.id,
-                "metric_name": m.name,
-                "metric_es_name": m.name,
-                "metric_description": m.desc,
-                "metric_data_source": m.ds.name,
-                "metric_value": metric_ts['value'][i],
-                "metric_sample_datetime": metric_ts['date'][i],
-                "metric_implementation": str(m),
-                "project": None
+def get_metrics(ds):
+    """Get the metrics to be computed for a data source"""
+
+    return Report.ds2class[ds].get_section_metrics()['overview']['activity_metrics']
+
+
+def get_data_source_names(data_sources):
+    """Get the names of the data sources stored in their metric samples
+
+    :param data_sources: data sources of the metrics
+    :returns: a sorted list with the values of metric_data_source in the samples
+    """
+
+    return sorted({metric.ds.name for ds in data_sources for metric in get_metrics(ds)})
+
+
+def fetch_metric(es_url, ds, metric, start, end):
+    """Compute the time series of a metric and convert it to metric samples
+
+    :param es_url: Elastic URL with the enriched indexes
+    :param ds: data source of the metric
+    :param metric: metric class to be computed
+    :param start: date since which the metric is computed
+    :param end: date until which the metric is computed
+    :returns: a list with the metric samples
+    """
+
+    es_index = Report.ds2index[Report.ds2class[ds]]
+    m = metric(es_url, es_index, start=start, end=end)
+    metric_ts = m.get_ts()
+
+    metric_samples = []
+    for i in range(0, len(metric_ts['date'])):
+        metric_sample = {
+            "metric_id": m.id,
+            "metric_name": m.name,
+            "metric_es_name": m.name,
+            "metric_description": m.desc,
+            "metric_data_source": m.ds.name,
+            "metric_value": metric_ts['value'][i],
+            "metric_sample_datetime": metric_ts['date'][i],
+            "metric_implementation": str(m),
+            "project": None
+        }
+        metric_sample['id'] = uuid(metric_sample['metric_id'], metric_sample['metric_sample_datetime'])
+        metric_samples.append(metric_sample)
+
+    return metric_samples
+
+
+def fetch_metrics(es_url, data_sources, start, end, workers=WORKERS):
+    """Compute the metrics of the data sources concurrently
+
+    The metrics are computed in a pool of threads. Only a bounded number of
+    metrics are computed in advance, so the samples can be consumed (uploaded)
+    without keeping all of them in memory.
+
+    :param es_url: Elastic URL with the enriched indexes
+    :param data_sources: data sources to get the metrics for
+    :param start: date since which the metrics are computed
+    :param end: date until which the metrics are computed
+    :param workers: number of metrics computed at the same time
+    :returns: a generator of metric samples
+    """
+
+    tasks = [(ds, metric) for ds in data_sources for metric in get_metrics(ds)]
+    logging.debug("Computing %i metrics for %s", len(tasks), data_sources)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for ds, metric in tasks:
+            pending.append(executor.submit(fetch_metric, es_url, ds, metric, start, end))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def chunks(items, chunk_size):
+    """Group the items in lists of chunk_size items"""
+
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def find_last_sample(elastic_url, index, data_sources):
+    """Find the date of the last metric sample indexed for the data sources
+
+    :param elastic_url: Elastic URL with the metrics
+    :param index: index with the metrics
+    :param data_sources: data sources of the metrics
+    :returns: the date of the last sample or None if there are no samples
+    """
+
+    # The samples store the name of the data source of each metric, not the one in the params
+    names = get_data_source_names(data_sources)
+
+    # The data source is a keyword, or a text with a keyword subfield if the index was
+    # mapped dynamically: the terms are matched against the keyword in both cases
+    query = {
+        "size": 0,
+        "query": {
+            "bool": {
+                "should": [
+                    {"bool": {
+                        "filter": [{"terms": {"metric_data_source": names}}],
+                        "must_not": [{"exists": {"field": "metric_data_source.keyword"}}]
+                    }},
+                    {"terms": {"metric_data_source.keyword": names}}
+                ],
+                "minimum_should_match": 1
             }
-            metric_sample['id'] = uuid(metric_sample['metric_id'], metric_sample['metric_sample_datetime'])
+        },
+        "aggs": {
+            "last_sample": {"max": {"field": "metric_sample_datetime"}}
+        }
+    }
+
+    res = requests.post(elastic_url + "/" + index + "/_search", data=json.dumps(query),
+                        headers={"Content-Type": "application/json"})
+    if res.status_code == 404:
+        return None
+    res.raise_for_status()
 
-            yield(metric_sample)
-            # print(metric_ts)
-        # print("TS: ", m.get_ts())
-        # print("Trend:", m.get_trend())
+    last_sample = res.json()["aggregations"]["last_sample"]
+    if not last_sample.get("value_as_string"):
+        return None
+
+    return parser.parse(last_sample["value_as_string"])
 
 
 def get_params():
@@ -109,7 +220,18 @@ def get_params():
     parser.add_argument('-e', '--elastic-url', required=True, help="Elastic URL with the enriched indexes")
     parser.add_argument('--elastic-metrics-url',
                         help="Elastic URL to store the metrics if different from enriched indexes.")
-    parser.add_argument('-d', '--data-source', required=True, help="Get metrics for data source")
+    parser.add_argument('-d', '--data-source', required=True, action='append', dest='data_sources',
+                        help="Get metrics for data source (it can be used several times)")
+    parser.add_argument('--from-date', default='2000-01-01',
+                        help="Compute the metrics since this date (2000-01-01 by default)")
+    parser.add_argument('--to-date', default=datetime.utcnow().strftime('%Y-%m-%d'),
+                        help="Compute the metrics until this date (today by default)")
+    parser.add_argument('--incremental', action='store_true',
+                        help="Compute the metrics since the last sample already indexed")
+    parser.add_argument('--workers', type=int, default=WORKERS,
+                        help="Number of metrics computed at the same time (%i by default)" % WORKERS)
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE,
+                        help="Number of samples uploaded in each bulk request (%i by default)" % CHUNK_SIZE)
 
     return parser.parse_args()
 
@@ -126,14 +248,25 @@ if __name__ == '__main__':
     logging.getLogger("urllib3").setLevel(logging.WARNING)
     logging.getLogger("requests").setLevel(logging.WARNING)
 
-    data_source = args.data_source
     index = "grimoirelab_metrics"
+    elastic_metrics_url = args.elastic_metrics_url if args.elastic_metrics_url else args.elastic_url
+    elastic = ElasticSearch(elastic_metrics_url, index)
+
+    start = parser.parse(args.from_date)
+    end = parser.parse(args.to_date)
 
-    elastic = ElasticSearch(args.elastic_url, index)
-    if args.elastic_metrics_url:
-        elastic = ElasticSearch(args.elastic_metrics_url, index)
+    if args.incremental:
+        last_sample = find_last_sample(elastic_metrics_url, index, args.data_sources)
+        if last_sample:
+            # The last sample is computed again because its period could be incomplete
+            start = max(start.replace(tzinfo=None), last_sample.replace(tzinfo=None))
+            logging.info("Computing metrics since the last sample: %s", start.isoformat())
 
-    elastic.bulk_upload_sync(fetch_metric(args.elastic_url, data_source), "id")
+    nsamples = 0
+    for chunk in chunks(fetch_metrics(args.elastic_url, args.data_sources, start, end, args.workers),
+                        args.chunk_size):
+        elastic.bulk_upload(chunk, "id")
+        nsamples += len(chunk)
+        logging.debug("Metric samples uploaded: %i", nsamples)
 
-    # for metric in fetch_metric(es_url, data_source):
-    #    print(metric)
+    logging.info("Total metric samples uploaded: %i", nsamples)
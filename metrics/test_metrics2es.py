@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+#
+# Tests for the tool getting metrics from GrimoireLab Report
+#
+# Copyright (C) 2020 Bitergia
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place - Suite 330, Boston, MA 02111-1307, USA.
+#
+# Run with: python3 -m unittest test_metrics2es (from the metrics dir)
+#
+
+import json
+import unittest
+
+from unittest import mock
+
+import metrics2es
+
+
+class Metrics2ESTest(unittest.TestCase):
+
+    def test_find_last_sample(self):
+        # The name of the data source of the metrics is not the one in the params
+        commits = mock.Mock()
+        commits.ds.name = "Git"
+        stored_sample = {"metric_data_source": "Git", "metric_sample_datetime": "2020-03-01T00:00:00"}
+
+        def search(url, data, **kwargs):
+            """ Elasticsearch with the stored sample, in an index mapped dynamically """
+
+            self.assertEqual(url, "http://es/grimoirelab_metrics/_search")
+            should = json.loads(data)["query"]["bool"]["should"]
+            keyword_terms = should[1]["terms"]["metric_data_source.keyword"]
+            response = mock.Mock(status_code=200)
+            last_sample = {"value": None}
+            if stored_sample["metric_data_source"] in keyword_terms:
+                last_sample = {"value": 1583020800000, "value_as_string": stored_sample["metric_sample_datetime"]}
+            response.json.return_value = {"aggregations": {"last_sample": last_sample}}
+            return response
+
+        with mock.patch('metrics2es.get_metrics', return_value=[commits]) as get_metrics, \
+                mock.patch('metrics2es.requests.post', side_effect=search):
+            last_sample = metrics2es.find_last_sample("http://es", "grimoirelab_metrics", ["git"])
+            get_metrics.assert_called_once_with("git")
+            self.assertEqual(last_sample.isoformat(), stored_sample["metric_sample_datetime"])
+
+            commits.ds.name = "GitHub"
+            self.assertIsNone(metrics2es.find_last_sample("http://es", "grimoirelab_metrics", ["git"]))
+
+
+if __name__ == '__main__':
+    unittest.main()